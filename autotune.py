@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import platform
+from pathlib import Path
+
+MiB = 1024 * 1024
+# Disk upload read sizes
+MIN_CHUNK = 256 * 1024
+MAX_CHUNK = 4 * MiB
+DEFAULT_CHUNK = 512 * 1024
+# Hill climbing: sample every INTERVAL seconds, keep probing for PROBE_SECONDS while a step gains GAIN
+INTERVAL = 1.0
+PROBE_SECONDS = 8.0
+GAIN = 0.1
+# A sample needs this many parts per connection, or part arrival jitter outweighs the gain
+PARTS_PER_SAMPLE = 4
+HISTORY_SIZE = 200
+
+
+def runner_class():
+    """Coarse identity of the machine results are grouped by, e.g. 'Linux-X64-4cpu-16gb'"""
+    system = os.environ.get('RUNNER_OS') or platform.system()
+    arch = os.environ.get('RUNNER_ARCH') or platform.machine()
+    try:
+        memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        memory = 0
+    return f"{system}-{arch}-{os.cpu_count()}cpu-{round(memory / 1024 ** 3)}gb"
+
+
+def upload_chunk_size(mibps):
+    """Read size for disk uploads: ~50 ms of the host's recent throughput, a power of two in [256 KiB, 4 MiB]"""
+    if not mibps:
+        return DEFAULT_CHUNK
+    target = min(mibps * MiB * 0.05, MAX_CHUNK)
+    chunk = MIN_CHUNK
+    while chunk * 2 <= target:
+        chunk *= 2
+    return chunk
+
+
+class ConnectionTuner:
+    """Hill climbing on the number of parallel connections of one download
+
+    The downloader reports every part it receives and calls `step` every
+    INTERVAL seconds; a sample closes once it spans PARTS_PER_SAMPLE parts
+    per connection. During the first PROBE_SECONDS, each step that raised
+    the rate by at least GAIN earns one more connection (up to `maximum`);
+    the first step that does not pay off is undone and the count settles.
+    """
+
+    def __init__(self, start: int, maximum: int):
+        self.maximum = max(maximum, 1)
+        self.start = self.connections = max(1, min(start, self.maximum))
+        self.settled = False
+        self.best = (self.connections, 0.0)
+        self.samples = []
+        self._bytes = 0
+        self._parts = 0
+        self._mark = None
+        self._started = None
+
+    def add(self, n: int):
+        self._bytes += n
+        self._parts += 1
+
+    def restart_sample(self):
+        """Drop the current sample (e.g. a new connection is only now ready)"""
+        self._bytes = 0
+        self._parts = 0
+        self._mark = time.monotonic()
+
+    def step(self):
+        """Close the current sample; returns the connection count to use from now on"""
+        now = time.monotonic()
+        if self._mark is None:
+            self._started = now
+            self.restart_sample()
+            return self.connections
+        if self._parts < PARTS_PER_SAMPLE * self.connections:
+            return self.connections
+        elapsed = now - self._mark
+        rate = self._bytes / MiB / elapsed if elapsed > 0 else 0.0
+        self.restart_sample()
+        self.samples.append((self.connections, round(rate, 2)))
+        if self.settled:
+            return self.connections
+        if rate > self.best[1] * (1 + GAIN):
+            self.best = (self.connections, rate)
+            if self.connections < self.maximum and now - self._started < PROBE_SECONDS:
+                self.connections += 1
+            else:
+                self.settled = True
+        else:
+            self.connections = self.best[0]
+            self.settled = True
+        return self.connections
+
+    def throttle(self):
+        """Telegram asked us to slow down (FLOOD_WAIT): one connection less, stop probing"""
+        self.connections = max(1, self.connections - 1)
+        self.settled = True
+
+    def summary(self):
+        path = ' → '.join(f"{connections}:{rate}" for connections, rate in self.samples[:8])
+        return f"{self.start} → {self.connections} koneksi ({path} MB/s)"
+
+
+class TuningLog:
+    """Transfer parameters chosen per run and the MB/s they achieved, kept between runs
+
+    Records are grouped by `runner_class()`, so a new run starts from what
+    worked best on the same kind of runner.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.runner = runner_class()
+        self.records = []
+        self._new = []
+
+    def load(self, path):
+        self.path = Path(path)
+        try:
+            records = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        if isinstance(records, list):
+            self.records = records[-HISTORY_SIZE:]
+
+    def save(self):
+        if self.path is None or not self._new:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_text(json.dumps(self.records[-HISTORY_SIZE:]))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Riwayat autotune tidak tersimpan: {e}")
+
+    def record(self, kind: str, **fields):
+        entry = {'at': round(time.time()), 'runner': self.runner, 'kind': kind, **fields}
+        self.records.append(entry)
+        self._new.append(entry)
+
+    def best_connections(self, default: int):
+        """Connection count of the fastest recent download on this runner class"""
+        downloads = [r for r in self.records[-50:]
+                     if r.get('runner') == self.runner and r.get('kind') == 'download' and r.get('connections')]
+        if not downloads:
+            return default
+        return max(downloads, key=lambda r: r.get('mibps') or 0)['connections']
+
+    def upload_mibps(self, service: str):
+        """Last recorded upload throughput to `service` on this runner class, or None"""
+        for r in reversed(self.records):
+            if r.get('runner') == self.runner and r.get('kind') == 'upload' and r.get('service') == service:
+                return r.get('mibps')
+        return None
+
+    def summary(self):
+        """One line per transfer recorded this run"""
+        lines = []
+        for r in self._new:
+            if r['kind'] == 'download':
+                lines.append(f"download {r['connections']} koneksi → {r['mibps']:.2f} MB/s")
+            else:
+                lines.append(f"upload {r['service']} chunk {r['chunk_size'] // 1024} KB → {r['mibps']:.2f} MB/s")
+        return lines
+
+
+TUNING = TuningLog()
@@ -0,0 +1,126 @@
+import os
+import math
+import aiohttp
+from telethon.sessions import MemorySession
+from telethon.tl.types import MessageMediaDocument
+from parallel_download import ParallelDownloader
+
+# Where TelegramStub serves the userbot endpoints
+TELEGRAM_STUB_URL = os.environ.get('BENCH_TELEGRAM_URL', 'http://127.0.0.1:8081')
+
+
+class _File:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+
+class _Media(MessageMediaDocument):
+    """Stands in for a document, so transfers take the ParallelDownloader path like real ones"""
+
+    def __init__(self, chat_id, message_id):
+        super().__init__()
+        self.chat_id = chat_id
+        self.message_id = message_id
+
+
+class _Message:
+    def __init__(self, chat_id, message_id, name, size):
+        self.media = _Media(chat_id, message_id)
+        self.file = _File(name, size)
+
+
+class _Part:
+    def __init__(self, data):
+        self.bytes = data
+
+
+class _FakeSender:
+    """One "MTProto connection": answers upload.getFile with a ranged download from TelegramStub"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def send(self, request):
+        media = request.location
+        url = f"{TELEGRAM_STUB_URL}/mtproto/download/{media.chat_id}/{media.message_id}"
+        async with self.client._http().get(url, params={'offset': str(request.offset),
+                                                         'limit': str(request.limit)}) as r:
+            return _Part(await r.read())
+
+    async def disconnect(self):
+        pass
+
+
+class FakeParallelDownloader(ParallelDownloader):
+    """ParallelDownloader with its senders swapped for _FakeSender; workers, resume and autotune are real"""
+
+    async def _create_sender(self, dc_id: int):
+        return _FakeSender(self.client)
+
+    async def _prepare(self, media, file_size: int):
+        self._location = media
+        parts = math.ceil(file_size / self.part_size)
+        await self._connect(0, min(self.workers, max(parts, 1)))
+        return parts
+
+
+class FakeTelegramClient:
+    """The slice of TelegramClient the worker uses, served by TelegramStub over HTTP"""
+
+    def __init__(self, session=None, api_id=None, api_hash=None, **kwargs):
+        self.session = MemorySession()
+        self._http_session = None
+
+    def _http(self):
+        if self._http_session is None:
+            self._http_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None))
+        return self._http_session
+
+    async def connect(self):
+        self._http()
+
+    async def is_user_authorized(self):
+        return True
+
+    async def disconnect(self):
+        if self._http_session is not None:
+            await self._http_session.close()
+
+    def add_event_handler(self, callback, event=None):
+        pass
+
+    async def get_messages(self, chat_id, ids=None):
+        async with self._http().get(f"{TELEGRAM_STUB_URL}/mtproto/messages/{chat_id}/{ids}") as r:
+            media = await r.json()
+        if not media:
+            return None
+        return _Message(chat_id, ids, media['name'], media['size'])
+
+    async def iter_download(self, media, request_size: int = 512 * 1024, file_size: int = None, offset: int = 0):
+        url = f"{TELEGRAM_STUB_URL}/mtproto/download/{media.chat_id}/{media.message_id}"
+        async with self._http().get(url, params={'offset': str(offset)}) as r:
+            async for chunk in r.content.iter_chunked(request_size):
+                yield chunk
+
+    async def download_media(self, message, file=None, progress_callback=None):
+        received = 0
+        with open(file, 'wb') as f:
+            async for chunk in self.iter_download(message.media):
+                f.write(chunk)
+                received += len(chunk)
+                if progress_callback is not None:
+                    progress_callback(received, message.file.size)
+        return file
+
+    async def send_message(self, entity, text):
+        async with self._http().post(f"{TELEGRAM_STUB_URL}/mtproto/send_message",
+                                     json={'entity': entity, 'text': text}) as r:
+            await r.read()
+
+
+def install(module):
+    """Swap the Telethon client and parallel downloader of `module` (workflow_handler) for the stand-ins"""
+    module.TelegramClient = FakeTelegramClient
+    module.ParallelDownloader = FakeParallelDownloader
+    module.StringSession = lambda string: string
@@ -0,0 +1,371 @@
+"""Offline end-to-end benchmark: bot → GitHub dispatch → workflow run → file hosts
+
+Everything external is a local stand-in (benchmarks/stubs.py): the Bot API,
+the userbot's media source, the GitHub REST API and the pixeldrain / gofile /
+catbox upload endpoints, each with configurable bandwidth and latency.
+Simulated users reply to a document with an upload command and confirm it
+through `handle_upload_command` / `button_callback`; every dispatch starts
+`workflow_handler.main()` in its own process, like a fresh Actions runner.
+
+    python -m benchmarks.run                          # default scenarios
+    python -m benchmarks.run -s 100u-1kb -s 1u-4gb --telegram-mbps 800 --host-mbps 400
+    python -m benchmarks.run -s 10u-50mb --output results.json
+
+A scenario is "<users>u-<size><kb|mb|gb>" (one file per user). Results are
+JSON: throughput, p50/p99 latencies, peak RSS (bot and runners), peak disk.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import resource
+import tempfile
+import itertools
+import subprocess
+from pathlib import Path
+from types import SimpleNamespace
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.stubs import Link, TelegramStub, GitHubStub, HostStub  # noqa: E402
+from worker_report import decode_report  # noqa: E402
+
+DEFAULT_SCENARIOS = ['1u-1kb', '100u-1kb', '1u-4gb']
+UNITS = {'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3}
+TOKEN = '123456:bench'
+FIRST_USER_ID = 10000
+
+
+def parse_scenario(name: str):
+    match = re.fullmatch(r'(\d+)u-(\d+)(kb|mb|gb)', name.lower())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid scenario {name!r} (expected e.g. 100u-1kb)")
+    return int(match.group(1)), int(match.group(2)) * UNITS[match.group(3)]
+
+
+def parse_host_errors(spec: str):
+    """'pixeldrain=1,gofile=0.2' -> {'pixeldrain': 1.0, 'gofile': 0.2}"""
+    errors = {}
+    for item in filter(None, (spec or '').split(',')):
+        service, _, rate = item.partition('=')
+        errors[service.strip()] = float(rate or 1)
+    return errors
+
+
+def percentiles(values, scale: float = 1.0):
+    """p50 / p99 / max by nearest rank"""
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(q):
+        return ordered[min(len(ordered) - 1, max(int(q * len(ordered) + 0.999999) - 1, 0))]
+    return {'p50': round(rank(0.50) * scale, 3), 'p99': round(rank(0.99) * scale, 3),
+            'max': round(ordered[-1] * scale, 3)}
+
+
+def disk_usage(path: Path):
+    """Bytes allocated under `path` (sparse files count what they really use)"""
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(directory, name)).st_blocks * 512
+            except OSError:
+                pass
+    return total
+
+
+def max_rss_mib(who):
+    return round(resource.getrusage(who).ru_maxrss / 1024, 1)
+
+
+# --- One scenario (runs in its own process so RSS and module state start fresh) ---
+
+def _command_update(update_id, user_id, file_message_id, size):
+    user = {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"}
+    chat = {'id': user_id, 'type': 'private'}
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': file_message_id + 1, 'date': int(time.time()), 'chat': chat, 'from': user,
+            'text': '/upload',
+            'reply_to_message': {
+                'message_id': file_message_id, 'date': int(time.time()), 'chat': chat, 'from': user,
+                'document': {'file_id': f"bench-{user_id}", 'file_unique_id': f"bench{user_id}",
+                             'file_name': f"bench_{user_id}.bin", 'file_size': size},
+            },
+        },
+    }
+
+
+def _callback_update(update_id, user_id, message_id, data):
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'chat_instance': 'bench', 'data': data,
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"},
+            'message': {'message_id': message_id, 'date': int(time.time()), 'text': 'confirm',
+                        'chat': {'id': user_id, 'type': 'private'}},
+        },
+    }
+
+
+def _confirm_button(telegram: TelegramStub, user_id):
+    """(message_id, callback_data) of the newest confirmation sent to the user"""
+    for (chat_id, message_id), message in sorted(telegram.sent.items(), key=lambda item: -item[0][1]):
+        if chat_id != str(user_id):
+            continue
+        for row in message.get('reply_markup', {}).get('inline_keyboard', []):
+            for button in row:
+                if button.get('callback_data', '').startswith('confirm_'):
+                    return message_id, button['callback_data']
+    return None, None
+
+
+async def run_scenario(name: str, args):
+    users, size = parse_scenario(name)
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-{name}-", dir=args.workdir))
+    runs_dir = workdir / 'runs'
+    runs_dir.mkdir()
+
+    started, dispatched, finished = {}, {}, {}
+    command_latency = []
+    runners = set()
+    run_ids = itertools.count(1)
+    all_done = asyncio.Event()
+    bot = None
+
+    async def on_userbot_message(text):
+        report = decode_report(text, TOKEN)
+        if report is None:
+            return
+        await bot.apply_worker_report(report)
+        session_id = report.get('session_id')
+        if report.get('status') in ('completed', 'failed', 'cancelled') and session_id in started:
+            finished.setdefault(session_id, (time.monotonic(), report['status']))
+            if len(finished) == users:
+                all_done.set()
+
+    async def run_workflow(inputs):
+        run_dir = runs_dir / f"run-{next(run_ids)}"
+        run_dir.mkdir()
+        env = {**os.environ, **hosts.env(),
+               'SESSION_ID': inputs['session_id'], 'SERVICE': inputs['service'],
+               'WORKFLOW_DATA': inputs['workflow_data'], 'BENCH_TELEGRAM_URL': telegram.url,
+               'PYTHONPATH': str(ROOT)}
+        output = None if args.verbose else subprocess.DEVNULL
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, '-m', 'benchmarks.runner', cwd=run_dir, env=env, stdout=output, stderr=output
+        )
+        try:
+            await process.wait()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+
+    def on_dispatch(inputs):
+        now = time.monotonic()
+        data = json.loads(inputs['workflow_data'])
+        for session in data.get('batch', [data]):
+            dispatched.setdefault(session['session_id'], now)
+        task = asyncio.create_task(run_workflow(inputs))
+        runners.add(task)
+        task.add_done_callback(runners.discard)
+
+    telegram = await TelegramStub(Link(args.telegram_mbps, args.latency_ms), on_userbot_message).start()
+    github = await GitHubStub(Link(latency_ms=args.github_latency_ms), on_dispatch).start()
+    hosts = await HostStub(Link(args.host_mbps, args.latency_ms), parse_host_errors(args.host_errors)).start()
+
+    # The bot reads its configuration at import time
+    user_ids = [FIRST_USER_ID + i for i in range(users)]
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': TOKEN, 'BOT_API_URL': f"{telegram.url}/bot",
+        'GH_PAT': 'bench', 'GITHUB_REPO': 'bench/telegram-mirror-bot', 'GITHUB_API_URL': github.url,
+        'AUTHORIZED_USERS': ','.join(map(str, user_ids)), 'DISPATCH_MODE': 'github',
+        'SESSION_STORE': 'memory', 'MIRROR_CACHE_PATH': str(workdir / 'mirrors.db'), 'METRICS_PORT': '0',
+        'USAGE_DB_PATH': str(workdir / 'usage.db'), 'LINK_CACHE_PATH': str(workdir / 'links.db'),
+        'TELEGRAM_API_ID': '1', 'TELEGRAM_API_HASH': 'bench', 'TELEGRAM_STRING_SESSION': 'bench',
+    })
+    import bot as bot_module
+    from telegram import Bot, Update
+    bot = bot_module
+
+    tg_bot = Bot(TOKEN, base_url=f"{telegram.url}/bot")
+    await tg_bot.initialize()
+    application = SimpleNamespace(bot=tg_bot)
+    await bot.post_init(application)
+
+    peak_disk = 0
+
+    async def sample_disk():
+        nonlocal peak_disk
+        while True:
+            peak_disk = max(peak_disk, disk_usage(runs_dir))
+            await asyncio.sleep(0.1)
+
+    sampler = asyncio.create_task(sample_disk())
+    update_ids = itertools.count(1)
+
+    async def user_flow(user_id):
+        telegram.add_media(user_id, 1, f"bench_{user_id}.bin", size)
+        context = SimpleNamespace(bot=tg_bot, args=[])
+        t0 = time.monotonic()
+        update = Update.de_json(_command_update(next(update_ids), user_id, 1, size), tg_bot)
+        await bot.handle_upload_command(update, context, args.service)
+        command_latency.append(time.monotonic() - t0)
+        message_id, data = _confirm_button(telegram, user_id)
+        if data is None:
+            return
+        started[data.split('_', 1)[1]] = t0
+        await bot.button_callback(Update.de_json(_callback_update(next(update_ids), user_id, message_id, data), tg_bot),
+                                  context)
+
+    wall_start = time.monotonic()
+    try:
+        await asyncio.gather(*(user_flow(user_id) for user_id in user_ids))
+        if len(started) < users:
+            print(f"⚠️ Hanya {len(started)}/{users} sesi terkonfirmasi", file=sys.stderr)
+        try:
+            await asyncio.wait_for(all_done.wait(), args.timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ {name}: timeout setelah {args.timeout:.0f}s", file=sys.stderr)
+        wall = (max(t for t, _ in finished.values()) if finished else time.monotonic()) - wall_start
+        if runners:
+            # Runs exit right after their last report; give them a moment to clean up
+            await asyncio.wait(list(runners), timeout=30)
+    finally:
+        for task in list(runners):
+            task.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
+        sampler.cancel()
+        await bot.post_shutdown(application)
+        await tg_bot.shutdown()
+        disk_left = disk_usage(runs_dir)
+        for stub in (telegram, github, hosts):
+            await stub.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    statuses = [status for _, status in finished.values()]
+    uploaded = sum(hosts.bytes.values())
+    return {
+        'scenario': name,
+        'users': users,
+        'file_size': size,
+        'service': args.service,
+        'sessions': {
+            'confirmed': len(started),
+            'completed': statuses.count('completed'),
+            'failed': len(statuses) - statuses.count('completed'),
+            'unfinished': len(started) - len(finished),
+        },
+        'runs': len(github.dispatches),
+        'wall_seconds': round(wall, 3),
+        'uploaded_bytes': uploaded,
+        'throughput_mib_s': round(uploaded / (1024 * 1024) / wall, 3) if wall else None,
+        'sessions_per_second': round(len(finished) / wall, 3) if wall else None,
+        'command_latency_ms': percentiles(command_latency, 1000),
+        'dispatch_latency_ms': percentiles([dispatched[s] - started[s] for s in started if s in dispatched], 1000),
+        'completion_latency_s': percentiles([finished[s][0] - started[s] for s in started if s in finished]),
+        'peak_rss_mib': {'bot': max_rss_mib(resource.RUSAGE_SELF), 'runner': max_rss_mib(resource.RUSAGE_CHILDREN)},
+        'peak_disk_mib': round(peak_disk / (1024 * 1024), 1),
+        'disk_left_mib': round(disk_left / (1024 * 1024), 1),
+        'calls': {'bot_api': dict(telegram.calls), 'github': dict(github.calls), 'hosts': dict(hosts.calls)},
+        'link': {'telegram_mbps': args.telegram_mbps, 'host_mbps': args.host_mbps,
+                 'latency_ms': args.latency_ms, 'github_latency_ms': args.github_latency_ms},
+    }
+
+
+# --- Driver ---
+
+def run_child(name: str, args, argv):
+    """Run one scenario in a fresh interpreter, returning its result dict"""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        result_path = f.name
+    try:
+        output = None if args.verbose else subprocess.DEVNULL
+        subprocess.run([sys.executable, '-m', 'benchmarks.run', *argv, '--child', name, '--result-file', result_path],
+                       cwd=ROOT, stdout=output, check=False)
+        with open(result_path) as f:
+            content = f.read()
+        return json.loads(content) if content else {'scenario': name, 'error': 'no result'}
+    finally:
+        os.unlink(result_path)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark with local stand-ins')
+    parser.add_argument('-s', '--scenario', action='append', type=str,
+                        help=f"<users>u-<size><kb|mb|gb>, repeatable (default: {', '.join(DEFAULT_SCENARIOS)})")
+    parser.add_argument('--service', default='pixeldrain', help='upload service(s), comma separated')
+    parser.add_argument('--telegram-mbps', type=float, default=0, help='Telegram download bandwidth (0 = unlimited)')
+    parser.add_argument('--host-mbps', type=float, default=0, help='file host upload bandwidth (0 = unlimited)')
+    parser.add_argument('--latency-ms', type=float, default=0, help='per-request latency of Telegram and hosts')
+    parser.add_argument('--host-errors', default='',
+                        help='share of uploads a host fails with 503, e.g. pixeldrain=1,gofile=0.2')
+    parser.add_argument('--github-latency-ms', type=float, default=0, help='per-request latency of the GitHub API')
+    parser.add_argument('--timeout', type=float, default=3600, help='seconds to wait for a scenario')
+    parser.add_argument('--workdir', default=None, help='where runner downloads go (default: system temp)')
+    parser.add_argument('--keep', action='store_true', help='keep the scenario work directories')
+    parser.add_argument('--output', '-o', help='write the JSON results here instead of stdout')
+    parser.add_argument('--verbose', '-v', action='store_true', help='show bot and runner logs')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = build_parser().parse_args(argv)
+
+    if args.child:
+        result = asyncio.run(run_scenario(args.child, args))
+        with open(args.result_file, 'w') as f:
+            json.dump(result, f)
+        return
+
+    scenarios = args.scenario or DEFAULT_SCENARIOS
+    for name in scenarios:
+        parse_scenario(name)
+
+    results = []
+    for name in scenarios:
+        print(f"🏁 {name} ...", file=sys.stderr)
+        result = run_child(name, args, argv)
+        results.append(result)
+        if 'error' not in result:
+            print(f"   {result['throughput_mib_s']} MiB/s, dispatch p99 {result['dispatch_latency_ms']}, "
+                  f"selesai p99 {result['completion_latency_s']}, RSS {result['peak_rss_mib']}, "
+                  f"disk {result['peak_disk_mib']} MiB", file=sys.stderr)
+
+    report = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': sys.version.split()[0],
+        'env': {key: os.environ[key] for key in sorted(os.environ) if key in TUNABLES},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+        print(f"💾 Hasil: {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+# Worker / bot settings worth recording next to the numbers
+TUNABLES = {
+    'DISPATCH_BATCH_WINDOW', 'DISPATCH_BATCH_MAX', 'MAX_ACTIVE_SESSIONS', 'MAX_ACTIVE_PER_USER',
+    'DOWNLOAD_WORKERS', 'UPLOAD_WORKERS', 'STREAM_MODE', 'STREAM_BUFFER_MB', 'PARALLEL_CONNECTIONS',
+    'SESSION_CONCURRENCY', 'CHECKPOINTS', 'PROGRESS_INTERVAL', 'UPLOAD_RETRIES', 'UPLOAD_BACKOFF',
+    'FAILOVER', 'FAILOVER_SERVICES', 'STREAM_SPOOL_MB', 'AUTOTUNE', 'TUNE_MEMORY_MB', 'TUNE_MAX_CONNECTIONS',
+}
+
+if __name__ == '__main__':
+    main()
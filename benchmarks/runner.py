@@ -0,0 +1,12 @@
+"""One benchmark "workflow run": workflow_handler.main() against the local stand-ins
+
+Started by benchmarks/run.py once per dispatch, with the same environment
+GitHub Actions would provide (SESSION_ID, SERVICE, WORKFLOW_DATA, ...).
+"""
+import asyncio
+import workflow_handler
+from benchmarks import fake_telethon
+
+if __name__ == '__main__':
+    fake_telethon.install(workflow_handler)
+    asyncio.run(workflow_handler.main())
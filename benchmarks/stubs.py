@@ -0,0 +1,231 @@
+import json
+import time
+import random
+import asyncio
+import itertools
+from collections import Counter
+from aiohttp import web
+
+CHUNK = 512 * 1024
+_ZEROS = bytes(CHUNK)
+
+
+class Link:
+    """Emulated network link: per-request latency plus a bandwidth cap shared by all transfers"""
+
+    def __init__(self, mbps: float = 0, latency_ms: float = 0):
+        self.rate = mbps * 1024 * 1024 / 8 if mbps else 0
+        self.latency = latency_ms / 1000
+        self._free_at = 0.0
+
+    async def delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def transfer(self, n: int):
+        """Wait until `n` more bytes fit through the link"""
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self._free_at = max(self._free_at, now) + n / self.rate
+        if self._free_at - now > 0.001:
+            await asyncio.sleep(self._free_at - now)
+
+
+class StubServer:
+    """aiohttp application on an ephemeral localhost port"""
+
+    def __init__(self, link: Link = None):
+        self.link = link or Link()
+        self.app = web.Application(client_max_size=1024 ** 4)
+        self.calls = Counter()
+        self.url = None
+        self._runner = None
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def drain(self, request):
+        """Read a request body at link speed, returning its length"""
+        received = 0
+        async for chunk in request.content.iter_chunked(CHUNK):
+            received += len(chunk)
+            await self.link.transfer(len(chunk))
+        return received
+
+
+class TelegramStub(StubServer):
+    """Bot API (`/bot<token>/<method>`) plus the userbot's view of Telegram (`/mtproto/...`)
+
+    Documents are registered with `add_media`; workers download them as
+    zero-filled streams at link speed. Messages the userbot sends (worker
+    reports) are handed to `on_userbot_message(text)`.
+    """
+
+    def __init__(self, link: Link = None, on_userbot_message=None):
+        super().__init__(link)
+        self.on_userbot_message = on_userbot_message
+        self.media = {}
+        self.sent = {}
+        self._message_ids = itertools.count(1000)
+        self.app.router.add_post('/bot{token}/{method}', self.bot_api)
+        self.app.router.add_get('/mtproto/messages/{chat_id}/{message_id}', self.get_message)
+        self.app.router.add_get('/mtproto/download/{chat_id}/{message_id}', self.download)
+        self.app.router.add_post('/mtproto/send_message', self.send_message)
+
+    def add_media(self, chat_id, message_id, name: str, size: int):
+        self.media[(str(chat_id), str(message_id))] = {'name': name, 'size': size}
+
+    @staticmethod
+    def _message(message_id, chat_id, params):
+        message = {'message_id': int(message_id), 'date': int(time.time()),
+                   'chat': {'id': int(chat_id), 'type': 'private'}, 'text': params.get('text', '')}
+        if params.get('reply_markup'):
+            message['reply_markup'] = params['reply_markup']
+        return message
+
+    async def bot_api(self, request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+        await self.link.delay()
+        if request.content_type == 'application/json':
+            params = await request.json()
+        else:
+            params = dict(await request.post())
+        if isinstance(params.get('reply_markup'), str):
+            params['reply_markup'] = json.loads(params['reply_markup'])
+
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif method == 'sendMessage':
+            message_id = next(self._message_ids)
+            result = self._message(message_id, params['chat_id'], params)
+            self.sent[(str(params['chat_id']), message_id)] = result
+        elif method == 'editMessageText' and 'chat_id' in params:
+            result = self._message(params['message_id'], params['chat_id'], params)
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def get_message(self, request):
+        self.calls['mtproto.get_messages'] += 1
+        await self.link.delay()
+        media = self.media.get((request.match_info['chat_id'], request.match_info['message_id']))
+        return web.json_response(media)
+
+    async def download(self, request):
+        self.calls['mtproto.download'] += 1
+        media = self.media[(request.match_info['chat_id'], request.match_info['message_id'])]
+        offset = int(request.query.get('offset', 0))
+        remaining = max(media['size'] - offset, 0)
+        if 'limit' in request.query:
+            remaining = min(remaining, int(request.query['limit']))
+        await self.link.delay()
+        response = web.StreamResponse(headers={'Content-Length': str(remaining)})
+        await response.prepare(request)
+        view = memoryview(_ZEROS)
+        while remaining:
+            n = min(remaining, CHUNK)
+            await self.link.transfer(n)
+            await response.write(view[:n])
+            remaining -= n
+        await response.write_eof()
+        return response
+
+    async def send_message(self, request):
+        self.calls['mtproto.send_message'] += 1
+        data = await request.json()
+        if self.on_userbot_message is not None:
+            await self.on_userbot_message(data['text'])
+        return web.json_response({'ok': True})
+
+
+class GitHubStub(StubServer):
+    """Repository, workflow and dispatch endpoints; `on_dispatch(inputs)` sees every dispatch"""
+
+    def __init__(self, link: Link = None, on_dispatch=None):
+        super().__init__(link)
+        self.on_dispatch = on_dispatch
+        self.dispatches = []
+        self.app.router.add_get('/repos/{owner}/{repo}', self.repository)
+        self.app.router.add_get('/repos/{owner}/{repo}/actions/workflows/{workflow}', self.workflow)
+        self.app.router.add_post('/repos/{owner}/{repo}/actions/workflows/{workflow}/dispatches', self.dispatch)
+        self.app.router.add_get('/repos/{owner}/{repo}/actions/workflows/{workflow}/runs', self.runs)
+
+    async def repository(self, request):
+        self.calls['repo'] += 1
+        await self.link.delay()
+        return web.json_response({'default_branch': 'main'}, headers={'ETag': '"repo"'})
+
+    async def workflow(self, request):
+        self.calls['workflow'] += 1
+        await self.link.delay()
+        return web.json_response({'id': 1}, headers={'ETag': '"workflow"'})
+
+    async def dispatch(self, request):
+        self.calls['dispatches'] += 1
+        await self.link.delay()
+        inputs = (await request.json())['inputs']
+        self.dispatches.append((time.monotonic(), inputs))
+        if self.on_dispatch is not None:
+            self.on_dispatch(inputs)
+        return web.Response(status=204)
+
+    async def runs(self, request):
+        self.calls['runs'] += 1
+        await self.link.delay()
+        return web.json_response({'total_count': 0, 'workflow_runs': []})
+
+
+class HostStub(StubServer):
+    """pixeldrain, gofile and catbox upload endpoints under `/<service>`; bodies are read and dropped
+
+    `errors` maps a service to the share of its uploads answered with
+    HTTP 503 once the body has been read (a host failing mid-transfer).
+    """
+
+    def __init__(self, link: Link = None, errors: dict = None):
+        super().__init__(link)
+        self.errors = errors or {}
+        self.bytes = Counter()
+        self._ids = itertools.count(1)
+        self.app.router.add_put('/pixeldrain/{name}', self.pixeldrain)
+        self.app.router.add_post('/gofile', self.gofile)
+        self.app.router.add_post('/catbox', self.catbox)
+
+    def env(self):
+        """`<SERVICE>_UPLOAD_URL` overrides pointing the uploaders at this server"""
+        return {f"{service.upper()}_UPLOAD_URL": f"{self.url}/{service}"
+                for service in ('pixeldrain', 'gofile', 'catbox')}
+
+    async def _receive(self, service, request):
+        self.calls[service] += 1
+        await self.link.delay()
+        received = await self.drain(request)
+        self.bytes[service] += received
+        if random.random() < self.errors.get(service, 0):
+            self.calls[f"{service}.failed"] += 1
+            raise web.HTTPServiceUnavailable(text='bench: injected failure')
+        return next(self._ids)
+
+    async def pixeldrain(self, request):
+        file_id = await self._receive('pixeldrain', request)
+        return web.json_response({'id': f"bench{file_id}"}, status=201)
+
+    async def gofile(self, request):
+        file_id = await self._receive('gofile', request)
+        return web.json_response({'status': 'ok', 'data': {'downloadPage': f"https://gofile.io/d/bench{file_id}"}})
+
+    async def catbox(self, request):
+        file_id = await self._receive('catbox', request)
+        return web.Response(text=f"https://files.catbox.moe/bench{file_id}.bin")
@@ -1,13 +1,23 @@
 import os
-import json
+import time
 import asyncio
 import hashlib
-import requests
 from datetime import datetime
-from pathlib import Path
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler, filters
 from telegram.constants import ParseMode
+from github_dispatch import GitHubDispatcher, DispatchBatcher
+from job_queue import JobQueue
+from job_scheduler import FairScheduler
+from metrics import REGISTRY, counter, gauge, histogram, start_metrics_server
+from session_store import create_session_store, TERMINAL_STATUSES
+from edit_scheduler import EditScheduler
+from mirror_cache import MirrorCache
+from file_ref import FileRef
+from usage_ledger import UsageLedger, DAY
+from link_resolver import LinkResolver
+from progress import format_size
+from worker_report import REPORT_PREFIX, decode_report, encode_cancel, format_cancelled, format_results
 
 # Load environment variables from .env file
 from dotenv import load_dotenv
@@ -17,32 +27,156 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
 GH_PAT = os.environ.get('GH_PAT')
 GITHUB_REPO = os.environ.get('GITHUB_REPO')  # format: username/repo
+# API base URLs: a self-hosted telegram-bot-api / GitHub Enterprise server, or local stand-ins
+BOT_API_URL = os.environ.get('BOT_API_URL', 'https://api.telegram.org/bot')
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
 AUTHORIZED_USERS = os.environ.get('AUTHORIZED_USERS', '').split(',')
+GITHUB_DISPATCH_CONCURRENCY = int(os.environ.get('GITHUB_DISPATCH_CONCURRENCY', '4'))
+GITHUB_DISPATCH_TIMEOUT = float(os.environ.get('GITHUB_DISPATCH_TIMEOUT', '15'))
+GITHUB_CACHE_TTL = float(os.environ.get('GITHUB_CACHE_TTL', '600'))
+DISPATCH_BATCH_WINDOW = float(os.environ.get('DISPATCH_BATCH_WINDOW', '3'))  # 0 = dispatch immediately
+DISPATCH_BATCH_MAX = int(os.environ.get('DISPATCH_BATCH_MAX', '10'))
+# Where uploads run: github (Actions) | local (local_worker.py) | inprocess (inside this bot)
+DISPATCH_MODE = os.environ.get('DISPATCH_MODE', 'github')
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', 'jobs.db')
+LOCAL_WORKERS = int(os.environ.get('LOCAL_WORKERS', '2'))
+# Admission limits: sessions running at once (all users / per user), optional user weights "id:2,id:0.5"
+MAX_ACTIVE_SESSIONS = int(os.environ.get('MAX_ACTIVE_SESSIONS', '10'))
+MAX_ACTIVE_PER_USER = int(os.environ.get('MAX_ACTIVE_PER_USER', '2'))
+USER_WEIGHTS = dict(
+    (user, float(weight)) for user, _, weight in
+    (item.partition(':') for item in os.environ.get('USER_WEIGHTS', '').split(',') if item)
+)
+# Seconds between checks for workflow runs that ended without a final report (their slots are freed)
+RUN_WATCH_INTERVAL = float(os.environ.get('RUN_WATCH_INTERVAL', '60'))
+# Local Prometheus endpoint (port 0 = disabled)
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9464'))
+# Userbot account of the workers (learned from its first report if not set)
+WORKER_USER_ID = os.environ.get('WORKER_USER_ID')
+SESSION_STORE = os.environ.get('SESSION_STORE', 'sqlite')  # sqlite | memory
+SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', 'sessions.db')
+SESSION_TTL = float(os.environ.get('SESSION_TTL', '3600'))
+MIRROR_CACHE_PATH = os.environ.get('MIRROR_CACHE_PATH', 'mirrors.db')
+LOADING_ANIMATION_INTERVAL = float(os.environ.get('LOADING_ANIMATION_INTERVAL', '3'))
+LOADING_ANIMATION_DURATION = float(os.environ.get('LOADING_ANIMATION_DURATION', '60'))
+# Files in one session (album, several links or a link range share one job and one runner)
+MAX_FILES_PER_SESSION = int(os.environ.get('MAX_FILES_PER_SESSION', '100'))
+MEDIA_GROUP_TTL = float(os.environ.get('MEDIA_GROUP_TTL', '3600'))
+# Pre-flight for message links (on | off): through the in-process worker's userbot, or a session of the
+# bot's own (PREFLIGHT_STRING_SESSION; the workers' session must not run from two places at once)
+LINK_PREFLIGHT = os.environ.get('LINK_PREFLIGHT', 'on') == 'on'
+PREFLIGHT_STRING_SESSION = os.environ.get('PREFLIGHT_STRING_SESSION')
+PREFLIGHT_TIMEOUT = float(os.environ.get('PREFLIGHT_TIMEOUT', '10'))
+LINK_CACHE_PATH = os.environ.get('LINK_CACHE_PATH', 'links.db')
+LINK_CACHE_TTL = float(os.environ.get('LINK_CACHE_TTL', '86400'))
+# Per-user quotas over a rolling 24h (0 = unlimited); USER_QUOTAS "id:MB,id:0" overrides the MB quota per user
+USAGE_DB_PATH = os.environ.get('USAGE_DB_PATH', 'usage.db')
+QUOTA_DAILY_MB = float(os.environ.get('QUOTA_DAILY_MB', '0'))
+QUOTA_DAILY_FILES = int(os.environ.get('QUOTA_DAILY_FILES', '0'))
+QUOTA_DAILY_RUNNER_MINUTES = float(os.environ.get('QUOTA_DAILY_RUNNER_MINUTES', '0'))
+USER_QUOTAS = dict(
+    (user, float(mb)) for user, _, mb in
+    (item.partition(':') for item in os.environ.get('USER_QUOTAS', '').split(',') if item)
+)
 
-# File upload sessions
-upload_sessions = {}
+# Upload services (one command each, or several at once via /mirror)
+SERVICES = ['pixeldrain', 'gofile', 'catbox', 'anonfiles', 'fileio']
 
-async def animate_loading(chat_id: int, message_id: int, session_id: str, service: str, file_count: int, context):
-    """Animate loading dots while initializing"""
-    from telegram import Bot
-    
-    bot = context.bot
-    dots_states = [".", "..", "..."]
-    counter = 0
-    max_updates = 60  # Max 60 updates (about 1 minute)
-    
-    try:
-        while counter < max_updates:
-            # Check if session still exists and is processing
-            if session_id not in upload_sessions:
-                break
-            
-            if upload_sessions[session_id]['status'] != 'processing':
-                break
-            
-            dots = dots_states[counter % 3]
-            
-            status_text = f"""
+# Shared async GitHub client (pooled connections, bounded concurrency)
+github_dispatcher = GitHubDispatcher(
+    GH_PAT,
+    GITHUB_REPO,
+    max_concurrency=GITHUB_DISPATCH_CONCURRENCY,
+    timeout=GITHUB_DISPATCH_TIMEOUT,
+    api_url=GITHUB_API_URL,
+    cache_ttl=GITHUB_CACHE_TTL
+)
+
+# Sessions confirmed close together share one workflow run (one cold start);
+# a batch can never hold more sessions than the scheduler lets run at once
+dispatch_batcher = DispatchBatcher(
+    github_dispatcher,
+    window=DISPATCH_BATCH_WINDOW,
+    max_sessions=min(DISPATCH_BATCH_MAX, MAX_ACTIVE_SESSIONS)
+)
+
+# Local job queue for self-hosted workers (local / inprocess dispatch modes)
+job_queue = JobQueue(JOB_DB_PATH) if DISPATCH_MODE != 'github' else None
+local_engine = None
+local_workers = []
+worker_chat_id = int(WORKER_USER_ID) if WORKER_USER_ID else None
+
+# Fair admission between confirmation and dispatch
+job_scheduler = FairScheduler(
+    max_in_flight=MAX_ACTIVE_SESSIONS,
+    per_user=MAX_ACTIVE_PER_USER,
+    weights=USER_WEIGHTS
+)
+
+# File upload sessions (persistent, indexed by user/status, expired on TTL)
+upload_sessions = create_session_store(
+    SESSION_STORE,
+    path=SESSION_DB_PATH,
+    pending_ttl=SESSION_TTL,
+    terminal_ttl=SESSION_TTL
+)
+
+# Shared, rate-aware editor for status messages
+edit_scheduler = EditScheduler()
+
+# Files already mirrored: (file_unique_id, service) -> URL
+mirror_cache = MirrorCache(MIRROR_CACHE_PATH)
+
+# Message links already looked up: (chat, message) -> kind, file_unique_id, name, size
+link_resolver = LinkResolver(LINK_CACHE_PATH, ttl=LINK_CACHE_TTL, timeout=PREFLIGHT_TIMEOUT)
+preflight_client = None
+
+# Bytes / files / runner time per user and service in hourly and daily buckets, plus in-flight reservations
+usage_ledger = UsageLedger(USAGE_DB_PATH)
+
+# Bot-side metrics (worker, GitHub and edit metrics live next to their code)
+COMMAND_TO_DISPATCH = histogram('bot_command_to_dispatch_seconds', 'Upload command until the workflow is dispatched')
+DISPATCHES = counter('bot_dispatches_total', 'Sessions handed to workers', ('mode', 'result'))
+SESSIONS_CREATED = counter('bot_sessions_created_total', 'Upload sessions created', ('service',))
+SCHEDULER_SESSIONS = gauge('scheduler_sessions', 'Sessions in the admission scheduler', ('state',))
+SCHEDULER_ADMIT_RATE = gauge('scheduler_admit_rate_per_minute', 'Sessions admitted during the last minute')
+MIRROR_CACHE = gauge('mirror_cache_events', 'Mirror cache lookups since start', ('event',))
+LINK_LOOKUPS = gauge('link_resolver_events', 'Message link lookups since start', ('event',))
+LOCAL_JOBS = gauge('job_queue_jobs', 'Local job queue entries', ('status',))
+QUOTA_REJECTIONS = counter('bot_quota_rejections_total', 'Confirmations refused by a usage quota', ('limit',))
+metrics_runner = None
+
+def collect_metrics():
+    """Copy current queue/cache state into gauges before each scrape"""
+    load = job_scheduler.snapshot()
+    SCHEDULER_SESSIONS.labels('queued').set(load['queued'])
+    SCHEDULER_SESSIONS.labels('in_flight').set(load['in_flight'])
+    SCHEDULER_ADMIT_RATE.set(load['admit_rate_per_min'])
+    for event, value in mirror_cache.stats.items():
+        MIRROR_CACHE.labels(event).set(value)
+    for event, value in link_resolver.stats.items():
+        LINK_LOOKUPS.labels(event).set(value)
+    if job_queue is not None:
+        for status, count in job_queue.counts().items():
+            LOCAL_JOBS.labels(status).set(count)
+
+REGISTRY.add_collector(collect_metrics)
+
+# Album items seen recently: media_group_id -> (last_seen, {message_id: packed FileRef}), oldest first
+media_groups = {}
+
+# Sessions showing the "Initializing" animation: session_id -> (chat_id, message_id, started_at)
+loading_animations = {}
+loading_ticker = None
+
+# Sessions handed to GitHub Actions and not reported back yet: session_id -> run seen completed
+dispatched_sessions = {}
+run_watcher = None
+
+def build_loading_text(session_id: str, service: str, file_count: int, dots: str):
+    """Status text shown while the workflow is starting"""
+    return f"""
 🚀 <b>Upload Dimulai!</b>
 
 🆔 <b>Session:</b> <code>{session_id}</code>
@@ -57,23 +191,34 @@ async def animate_loading(chat_id: int, message_id: int, session_id: str, servic
 
 💡 Cancel: <code>/cancel_{session_id}</code>
 """
+
+def animate_loading(chat_id: int, message_id: int, session_id: str):
+    """Register a confirmed session with the shared loading animation"""
+    loading_animations[session_id] = (chat_id, message_id, time.monotonic())
+
+async def run_loading_animations():
+    """Single ticker animating every initializing session through the edit scheduler"""
+    dots_states = [".", "..", "..."]
+    counter = 0
+    
+    while True:
+        await asyncio.sleep(LOADING_ANIMATION_INTERVAL)
+        counter += 1
+        dots = dots_states[counter % 3]
+        
+        for session_id, (chat_id, message_id, started_at) in list(loading_animations.items()):
+            # Stop once the session is gone, no longer processing, or the workflow has had time to take over
+            session = upload_sessions.get(session_id)
+            if (session is None or session['status'] != 'processing'
+                    or time.monotonic() - started_at > LOADING_ANIMATION_DURATION):
+                del loading_animations[session_id]
+                continue
             
-            try:
-                await bot.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=message_id,
-                    text=status_text,
-                    parse_mode=ParseMode.HTML
-                )
-            except Exception as e:
-                # Ignore telegram errors (rate limit, message not modified, etc)
-                pass
-            
-            await asyncio.sleep(1)  # Update every 1 second
-            counter += 1
-            
-    except Exception as e:
-        print(f"Error in loading animation: {e}")
+            edit_scheduler.submit(
+                chat_id,
+                message_id,
+                build_loading_text(session_id, session['service'], len(session['files']), dots)
+            )
 
 def generate_file_id():
     """Generate unique file ID"""
@@ -93,80 +238,87 @@ def parse_message_link(link: str):
     except:
         return None, None
 
-def trigger_github_workflow(session_id: str, service: str, workflow_data: dict):
-    """Trigger GitHub Actions workflow via API"""
-    if not GH_PAT or not GITHUB_REPO:
-        print("GitHub credentials not configured")
-        print(f"GH_PAT exists: {bool(GH_PAT)}")
-        print(f"GITHUB_REPO: {GITHUB_REPO}")
-        return False
-    
-    # Get default branch
-    repo_url = f"https://api.github.com/repos/{GITHUB_REPO}"
-    headers = {
-        'Accept': 'application/vnd.github.v3+json',
-        'Authorization': f'token {GH_PAT}',
-        'Content-Type': 'application/json'
-    }
-    
-    try:
-        repo_response = requests.get(repo_url, headers=headers)
-        if repo_response.status_code == 200:
-            default_branch = repo_response.json().get('default_branch', 'main')
-            print(f"✅ Detected default branch: {default_branch}")
-        else:
-            # Fallback: try both main and master
-            default_branch = 'main'
-            print(f"⚠️ Could not detect branch, using: {default_branch}")
-    except:
-        default_branch = 'main'
-        print(f"⚠️ Error detecting branch, using: {default_branch}")
-    
-    url = f"https://api.github.com/repos/{GITHUB_REPO}/actions/workflows/upload.yml/dispatches"
+def parse_message_links(args, limit: int):
+    """Parse one or more message links into (chat_id, message_id) pairs
+
+    The last path segment may be a range (https://t.me/c/1234/500-540).
+    Returns None if any link is invalid; expansion stops past `limit` messages.
+    """
+    messages = []
+    for link in args:
+        base, _, last = link.split('?')[0].rstrip('/').rpartition('/')
+        first, dash, end = last.partition('-')
+        chat_id, start = parse_message_link(f"{base}/{first}")
+        if not chat_id or not start:
+            return None
+        stop = start
+        if dash:
+            if not end.isdigit() or int(end) < start:
+                return None
+            stop = min(int(end), start + limit)
+        messages.extend((chat_id, message_id) for message_id in range(start, stop + 1))
+        if len(messages) > limit:
+            break
+    return list(dict.fromkeys(messages))
+
+async def remember_media_group(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Record album items as they arrive, so a reply to one item can take the whole album"""
+    message = update.effective_message
+    if message is None or not message.media_group_id:
+        return
+    file_ref = FileRef.from_message(message)
+    if file_ref is None:
+        return
     
-    payload = {
-        'ref': default_branch,
-        'inputs': {
-            'session_id': session_id,
-            'service': service,
-            'workflow_data': json.dumps(workflow_data)
-        }
+    now = time.monotonic()
+    while media_groups:
+        oldest = next(iter(media_groups))
+        if now - media_groups[oldest][0] < MEDIA_GROUP_TTL and len(media_groups) < 1000:
+            break
+        del media_groups[oldest]
+    _, items = media_groups.pop(message.media_group_id, (0, {}))
+    items[message.message_id] = file_ref.pack()
+    media_groups[message.media_group_id] = (now, items)
+
+async def trigger_workflow(session_id: str, service: str, workflow_data: dict):
+    """Hand a confirmed session to the workers: local job queue, or GitHub Actions (batched)"""
+    if job_queue is not None:
+        job_queue.put(session_id, service, workflow_data)
+        return True
+    return await dispatch_batcher.submit(session_id, service, workflow_data)
+
+def quotas_for(user_id: str):
+    """Daily quotas of one user in ledger units (0 = unlimited)"""
+    mb = USER_QUOTAS.get(user_id, QUOTA_DAILY_MB)
+    return {
+        'bytes_out': int(mb * 1024 * 1024),
+        'files': QUOTA_DAILY_FILES,
+        'runner_seconds': QUOTA_DAILY_RUNNER_MINUTES * 60
     }
-    
-    try:
-        print(f"🔄 Triggering workflow at: {url}")
-        print(f"📦 Branch: {default_branch}")
-        
-        response = requests.post(url, headers=headers, json=payload)
-        
-        print(f"📊 Response status: {response.status_code}")
-        
-        if response.status_code == 204:
-            print("✅ Workflow triggered successfully!")
-            return True
-        elif response.status_code == 422 and default_branch == 'main':
-            # Try with master branch
-            print("⚠️ Trying with 'master' branch...")
-            payload['ref'] = 'master'
-            response = requests.post(url, headers=headers, json=payload)
-            
-            if response.status_code == 204:
-                print("✅ Workflow triggered successfully with 'master' branch!")
-                return True
-            else:
-                print(f"❌ Failed with status {response.status_code}")
-                print(f"Error: {response.text}")
-                return False
-        else:
-            print(f"❌ Failed with status {response.status_code}")
-            print(f"Error: {response.text}")
-            return False
-            
-    except Exception as e:
-        print(f"❌ Error triggering workflow: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+
+def format_usage_amount(limit: str, value: float):
+    if limit == 'bytes_out':
+        return format_size(value)
+    if limit == 'runner_seconds':
+        return f"{value / 60:.1f} menit"
+    return f"{value:.0f} file"
+
+def settle_usage(session_id: str, session: dict, report: dict):
+    """Replace a finished session's reservation by the usage its worker reported (once per session)"""
+    usage = report.get('usage')
+    if usage is None or session.get('usage_recorded'):
+        usage_ledger.release(session_id)
+        return
+    # Long reports arrive split over several messages, each carrying the same usage
+    upload_sessions.update(session_id, usage_recorded=True)
+    usage_ledger.record(
+        session['user_id'],
+        session.get('services') or session['service'].split(','),
+        bytes_in=usage.get('bytes_in', 0),
+        runner_seconds=report.get('seconds', 0),
+        delivered=usage.get('services', {}),
+        session_id=session_id
+    )
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start command handler"""
@@ -185,7 +337,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • /catbox - Upload ke Catbox
 • /anonfiles - Upload ke AnonFiles
 • /fileio - Upload ke File.io
+• /mirror - Upload ke beberapa service sekaligus
 • /status - Lihat sesi aktif
+• /usage - Lihat pemakaian & kuota
 • /help - Bantuan
 
 <b>📝 Cara Penggunaan:</b>
@@ -212,18 +366,29 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 <b>1️⃣ Upload File Biasa:</b>
 • Reply ke file dengan command
 • Contoh: <code>/pixeldrain</code> (reply ke file)
+• Reply ke salah satu file album = seluruh album dalam satu sesi
 
 <b>2️⃣ Upload Dari Link Telegram:</b>
 • Copy link pesan yang berisi file
 • Gunakan: <code>/pixeldrain https://t.me/c/1234/567</code>
+• Beberapa link sekaligus: <code>/pixeldrain link1 link2</code>
+• Range pesan: <code>/pixeldrain https://t.me/c/1234/500-540</code>
 
-<b>3️⃣ Cek Status Upload:</b>
+<b>3️⃣ Mirror Ke Beberapa Service:</b>
+• File cukup didownload sekali, diupload ke semua service bersamaan
+• Contoh: <code>/mirror pixeldrain,gofile</code> (reply ke file)
+
+<b>4️⃣ Cek Status Upload:</b>
 • Ketik: <code>/status</code>
 
-<b>4️⃣ Cancel Upload:</b>
+<b>5️⃣ Cancel Upload:</b>
 • Ketik: <code>/cancel_[session_id]</code>
 • Session ID ada di pesan konfirmasi
 
+<b>6️⃣ Pemakaian & Kuota:</b>
+• Ketik: <code>/usage</code>
+• Kuota harian dihitung dari 24 jam terakhir
+
 <b>⚙️ Services:</b>
 • PixelDrain - Fast, reliable
 • GoFile - Unlimited storage
@@ -238,90 +403,75 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 """
     await update.message.reply_text(help_text, parse_mode=ParseMode.HTML)
 
-async def handle_upload_command(update: Update, context: ContextTypes.DEFAULT_TYPE, service: str):
-    """Handle file upload commands"""
+async def handle_upload_command(update: Update, context: ContextTypes.DEFAULT_TYPE, service: str,
+                                command: str = None, args: list = None):
+    """Handle file upload commands
+
+    `service` may be a comma separated list to mirror the same files to several hosts.
+    """
     user_id = str(update.effective_user.id)
+    command = command or service
+    args = context.args if args is None else args
     
     if AUTHORIZED_USERS and user_id not in AUTHORIZED_USERS:
         await update.message.reply_text("❌ Kamu tidak diizinkan menggunakan bot ini.")
         return
     
     message = update.message
-    files_to_upload = []
+    skipped = 0
     
-    # Check if replying to a message with file
+    # Reply to a file (every item of its album), or one or more message links / ranges
     if message.reply_to_message:
         replied_msg = message.reply_to_message
+        items = {}
+        if replied_msg.media_group_id:
+            items.update(media_groups.get(replied_msg.media_group_id, (0, {}))[1])
+        file_ref = FileRef.from_message(replied_msg)
+        if file_ref:
+            items[replied_msg.message_id] = file_ref.pack()
+        files_to_upload = [items[message_id] for message_id in sorted(items)]
+    
+    elif args:
+        links = parse_message_links(args, MAX_FILES_PER_SESSION)
         
-        if replied_msg.document:
-            files_to_upload.append({
-                'type': 'document',
-                'file_id': replied_msg.document.file_id,
-                'file_name': replied_msg.document.file_name,
-                'file_size': replied_msg.document.file_size,
-                'message_id': replied_msg.message_id,
-                'chat_id': replied_msg.chat_id
-            })
-        elif replied_msg.photo:
-            photo = replied_msg.photo[-1]
-            files_to_upload.append({
-                'type': 'photo',
-                'file_id': photo.file_id,
-                'file_name': f'photo_{photo.file_unique_id}.jpg',
-                'file_size': photo.file_size,
-                'message_id': replied_msg.message_id,
-                'chat_id': replied_msg.chat_id
-            })
-        elif replied_msg.video:
-            files_to_upload.append({
-                'type': 'video',
-                'file_id': replied_msg.video.file_id,
-                'file_name': replied_msg.video.file_name or f'video_{replied_msg.video.file_unique_id}.mp4',
-                'file_size': replied_msg.video.file_size,
-                'message_id': replied_msg.message_id,
-                'chat_id': replied_msg.chat_id
-            })
-        elif replied_msg.audio:
-            files_to_upload.append({
-                'type': 'audio',
-                'file_id': replied_msg.audio.file_id,
-                'file_name': replied_msg.audio.file_name or f'audio_{replied_msg.audio.file_unique_id}.mp3',
-                'file_size': replied_msg.audio.file_size,
-                'message_id': replied_msg.message_id,
-                'chat_id': replied_msg.chat_id
-            })
-    
-    # Check if message link provided
-    elif context.args:
-        link = context.args[0]
-        chat_id, message_id = parse_message_link(link)
-        
-        if chat_id and message_id:
-            files_to_upload.append({
-                'type': 'link',
-                'chat_id': chat_id,
-                'message_id': message_id
-            })
+        if links:
+            # Pre-flight: name/size for the confirmation and scheduler, links without a file dropped here
+            resolved = await link_resolver.resolve(links) if len(links) <= MAX_FILES_PER_SESSION else {}
+            files_to_upload = [(resolved.get(link) or FileRef.link(*link)).pack()
+                               for link in links if resolved.get(link, True) is not None]
+            skipped = len(links) - len(files_to_upload)
+            if not files_to_upload:
+                await message.reply_text(
+                    "❌ <b>Tidak ada file di link tersebut!</b>\n\n"
+                    "Pesan sudah dihapus, tidak berisi file, atau tidak bisa diakses userbot.",
+                    parse_mode=ParseMode.HTML
+                )
+                return
         else:
             await message.reply_text(
                 f"❌ <b>Link Telegram tidak valid!</b>\n\n"
                 f"<b>Format yang benar:</b>\n"
-                f"<code>/{service} https://t.me/c/1234567890/123</code>",
+                f"<code>/{command} https://t.me/c/1234567890/123</code>\n"
+                f"<code>/{command} https://t.me/c/1234567890/500-540</code> (range)",
                 parse_mode=ParseMode.HTML
             )
             return
     else:
         await message.reply_text(
             f"❌ <b>Cara penggunaan salah!</b>\n\n"
-            f"<b>Opsi 1:</b> Reply ke file\n"
-            f"<code>/{service}</code> (reply ke file)\n\n"
-            f"<b>Opsi 2:</b> Gunakan link Telegram\n"
-            f"<code>/{service} https://t.me/c/...</code>\n\n"
+            f"<b>Opsi 1:</b> Reply ke file (atau salah satu file album)\n"
+            f"<code>/{command}</code> (reply ke file)\n\n"
+            f"<b>Opsi 2:</b> Gunakan link Telegram (boleh beberapa, atau range)\n"
+            f"<code>/{command} https://t.me/c/...</code>\n\n"
             f"Ketik /help untuk panduan lengkap.",
             parse_mode=ParseMode.HTML
         )
         return
     
+    if len(files_to_upload) > MAX_FILES_PER_SESSION:
+        await message.reply_text(f"❌ Maksimal {MAX_FILES_PER_SESSION} file per sesi.")
+        return
+    
     if not files_to_upload:
         await message.reply_text("❌ File tidak ditemukan!")
         return
@@ -330,22 +480,31 @@ async def handle_upload_command(update: Update, context: ContextTypes.DEFAULT_TY
     session_id = generate_file_id()
     
     # Create upload session
-    upload_sessions[session_id] = {
+    upload_sessions.put(session_id, {
         'user_id': user_id,
         'service': service,
+        'services': service.split(','),
         'files': files_to_upload,
         'status': 'pending',
         'created_at': datetime.now().isoformat()
-    }
+    })
+    SESSIONS_CREATED.labels(service).inc()
     
     # Get file info for display
-    if files_to_upload[0].get('file_name'):
-        file_display = files_to_upload[0]['file_name']
-        size_mb = files_to_upload[0].get('file_size', 0) / (1024 * 1024)
+    refs = [FileRef.unpack(packed) for packed in files_to_upload]
+    if refs[0].name:
+        file_display = refs[0].name
+        if len(refs) > 1:
+            file_display += f" (+{len(refs) - 1} file lain)"
+        size_mb = sum(ref.size or 0 for ref in refs) / (1024 * 1024)
         size_info = f"💾 <b>Ukuran:</b> {size_mb:.2f} MB\n"
     else:
-        file_display = "File dari link Telegram"
+        file_display = "File dari link Telegram" if len(files_to_upload) == 1 else (
+            f"{len(files_to_upload)} pesan dari link Telegram"
+        )
         size_info = ""
+    if skipped:
+        size_info += f"⚠️ <b>Dilewati:</b> {skipped} link tanpa file\n"
     
     # Send confirmation message
     keyboard = [
@@ -372,40 +531,155 @@ async def handle_upload_command(update: Update, context: ContextTypes.DEFAULT_TY
     
     await message.reply_text(status_text, reply_markup=reply_markup, parse_mode=ParseMode.HTML)
 
+async def handle_mirror_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Mirror the same file(s) to several services from one download: /mirror pixeldrain,gofile"""
+    services = []
+    if context.args:
+        services = [s.strip().lower() for s in context.args[0].split(',') if s.strip()]
+    unknown = [s for s in services if s not in SERVICES]
+    
+    if not services or unknown:
+        await update.message.reply_text(
+            f"❌ <b>Cara penggunaan salah!</b>\n\n"
+            f"<code>/mirror pixeldrain,gofile</code> (reply ke file)\n"
+            f"<code>/mirror pixeldrain,gofile https://t.me/c/...</code>\n\n"
+            f"<b>Services:</b> {', '.join(SERVICES)}",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    
+    services = list(dict.fromkeys(services))
+    await handle_upload_command(
+        update, context, ','.join(services),
+        command=f"mirror {','.join(services)}", args=context.args[1:]
+    )
+
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle button callbacks"""
     query = update.callback_query
-    await query.answer()
     
     data = query.data
     action, session_id = data.split('_', 1)
     
-    if session_id not in upload_sessions:
+    session = upload_sessions.get(session_id)
+    if session is None:
+        await query.answer()
         await query.edit_message_text("❌ Session expired atau tidak ditemukan!")
         return
     
-    session = upload_sessions[session_id]
     user_id = str(update.effective_user.id)
     
+    # A callback query is answered exactly once: with an alert on the refusal paths, plainly otherwise
     if session['user_id'] != user_id:
         await query.answer("❌ Ini bukan sesi upload kamu!", show_alert=True)
         return
     
     if action == 'confirm':
-        session['status'] = 'processing'
+        # Claimed before any await: a double tap (updates run concurrently) confirms only once
+        session = upload_sessions.transition(
+            session_id, 'pending',
+            status='queued',
+            status_message=[query.message.chat_id, query.message.message_id]
+        )
+        if session is None:
+            await query.answer("⏳ Sesi ini sudah diproses.", show_alert=True)
+            return
+        await query.answer()
+        services = session.get('services') or session['service'].split(',')
+        
+        # Files already mirrored to every requested service are answered from the cache (looked up together)
+        cached, remaining = [], []
+        refs = [FileRef.unpack(packed) for packed in session['files']]
+        found = await mirror_cache.lookup_many([ref.key for ref in refs], services)
+        for ref, urls in zip(refs, found):
+            if urls:
+                cached.append({'name': ref.name or mirror_cache.file_name(ref.key) or 'file', 'urls': urls})
+            else:
+                remaining.append(ref)
+        
+        if not remaining:
+            upload_sessions.update(session_id, status='completed')
+            first, *rest = format_results(cached)
+            await query.edit_message_text(first, parse_mode=ParseMode.HTML)
+            for text in rest:
+                await context.bot.send_message(query.message.chat_id, text, parse_mode=ParseMode.HTML)
+            return
         
         # Prepare workflow data
         workflow_data = {
             'session_id': session_id,
             'service': session['service'],
-            'files': session['files'],
+            'services': services,
+            'files': [ref.pack() for ref in remaining],
+            'cached': cached,
             'user_id': user_id,
             'chat_id': query.message.chat_id,
             'message_id': query.message.message_id
         }
         
-        # Show initial status
-        status_text = f"""
+        # Daily quota: used + in flight + this session (sizes known at admission; links count 0 bytes)
+        size = sum(ref.size or 0 for ref in remaining)
+        bytes_out, file_count = size * len(services), len(remaining) * len(services)
+        exceeded = usage_ledger.reserve(session_id, user_id, bytes_out, file_count, quotas_for(user_id))
+        if exceeded:
+            limit, used, quota = exceeded
+            QUOTA_REJECTIONS.labels(limit).inc()
+            upload_sessions.delete(session_id)
+            await query.edit_message_text(
+                f"⛔ <b>Kuota Harian Habis</b>\n\n"
+                f"🆔 <b>Session:</b> <code>{session_id}</code>\n"
+                f"📊 <b>Terpakai:</b> {format_usage_amount(limit, used)} / {format_usage_amount(limit, quota)}\n"
+                f"📦 <b>Sesi ini:</b> {format_usage_amount('bytes_out', bytes_out)}, {file_count} file\n\n"
+                f"Kuota dihitung dari 24 jam terakhir. Cek /usage.",
+                parse_mode=ParseMode.HTML
+            )
+            return
+
+        # Wait for a free slot (global + per-user limits, small files first); kept for a restart
+        upload_sessions.update(session_id, workflow_data=workflow_data)
+        position = job_scheduler.submit(
+            session_id, user_id, size, lambda: launch_session(session_id, workflow_data)
+        )
+        if position:
+            await query.edit_message_text(
+                f"🕒 <b>Masuk Antrean</b>\n\n"
+                f"🆔 <b>Session:</b> <code>{session_id}</code>\n"
+                f"📍 <b>Posisi:</b> {position}\n\n"
+                f"Upload dimulai otomatis saat slot tersedia.\n\n"
+                f"💡 Cancel: <code>/cancel_{session_id}</code>",
+                parse_mode=ParseMode.HTML
+            )
+        
+    elif action == 'cancel':
+        if session['status'] in TERMINAL_STATUSES:
+            await query.answer(f"ℹ️ Sesi ini sudah selesai ({session['status']}).", show_alert=True)
+            return
+        if session['status'] != 'pending':
+            # Already confirmed: it holds a slot / reservation and may be running
+            await query.answer()
+            await abort_session(context.bot, session_id, session)
+            return
+        upload_sessions.delete(session_id)
+        await query.answer()
+        await query.edit_message_text(
+            f"❌ <b>Upload Dibatalkan</b>\n\n"
+            f"🆔 Session: <code>{session_id}</code>\n"
+            f"⏰ {datetime.now().strftime('%H:%M:%S')}",
+            parse_mode=ParseMode.HTML
+        )
+
+async def launch_session(session_id: str, workflow_data: dict):
+    """Dispatch a session admitted by the scheduler"""
+    session = upload_sessions.get(session_id)
+    if session is None or session['status'] != 'queued':
+        job_scheduler.release(session_id)
+        usage_ledger.release(session_id)
+        return
+    upload_sessions.update(session_id, status='processing')
+    chat_id, message_id = workflow_data['chat_id'], workflow_data['message_id']
+    
+    # Show initial status
+    status_text = f"""
 🚀 <b>Upload Dimulai!</b>
 
 🆔 <b>Session:</b> <code>{session_id}</code>
@@ -419,24 +693,24 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 💡 Cancel: <code>/cancel_{session_id}</code>
 """
-        
-        await query.edit_message_text(status_text, parse_mode=ParseMode.HTML)
-        
-        # Trigger GitHub Actions
-        success = trigger_github_workflow(session_id, session['service'], workflow_data)
-        
-        if success:
-            # Start loading animation
-            asyncio.create_task(animate_loading(
-                query.message.chat_id,
-                query.message.message_id,
-                session_id,
-                session['service'],
-                len(session['files']),
-                context
-            ))
-        else:
-            status_text = f"""
+    
+    await edit_scheduler.edit(chat_id, message_id, status_text)
+    
+    # Trigger GitHub Actions / local workers
+    success = await trigger_workflow(session_id, session['service'], workflow_data)
+    DISPATCHES.labels(DISPATCH_MODE, 'ok' if success else 'failed').inc()
+    
+    if success:
+        COMMAND_TO_DISPATCH.observe((datetime.now() - datetime.fromisoformat(session['created_at'])).total_seconds())
+        # Start loading animation (local workers pick the job up right away)
+        if job_queue is None:
+            animate_loading(chat_id, message_id, session_id)
+            dispatched_sessions[session_id] = False
+    else:
+        upload_sessions.update(session_id, status='failed')
+        job_scheduler.release(session_id)
+        usage_ledger.release(session_id)
+        status_text = f"""
 ❌ <b>Gagal Memulai Upload</b>
 
 🆔 <b>Session:</b> <code>{session_id}</code>
@@ -444,16 +718,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 GitHub Actions gagal di-trigger.
 Silakan coba lagi atau hubungi admin.
 """
-            await query.edit_message_text(status_text, parse_mode=ParseMode.HTML)
-        
-    elif action == 'cancel':
-        del upload_sessions[session_id]
-        await query.edit_message_text(
-            f"❌ <b>Upload Dibatalkan</b>\n\n"
-            f"🆔 Session: <code>{session_id}</code>\n"
-            f"⏰ {datetime.now().strftime('%H:%M:%S')}",
-            parse_mode=ParseMode.HTML
-        )
+        await edit_scheduler.edit(chat_id, message_id, status_text)
 
 async def cancel_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Cancel an upload session"""
@@ -468,7 +733,8 @@ async def cancel_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
     
-    if session_id not in upload_sessions:
+    session = upload_sessions.get(session_id)
+    if session is None:
         await update.message.reply_text(
             f"❌ Session <code>{session_id}</code> tidak ditemukan!\n\n"
             f"Gunakan /status untuk melihat sesi aktif.",
@@ -477,32 +743,155 @@ async def cancel_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     user_id = str(update.effective_user.id)
-    session = upload_sessions[session_id]
     
     if session['user_id'] != user_id:
         await update.message.reply_text("❌ Kamu hanya bisa cancel upload milikmu sendiri!")
         return
     
-    # Create cancellation signal
-    os.makedirs('/tmp/cancel_queue', exist_ok=True)
-    with open(f'/tmp/cancel_queue/{session_id}.cancel', 'w') as f:
-        f.write(datetime.now().isoformat())
+    if session['status'] in TERMINAL_STATUSES:
+        await update.message.reply_text(
+            f"ℹ️ Session <code>{session_id}</code> sudah selesai ({session['status']}).",
+            parse_mode=ParseMode.HTML
+        )
+        return
     
-    del upload_sessions[session_id]
+    await abort_session(context.bot, session_id, session)
     
     await update.message.reply_text(
         f"✅ <b>Upload Dibatalkan</b>\n\n"
         f"🆔 Session: <code>{session_id}</code>\n"
-        f"⏰ {datetime.now().strftime('%H:%M:%S')}\n\n"
-        f"GitHub Actions akan menghentikan proses.",
+        f"⏰ {datetime.now().strftime('%H:%M:%S')}",
         parse_mode=ParseMode.HTML
     )
 
+async def abort_session(bot, session_id: str, session: dict):
+    """Cancel a confirmed session: free its slot and reservation, stop its workers, update its status message"""
+    upload_sessions.update(session_id, status='cancelled')
+    loading_animations.pop(session_id, None)
+    job_scheduler.discard(session_id)
+    usage_ledger.release(session_id)
+    if session['status'] == 'processing':
+        job_scheduler.release(session_id)
+        dispatched_sessions.pop(session_id, None)
+        await cancel_in_workers(bot, session_id)
+    
+    if session.get('status_message'):
+        chat_id, message_id = session['status_message']
+        edit_scheduler.forget(chat_id, message_id)
+        edit_scheduler.submit(chat_id, message_id, format_cancelled(session_id))
+
+async def cancel_in_workers(bot, session_id: str):
+    """Stop a dispatched session wherever it runs"""
+    if local_engine is not None:
+        local_engine.cancel(session_id)
+    if job_queue is not None:
+        job_queue.cancel(session_id)
+        return
+    if dispatch_batcher.discard(session_id):
+        return
+    
+    # GitHub Actions: signal the worker's userbot directly (aborts within a second);
+    # a run carrying only this session is also cancelled through the API
+    if worker_chat_id is not None:
+        try:
+            await bot.send_message(worker_chat_id, encode_cancel([session_id], TELEGRAM_BOT_TOKEN))
+        except Exception as e:
+            print(f"⚠️ Gagal mengirim cancel ke worker: {e}")
+    await github_dispatcher.cancel_run(session_id)
+
+async def apply_worker_report(report: dict):
+    """Remember the mirrors of a finished session, record its final status and usage"""
+    for f in report.get('files', []):
+        for service, url in f.get('urls', {}).items():
+            mirror_cache.store(f['key'], service, url, f.get('name'), f.get('size'))
+        if f.get('source'):
+            # A link the bot could not resolve up front: the next confirmation shows its name and size
+            chat_id, message_id = f['source']
+            link_resolver.remember(chat_id, message_id, FileRef('link', chat_id, message_id, None,
+                                                                f.get('name'), f.get('size')))
+    
+    session_id = report.get('session_id')
+    session = upload_sessions.get(session_id) if session_id else None
+    if session is None or not report.get('status'):
+        return
+    if report['status'] == 'processing':
+        # The worker has taken over the status message
+        loading_animations.pop(session_id, None)
+    if session['status'] != 'cancelled':
+        upload_sessions.update(session_id, status=report['status'])
+    if report['status'] in TERMINAL_STATUSES:
+        dispatched_sessions.pop(session_id, None)
+        job_scheduler.release(session_id)
+        settle_usage(session_id, session, report)
+
+async def watch_workflow_runs():
+    """Free the slots of sessions whose workflow run ended without a final report
+
+    A run that crashed, timed out or was cancelled on GitHub never reports,
+    so its sessions would hold their scheduler slots for the whole lease.
+    A session is given up once its run has been seen completed on two
+    checks in a row (a report sent at the end of the run may still be in
+    transit on the first).
+    """
+    while True:
+        await asyncio.sleep(RUN_WATCH_INTERVAL)
+        if not dispatched_sessions:
+            continue
+        finished = await github_dispatcher.finished_sessions()
+        if finished is None:
+            continue
+        
+        for session_id, seen in list(dispatched_sessions.items()):
+            if session_id not in finished:
+                continue
+            if not seen:
+                dispatched_sessions[session_id] = True
+                continue
+            
+            dispatched_sessions.pop(session_id, None)
+            job_scheduler.release(session_id)
+            usage_ledger.release(session_id)
+            session = upload_sessions.get(session_id)
+            if session is None or session['status'] in TERMINAL_STATUSES:
+                continue
+            print(f"⚠️ Run sesi {session_id} selesai ({finished[session_id]}) tanpa report")
+            upload_sessions.update(session_id, status='failed')
+            if session.get('status_message'):
+                chat_id, message_id = session['status_message']
+                edit_scheduler.submit(
+                    chat_id, message_id,
+                    f"❌ <b>Upload Gagal</b>\n\n"
+                    f"🆔 <b>Session:</b> <code>{session_id}</code>\n\n"
+                    f"Workflow run berakhir ({finished[session_id]}) tanpa mengirim hasil.\n"
+                    f"Silakan coba lagi."
+                )
+
+async def handle_worker_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Receive signed results from the worker's userbot and remember the mirrors"""
+    message = update.message
+    report = decode_report(message.text, TELEGRAM_BOT_TOKEN)
+    if report is None:
+        return
+    
+    global worker_chat_id
+    worker_chat_id = message.chat_id
+    await apply_worker_report(report)
+    
+    # Cancelled before the run started: tell the worker as soon as it picks the session up
+    session = upload_sessions.get(report.get('session_id') or '')
+    if report.get('status') == 'processing' and session and session['status'] == 'cancelled':
+        await context.bot.send_message(message.chat_id, encode_cancel([report['session_id']], TELEGRAM_BOT_TOKEN))
+    
+    try:
+        await message.delete()
+    except Exception:
+        pass
+
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show active upload sessions"""
     user_id = str(update.effective_user.id)
     
-    user_sessions = {k: v for k, v in upload_sessions.items() if v['user_id'] == user_id}
+    user_sessions = upload_sessions.for_user(user_id)
     
     if not user_sessions:
         await update.message.reply_text(
@@ -515,12 +904,13 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     status_text = "📊 <b>Sesi Upload Aktif</b>\n\n"
     
-    for session_id, session in user_sessions.items():
+    for session_id, session in user_sessions:
         created = datetime.fromisoformat(session['created_at'])
         elapsed = (datetime.now() - created).seconds
         
         status_icon = {
             'pending': '⏸',
+            'queued': '🕒',
             'processing': '🔄',
             'completed': '✅',
             'failed': '❌'
@@ -532,38 +922,231 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 📦 Files: {len(session['files'])}
 ⏱ Status: {session['status']}
 ⏰ Elapsed: {elapsed}s
-━━━━━━━━━━━━━━
 """
+        position = job_scheduler.position(session_id)
+        if position:
+            status_text += f"📍 Antrean: {position}\n"
+        status_text += "━━━━━━━━━━━━━━\n"
     
+    load = job_scheduler.snapshot()
+    status_text += f"\n⚙️ Slot: {load['in_flight']}/{MAX_ACTIVE_SESSIONS} aktif, {load['queued']} antre"
     status_text += f"\n💡 Cancel: <code>/cancel_[session_id]</code>"
     
     await update.message.reply_text(status_text, parse_mode=ParseMode.HTML)
 
+async def usage_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the user's usage and quotas, read from the pre-aggregated ledger buckets"""
+    user_id = str(update.effective_user.id)
+
+    if AUTHORIZED_USERS and user_id not in AUTHORIZED_USERS:
+        await update.message.reply_text("❌ Kamu tidak diizinkan menggunakan bot ini.")
+        return
+
+    day = usage_ledger.totals(user_id)
+    reserved = usage_ledger.reserved(user_id)
+    quotas = quotas_for(user_id)
+
+    usage_text = "📊 <b>Pemakaian Kamu</b>\n\n<b>24 jam terakhir:</b>\n"
+    for icon, label, limit in (('📤', 'Upload', 'bytes_out'), ('📦', 'File', 'files'),
+                               ('⏱', 'Runner', 'runner_seconds')):
+        line = f"{icon} {label}: {format_usage_amount(limit, day[limit])}"
+        if quotas[limit]:
+            line += f" / {format_usage_amount(limit, quotas[limit])} ({day[limit] / quotas[limit]:.0%})"
+        usage_text += line + "\n"
+    usage_text += f"📥 Download: {format_size(day['bytes_in'])} • {day['sessions']} sesi\n"
+    if reserved['files']:
+        usage_text += (f"🔄 Sedang berjalan: {format_size(reserved['bytes_out'])}, "
+                       f"{reserved['files']} file (belum dihitung)\n")
+
+    services = usage_ledger.totals(user_id, by_service=True)
+    if any(entry['files'] for entry in services.values()):
+        usage_text += "\n<b>Per service (24 jam):</b>\n"
+        for service, entry in sorted(services.items(), key=lambda item: -item[1]['bytes_out']):
+            if entry['files']:
+                usage_text += f"• {service}: {format_size(entry['bytes_out'])}, {entry['files']} file\n"
+
+    usage_text += "\n"
+    for label, window in (('7 hari', 7 * DAY), ('30 hari', 30 * DAY)):
+        total = usage_ledger.totals(user_id, window)
+        usage_text += (f"📅 {label}: {format_size(total['bytes_out'])}, {total['files']} file, "
+                       f"{total['runner_seconds'] / 60:.0f} menit runner\n")
+
+    await update.message.reply_text(usage_text, parse_mode=ParseMode.HTML)
+
+async def start_local_workers(application: Application):
+    """Run upload workers inside the bot process (DISPATCH_MODE=inprocess)"""
+    global local_engine
+    # Worker dependencies (Telethon, uploaders) are only needed in this mode
+    from workflow_handler import JobEngine, serve_queue
+    
+    local_engine = JobEngine.from_env(
+        bot=application.bot,
+        edits=edit_scheduler,
+        on_report=apply_worker_report
+    )
+    await local_engine.start()
+    for i in range(max(LOCAL_WORKERS, 1)):
+        local_workers.append(asyncio.create_task(serve_queue(local_engine, job_queue, f"inprocess-{i}")))
+
+async def start_link_preflight():
+    """Give the link resolver a userbot: the in-process worker's, or the bot's own pre-flight session"""
+    global preflight_client
+    if not LINK_PREFLIGHT:
+        return
+    if local_engine is not None:
+        link_resolver.client = local_engine.client
+        return
+    if not PREFLIGHT_STRING_SESSION:
+        return
+    # Telethon is only needed with a pre-flight session
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+    
+    try:
+        client = TelegramClient(
+            StringSession(PREFLIGHT_STRING_SESSION),
+            int(os.environ.get('TELEGRAM_API_ID', '')),
+            os.environ.get('TELEGRAM_API_HASH')
+        )
+        await client.connect()
+        if not await client.is_user_authorized():
+            await client.disconnect()
+            raise RuntimeError("PREFLIGHT_STRING_SESSION tidak valid")
+    except Exception as e:
+        print(f"⚠️ Pre-flight link nonaktif: {e}")
+        return
+    preflight_client = link_resolver.client = client
+    print("🔎 Pre-flight link aktif")
+
+def recover_sessions():
+    """Pick up the sessions a previous bot process confirmed: the fair queue lived only in its memory
+
+    Queued sessions are submitted again; dispatched ones get their slot
+    back (and, on GitHub Actions, the run watcher). In-process workers died
+    with the old process, so their jobs go back to the job queue.
+    """
+    if DISPATCH_MODE == 'inprocess':
+        requeued = job_queue.requeue_running()
+        if requeued:
+            print(f"♻️ {requeued} job lokal dijalankan ulang setelah restart")
+    for session_id, session in upload_sessions.by_status(('queued', 'processing')):
+        if session['status'] == 'processing':
+            job_scheduler.restore(session_id, session['user_id'])
+            if job_queue is None:
+                dispatched_sessions[session_id] = False
+            continue
+        workflow_data = session.get('workflow_data')
+        if workflow_data is None:
+            # Confirmed by an older version, which did not keep what to dispatch
+            upload_sessions.update(session_id, status='failed')
+            usage_ledger.release(session_id)
+            if session.get('status_message'):
+                chat_id, message_id = session['status_message']
+                edit_scheduler.submit(
+                    chat_id, message_id,
+                    f"❌ <b>Upload Gagal</b>\n\n"
+                    f"🆔 <b>Session:</b> <code>{session_id}</code>\n\n"
+                    f"Bot dimulai ulang sebelum upload berjalan. Silakan coba lagi."
+                )
+            continue
+        size = sum(FileRef.unpack(packed).size or 0 for packed in workflow_data['files'])
+        job_scheduler.submit(
+            session_id, session['user_id'], size,
+            lambda session_id=session_id, workflow_data=workflow_data: launch_session(session_id, workflow_data)
+        )
+    recovered = job_scheduler.snapshot()
+    if recovered['queued'] or recovered['in_flight']:
+        print(f"♻️ Sesi dipulihkan: {recovered['in_flight']} berjalan, {recovered['queued']} antre")
+
+async def post_init(application: Application):
+    """Start background services and resolve branch/workflow id before the first confirmation"""
+    global loading_ticker, metrics_runner, run_watcher
+    edit_scheduler.start(application.bot)
+    if METRICS_PORT:
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    mirror_cache.purge_expired()
+    usage_ledger.purge_expired()
+    loading_ticker = asyncio.create_task(run_loading_animations())
+    recover_sessions()
+    if job_queue is None and RUN_WATCH_INTERVAL > 0:
+        run_watcher = asyncio.create_task(watch_workflow_runs())
+    if DISPATCH_MODE == 'inprocess':
+        await start_local_workers(application)
+    await start_link_preflight()
+    link_resolver.purge_expired()
+    if job_queue is None:
+        await github_dispatcher.warm_up()
+
+async def post_shutdown(application: Application):
+    """Release shared network resources"""
+    if loading_ticker is not None:
+        loading_ticker.cancel()
+    if run_watcher is not None:
+        run_watcher.cancel()
+    for task in local_workers:
+        task.cancel()
+    await asyncio.gather(*local_workers, return_exceptions=True)
+    if local_engine is not None:
+        await local_engine.stop()
+    await edit_scheduler.stop()
+    await dispatch_batcher.close()
+    await github_dispatcher.close()
+    await mirror_cache.close()
+    if preflight_client is not None:
+        await preflight_client.disconnect()
+    link_resolver.close()
+    upload_sessions.close()
+    usage_ledger.close()
+    if job_queue is not None:
+        job_queue.close()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
 def main():
     """Start the bot"""
     if not TELEGRAM_BOT_TOKEN:
         print("❌ TELEGRAM_BOT_TOKEN tidak ditemukan!")
         return
     
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .base_url(BOT_API_URL)
+        .concurrent_updates(True)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Command handlers
+    # Remember album items (own group, so it never shadows the handlers below)
+    application.add_handler(
+        MessageHandler(filters.ATTACHMENT, remember_media_group),
+        group=-1
+    )
+    
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("status", status_command))
+    application.add_handler(CommandHandler("usage", usage_command))
     
     # Upload service handlers
-    services = ['pixeldrain', 'gofile', 'catbox', 'anonfiles', 'fileio']
-    for service in services:
+    for service in SERVICES:
         application.add_handler(
             CommandHandler(service, lambda u, c, s=service: handle_upload_command(u, c, s))
         )
+    application.add_handler(CommandHandler("mirror", handle_mirror_command))
     
     # Cancel handler
     application.add_handler(
         MessageHandler(filters.Regex(r'^/cancel_[a-f0-9]{8}'), cancel_upload)
     )
     
+    # Results reported back by the worker
+    application.add_handler(
+        MessageHandler(filters.TEXT & filters.Regex(f'^{REPORT_PREFIX}'), handle_worker_report)
+    )
+    
     # Button callback handler
     application.add_handler(CallbackQueryHandler(button_callback))
     
@@ -0,0 +1,194 @@
+import os
+import re
+import json
+import time
+import fcntl
+import base64
+from pathlib import Path
+
+
+class Checkpoint:
+    """Resume state of one file, persisted as a small JSON manifest
+
+    Records which download parts are already on disk (a bitmap over
+    `part_size` parts) and which services already have the file, so a
+    restarted worker only fetches the missing parts and only uploads to the
+    hosts that did not finish. A checkpoint (and the partial file named
+    after it) belongs to one session at a time: `open` takes an exclusive
+    lock on the key until `release`.
+    """
+
+    def __init__(self, path: Path, key: str, size: int, part_size: int, flush_interval: float = 2.0):
+        self.path = path
+        self.key = key
+        self.size = size
+        self.part_size = part_size
+        self.flush_interval = flush_interval
+        self.parts = bytearray((self.part_count + 7) // 8)
+        self.uploads = {}
+        self._saved_at = 0.0
+        self._lock = None
+
+    @property
+    def part_count(self):
+        return -(-self.size // self.part_size)
+
+    @property
+    def slug(self):
+        return self.path.stem
+
+    @classmethod
+    def open(cls, directory: Path, key: str, size: int, part_size: int, flush_interval: float = 2.0):
+        """Load the manifest for `key`, or start a fresh one if it is missing or for another file
+
+        Returns None while another session (in this process or another
+        worker on the host) holds the checkpoint of the same key.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{re.sub(r'[^A-Za-z0-9_-]', '_', key)}.json"
+        lock = open(path.with_suffix('.lock'), 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return None
+        checkpoint = cls(path, key, size, part_size, flush_interval)
+        checkpoint._lock = lock
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return checkpoint
+        if (data.get('key'), data.get('size'), data.get('part_size')) == (key, size, part_size):
+            parts = base64.b64decode(data.get('parts', ''))
+            if len(parts) == len(checkpoint.parts):
+                checkpoint.parts = bytearray(parts)
+            checkpoint.uploads = data.get('uploads', {})
+        return checkpoint
+
+    # --- Download parts ---
+
+    def has_part(self, index: int):
+        return bool(self.parts[index // 8] & (1 << (index % 8)))
+
+    def mark_part(self, index: int):
+        self.parts[index // 8] |= 1 << (index % 8)
+        if time.monotonic() - self._saved_at >= self.flush_interval:
+            self.save()
+
+    def reset_parts(self):
+        """The partial file is gone: every part has to be downloaded again"""
+        self.parts = bytearray(len(self.parts))
+
+    def done_parts(self):
+        return {index for index in range(self.part_count) if self.has_part(index)}
+
+    @property
+    def bytes_done(self):
+        done = self.done_parts()
+        total = len(done) * self.part_size
+        if self.part_count - 1 in done:
+            total -= self.part_count * self.part_size - self.size
+        return total
+
+    # --- Uploads ---
+
+    def mark_uploaded(self, service: str, url: str):
+        self.uploads[service] = url
+        self.save()
+
+    # --- Persistence ---
+
+    def save(self):
+        """Write the manifest atomically (a crash never leaves a half-written file)"""
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps({
+            'key': self.key,
+            'size': self.size,
+            'part_size': self.part_size,
+            'parts': base64.b64encode(bytes(self.parts)).decode(),
+            'uploads': self.uploads,
+            'updated_at': time.time()
+        }))
+        os.replace(tmp, self.path)
+        self._saved_at = time.monotonic()
+
+    def release(self):
+        """Hand the checkpoint back (file finished, failed or cancelled)"""
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def discard(self):
+        """Forget the file once it is fully mirrored (the lock file goes too; it is still held until `release`)"""
+        for path in (self.path, self.path.with_suffix('.lock')):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _allocated(path: Path):
+    try:
+        return path.stat().st_blocks * 512
+    except OSError:
+        return 0
+
+
+def prune(directory: Path, part_dir: Path, max_age: float, max_bytes: int):
+    """Drop abandoned checkpoints so restored caches do not grow from run to run
+
+    A checkpoint whose manifest was last updated more than `max_age`
+    seconds ago goes, with its partial file; so do partial files and lock
+    files whose manifest is gone. Of what is left, the oldest go until the
+    partial files take at most `max_bytes`. Checkpoints another session
+    holds are never touched. Returns the number of checkpoints removed.
+    """
+    if not directory.is_dir():
+        return 0
+    slugs = {path.stem for path in directory.glob('*.json')} | {path.stem for path in directory.glob('*.lock')}
+    if part_dir.is_dir():
+        slugs |= {path.stem for path in part_dir.glob('*.part')}
+
+    now = time.time()
+    idle, locks = [], []
+    for slug in slugs:
+        lock = open(directory / f"{slug}.lock", 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            continue
+        locks.append(lock)
+        manifest, part = directory / f"{slug}.json", part_dir / f"{slug}.part"
+        try:
+            updated_at = json.loads(manifest.read_text()).get('updated_at', 0)
+        except (OSError, ValueError, AttributeError):
+            updated_at = None
+        idle.append((updated_at, slug, manifest, part))
+
+    def remove(manifest, part):
+        for path in (manifest, part, manifest.with_suffix('.lock'), manifest.with_suffix('.tmp')):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    removed = 0
+    kept = []
+    for updated_at, slug, manifest, part in idle:
+        if updated_at is None or now - updated_at > max_age:
+            remove(manifest, part)
+            removed += 1
+        else:
+            kept.append((updated_at, slug, manifest, part))
+    total = sum(_allocated(part) for *_, part in kept)
+    for updated_at, slug, manifest, part in sorted(kept):
+        if total <= max_bytes:
+            break
+        total -= _allocated(part)
+        remove(manifest, part)
+        removed += 1
+    # Lock files are unlinked while still held, so no one can lock the old file and lose the race
+    for lock in locks:
+        lock.close()
+    return removed
@@ -0,0 +1,226 @@
+import time
+import asyncio
+from collections import OrderedDict
+from metrics import counter, histogram
+
+# telegram.constants.ParseMode.HTML; python-telegram-bot itself is imported when the editor starts,
+# so a worker can open its Telegram connections while the library loads
+HTML = 'HTML'
+
+# Telegram flood limits: ~30 requests/s per bot, ~1/s per private chat, ~20/min per group
+GLOBAL_EDITS_PER_SECOND = 25
+PRIVATE_CHAT_INTERVAL = 1.0
+GROUP_CHAT_INTERVAL = 3.0
+
+EDITS = counter('telegram_edits_total', 'Status message edits by outcome', ('result',))
+EDIT_LATENCY = histogram('telegram_edit_seconds', 'editMessageText latency')
+RETRY_AFTER = counter('telegram_retry_after_seconds_total', 'Seconds of flood wait imposed by Telegram (429)')
+
+
+def retry_after_seconds(error):
+    """RetryAfter.retry_after is an int in PTB 21 and a timedelta in later releases"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class _PendingEdit:
+    __slots__ = ('text', 'parse_mode', 'reply_markup', 'waiters')
+
+    def __init__(self, text, parse_mode, reply_markup):
+        self.text = text
+        self.parse_mode = parse_mode
+        self.reply_markup = reply_markup
+        self.waiters = []
+
+
+class EditScheduler:
+    """Central, coalescing message editor that stays inside Telegram rate limits
+
+    Edits are keyed by (chat_id, message_id); submitting a new text for a key
+    that is still queued replaces the old one, so only the latest text is sent.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_EDITS_PER_SECOND,
+                 private_interval: float = PRIVATE_CHAT_INTERVAL,
+                 group_interval: float = GROUP_CHAT_INTERVAL,
+                 history_size: int = 4096):
+        self.bot = None
+        self.global_interval = 1.0 / global_rate
+        self.private_interval = private_interval
+        self.group_interval = group_interval
+        self.history_size = history_size
+        self._pending = OrderedDict()
+        self._last_sent = OrderedDict()
+        self._chat_ready_at = {}
+        self._global_ready_at = 0.0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.stats = {'submitted': 0, 'sent': 0, 'coalesced': 0, 'unchanged': 0, 'rate_limited': 0, 'failed': 0}
+
+    def start(self, bot):
+        """Start the background sender for the given telegram.Bot"""
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, drain: bool = True, timeout: float = 30.0):
+        """Stop the sender, optionally flushing queued edits first"""
+        if drain and self._pending and self._task is not None:
+            try:
+                await asyncio.wait_for(self._drained(), timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Dropping {len(self._pending)} queued message edits")
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for pending in self._pending.values():
+            self._resolve(pending, False)
+        self._pending.clear()
+
+    async def _drained(self):
+        while self._pending:
+            await asyncio.sleep(0.1)
+
+    def submit(self, chat_id, message_id, text: str, parse_mode=HTML, reply_markup=None):
+        """Queue an edit without waiting; returns a future resolved with True once it is applied"""
+        future = asyncio.get_running_loop().create_future()
+        key = (chat_id, message_id)
+        self.stats['submitted'] += 1
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.stats['coalesced'] += 1
+            EDITS.labels('coalesced').inc()
+            pending.text = text
+            pending.parse_mode = parse_mode
+            pending.reply_markup = reply_markup
+        elif reply_markup is None and self._last_sent.get(key) == text:
+            # Identical to what the message already shows
+            self.stats['unchanged'] += 1
+            EDITS.labels('skipped').inc()
+            future.set_result(True)
+            return future
+        else:
+            pending = _PendingEdit(text, parse_mode, reply_markup)
+            self._pending[key] = pending
+
+        pending.waiters.append(future)
+        self._wakeup.set()
+        return future
+
+    async def edit(self, chat_id, message_id, text: str, parse_mode=HTML, reply_markup=None):
+        """Queue an edit and wait until it has been applied (or given up on)"""
+        return await self.submit(chat_id, message_id, text, parse_mode, reply_markup)
+
+    def forget(self, chat_id, message_id):
+        """Drop queued edits and history for a message that is no longer updated"""
+        key = (chat_id, message_id)
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            self._resolve(pending, False)
+        self._last_sent.pop(key, None)
+
+    def _chat_interval(self, chat_id):
+        if isinstance(chat_id, int) and chat_id > 0:
+            return self.private_interval
+        return self.group_interval
+
+    def _next_ready(self, now):
+        """Return (key, 0) for the oldest edit whose chat may be edited now, else (None, delay)"""
+        earliest = None
+        for key in self._pending:
+            ready_at = self._chat_ready_at.get(key[0], 0.0)
+            if ready_at <= now:
+                return key, 0.0
+            earliest = ready_at if earliest is None else min(earliest, ready_at)
+        return None, (earliest - now if earliest is not None else None)
+
+    async def _run(self):
+        from telegram.error import RetryAfter, BadRequest, TelegramError
+
+        while True:
+            now = time.monotonic()
+            if self._global_ready_at > now:
+                await asyncio.sleep(self._global_ready_at - now)
+                continue
+
+            key, delay = self._next_ready(now)
+            if key is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            pending = self._pending.pop(key)
+            chat_id, message_id = key
+            self._global_ready_at = now + self.global_interval
+            self._chat_ready_at[chat_id] = now + self._chat_interval(chat_id)
+
+            try:
+                with EDIT_LATENCY.time():
+                    await self.bot.edit_message_text(
+                        chat_id=chat_id,
+                        message_id=message_id,
+                        text=pending.text,
+                        parse_mode=pending.parse_mode,
+                        reply_markup=pending.reply_markup
+                    )
+                self.stats['sent'] += 1
+                EDITS.labels('sent').inc()
+                self._remember(key, pending.text)
+                self._resolve(pending, True)
+            except RetryAfter as e:
+                # Flood control: back off globally and put the edit back (unless superseded)
+                wait = retry_after_seconds(e)
+                self.stats['rate_limited'] += 1
+                EDITS.labels('rate_limited').inc()
+                RETRY_AFTER.inc(wait)
+                print(f"⚠️ Telegram flood limit, retrying edits in {wait:.0f}s")
+                self._global_ready_at = time.monotonic() + wait
+                self._chat_ready_at[chat_id] = self._global_ready_at
+                self._requeue(key, pending)
+            except BadRequest as e:
+                if 'not modified' in str(e).lower():
+                    self.stats['unchanged'] += 1
+                    EDITS.labels('unchanged').inc()
+                    self._remember(key, pending.text)
+                    self._resolve(pending, True)
+                else:
+                    self.stats['failed'] += 1
+                    EDITS.labels('failed').inc()
+                    print(f"⚠️ Edit failed for {chat_id}/{message_id}: {e}")
+                    self._resolve(pending, False)
+            except TelegramError as e:
+                self.stats['failed'] += 1
+                EDITS.labels('failed').inc()
+                print(f"⚠️ Edit failed for {chat_id}/{message_id}: {e}")
+                self._resolve(pending, False)
+
+    def _requeue(self, key, pending):
+        newer = self._pending.get(key)
+        if newer is None:
+            self._pending[key] = pending
+            self._pending.move_to_end(key, last=False)
+        else:
+            newer.waiters.extend(pending.waiters)
+
+    def _remember(self, key, text):
+        self._last_sent[key] = text
+        self._last_sent.move_to_end(key)
+        while len(self._last_sent) > self.history_size:
+            self._last_sent.popitem(last=False)
+
+    @staticmethod
+    def _resolve(pending, result):
+        for future in pending.waiters:
+            if not future.done():
+                future.set_result(result)
+        pending.waiters.clear()
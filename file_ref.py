@@ -0,0 +1,79 @@
+# Kinds of session entries; the index is the wire code
+KINDS = ('document', 'photo', 'video', 'audio', 'voice', 'animation', 'video_note', 'sticker', 'link')
+
+# Message attribute -> default file name (formatted with file_unique_id).
+# Checked in order: animations also carry a `document`, so they come first.
+MEDIA_TYPES = (
+    ('animation', 'animation_{}.mp4'),
+    ('document', 'file_{}'),
+    ('video', 'video_{}.mp4'),
+    ('audio', 'audio_{}.mp3'),
+    ('voice', 'voice_{}.ogg'),
+    ('video_note', 'video_note_{}.mp4'),
+    ('photo', 'photo_{}.jpg'),
+    ('sticker', 'sticker_{}.webp'),
+)
+
+# Keys of the verbose dict format used before FileRef (sessions stored by older versions)
+_LEGACY_KEYS = ('type', 'chat_id', 'message_id', 'file_unique_id', 'file_name', 'file_size')
+
+
+class FileRef:
+    """One file of a session: where the worker finds it and what the bot shows
+
+    Stored and dispatched as a short JSON array
+    `[kind, chat_id, message_id, unique_id, name, size]` (trailing empty
+    fields dropped), so a 100-file session stays far below GitHub's
+    dispatch input limit.
+    """
+
+    __slots__ = ('kind', 'chat_id', 'message_id', 'unique_id', 'name', 'size')
+
+    def __init__(self, kind: str, chat_id, message_id: int, unique_id: str = None, name: str = None,
+                 size: int = None):
+        self.kind = kind
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.unique_id = unique_id
+        self.name = name
+        self.size = size
+
+    @classmethod
+    def from_message(cls, msg):
+        """FileRef for a Bot API message carrying any kind of media, or None"""
+        for attr, default_name in MEDIA_TYPES:
+            media = getattr(msg, attr, None)
+            if not media:
+                continue
+            if attr == 'photo':
+                media = media[-1]
+            name = getattr(media, 'file_name', None) or default_name.format(media.file_unique_id)
+            return cls(attr, msg.chat_id, msg.message_id, media.file_unique_id, name, media.file_size)
+        return None
+
+    @classmethod
+    def link(cls, chat_id, message_id: int):
+        return cls('link', chat_id, message_id)
+
+    @property
+    def key(self):
+        """Stable identity for the mirror cache: file_unique_id, or the source message for links"""
+        return self.unique_id or f"link:{self.chat_id}:{self.message_id}"
+
+    def pack(self):
+        packed = [KINDS.index(self.kind), self.chat_id, self.message_id, self.unique_id, self.name, self.size]
+        while packed[-1] is None:
+            packed.pop()
+        return packed
+
+    @classmethod
+    def unpack(cls, packed):
+        """Inverse of `pack`; also accepts the verbose dicts of older sessions"""
+        if isinstance(packed, dict):
+            kind, chat_id, message_id, unique_id, name, size = (packed.get(k) for k in _LEGACY_KEYS)
+            return cls(kind or 'link', chat_id, message_id, unique_id, name, size)
+        kind, chat_id, message_id, *rest = packed
+        return cls(KINDS[kind], chat_id, message_id, *rest)
+
+    def __repr__(self):
+        return f"FileRef({self.kind}, {self.chat_id}/{self.message_id}, {self.name!r}, {self.size})"
@@ -0,0 +1,373 @@
+import json
+import time
+import asyncio
+import aiohttp
+from metrics import counter, histogram
+
+GITHUB_API_URL = 'https://api.github.com'
+
+GITHUB_REQUESTS = counter('github_api_requests_total', 'GitHub API requests by response status',
+                          ('method', 'endpoint', 'status'))
+GITHUB_LATENCY = histogram('github_api_request_seconds', 'GitHub API request latency', ('method', 'endpoint'))
+
+
+def _endpoint(path: str):
+    """Low-cardinality name of an API path: repo, workflow, dispatches, runs, cancel"""
+    parts = path.strip('/').split('/')
+    if len(parts) <= 3:
+        return 'repo'
+    if parts[-2] == 'workflows':
+        return 'workflow'
+    return parts[-1]
+
+
+class _CacheEntry:
+    """Cached API value with its ETag for conditional revalidation"""
+    __slots__ = ('value', 'etag', 'expires_at')
+
+    def __init__(self, value, etag, ttl):
+        self.value = value
+        self.etag = etag
+        self.expires_at = time.monotonic() + ttl
+
+    @property
+    def fresh(self):
+        return time.monotonic() < self.expires_at
+
+
+class GitHubDispatcher:
+    """Non-blocking GitHub Actions dispatcher with a shared keep-alive connection pool"""
+
+    def __init__(self, token: str, repo: str, workflow: str = 'upload.yml',
+                 max_concurrency: int = 4, timeout: float = 15.0, api_url: str = GITHUB_API_URL,
+                 cache_ttl: float = 600.0):
+        self.token = token
+        self.repo = repo
+        self.workflow = workflow
+        self.api_url = api_url.rstrip('/')
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout, connect=min(timeout, 5.0))
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._refreshing = {}
+        self.cache_stats = {'hits': 0, 'misses': 0, 'stale_hits': 0, 'revalidated': 0, 'invalidations': 0}
+
+    @property
+    def configured(self):
+        return bool(self.token and self.repo)
+
+    def _get_session(self):
+        """Create the pooled client session lazily (must run inside the event loop)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency * 2,
+                keepalive_timeout=60,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={
+                    'Accept': 'application/vnd.github.v3+json',
+                    'Authorization': f'token {self.token}',
+                    'User-Agent': 'telegram-mirror-bot'
+                }
+            )
+        return self._session
+
+    async def close(self):
+        for task in self._refreshing.values():
+            task.cancel()
+        self._refreshing.clear()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, method: str, path: str, headers=None, **kwargs):
+        """Send one API request under the concurrency limit, returning (status, body, headers)"""
+        session = self._get_session()
+        endpoint = _endpoint(path)
+        async with self._semaphore:
+            started = time.monotonic()
+            status = 'error'
+            try:
+                async with session.request(method, f"{self.api_url}{path}", headers=headers, **kwargs) as response:
+                    status = response.status
+                    return response.status, await response.text(), response.headers
+            finally:
+                GITHUB_LATENCY.labels(method, endpoint).observe(time.monotonic() - started)
+                GITHUB_REQUESTS.labels(method, endpoint, status).inc()
+
+    async def _fetch(self, key: str, path: str, extract):
+        """Fetch (or conditionally revalidate) one cached value; returns None on failure"""
+        entry = self._cache.get(key)
+        headers = {'If-None-Match': entry.etag} if entry and entry.etag else None
+        try:
+            status, body, response_headers = await self._request('GET', path, headers=headers)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"⚠️ Error fetching {key} ({e!r})")
+            return None
+
+        if status == 304 and entry:
+            # Not modified: conditional requests don't count against the rate limit
+            self.cache_stats['revalidated'] += 1
+            self._cache[key] = _CacheEntry(entry.value, entry.etag, self.cache_ttl)
+            return entry.value
+        if status != 200:
+            print(f"⚠️ Could not fetch {key} ({status})")
+            return None
+
+        value = extract(json.loads(body))
+        self._cache[key] = _CacheEntry(value, response_headers.get('ETag'), self.cache_ttl)
+        return value
+
+    def _refresh_in_background(self, key: str, path: str, extract):
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._fetch(key, path, extract))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _cached(self, key: str, path: str, extract):
+        """Return a cached value, revalidating stale entries without blocking the caller"""
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry.fresh:
+                self.cache_stats['hits'] += 1
+            else:
+                self.cache_stats['stale_hits'] += 1
+                self._refresh_in_background(key, path, extract)
+            return entry.value
+
+        self.cache_stats['misses'] += 1
+        return await self._fetch(key, path, extract)
+
+    def invalidate(self, key: str = None):
+        """Drop one cached value (or all of them)"""
+        self.cache_stats['invalidations'] += 1
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(key, None)
+
+    async def get_default_branch(self, refresh: bool = False):
+        """Resolve the repository default branch (cached)"""
+        if refresh:
+            self.invalidate('branch')
+        default_branch = await self._cached(
+            'branch', f"/repos/{self.repo}", lambda data: data.get('default_branch', 'main')
+        )
+        if default_branch is None:
+            print("⚠️ Could not detect branch, using: main")
+            return 'main'
+        return default_branch
+
+    async def get_workflow_id(self):
+        """Resolve the numeric workflow id (cached), falling back to the file name"""
+        workflow_id = await self._cached(
+            'workflow', f"/repos/{self.repo}/actions/workflows/{self.workflow}", lambda data: data.get('id')
+        )
+        return workflow_id or self.workflow
+
+    async def warm_up(self):
+        """Prefetch branch and workflow id so the first dispatch is a single POST"""
+        if self.configured:
+            await asyncio.gather(self.get_default_branch(), self.get_workflow_id())
+
+    async def dispatch(self, session_id: str, service: str, workflow_data: dict):
+        """Trigger the upload workflow, returning True on success"""
+        if not self.configured:
+            print("GitHub credentials not configured")
+            print(f"GH_PAT exists: {bool(self.token)}")
+            print(f"GITHUB_REPO: {self.repo}")
+            return False
+
+        default_branch, workflow_id = await asyncio.gather(self.get_default_branch(), self.get_workflow_id())
+        path = f"/repos/{self.repo}/actions/workflows/{workflow_id}/dispatches"
+        payload = {
+            'ref': default_branch,
+            'inputs': {
+                'session_id': session_id,
+                'service': service,
+                'workflow_data': json.dumps(workflow_data)
+            }
+        }
+
+        try:
+            print(f"🔄 Triggering workflow: {self.repo}/{self.workflow}")
+            print(f"📦 Branch: {default_branch}")
+
+            status, body, _ = await self._request('POST', path, json=payload)
+            print(f"📊 Response status: {status}")
+
+            if status == 204:
+                print("✅ Workflow triggered successfully!")
+                return True
+            if status == 422:
+                # The cached ref is stale (branch renamed) or was a guess: resolve again
+                retry_branch = await self.get_default_branch(refresh=True)
+                if retry_branch == default_branch:
+                    retry_branch = 'master' if default_branch == 'main' else None
+                if retry_branch:
+                    print(f"⚠️ Trying with '{retry_branch}' branch...")
+                    payload['ref'] = retry_branch
+                    status, body, _ = await self._request('POST', path, json=payload)
+                    if status == 204:
+                        print(f"✅ Workflow triggered successfully with '{retry_branch}' branch!")
+                        return True
+
+            print(f"❌ Failed with status {status}")
+            print(f"Error: {body}")
+            return False
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"❌ Error triggering workflow: {e!r}")
+            return False
+
+    async def cancel_run(self, session_id: str):
+        """Cancel queued/running workflow runs that carry only this session (run-name "Upload <id>")"""
+        if not self.configured:
+            return False
+        workflow_id = await self.get_workflow_id()
+        path = f"/repos/{self.repo}/actions/workflows/{workflow_id}/runs"
+        try:
+            responses = await asyncio.gather(*(
+                self._request('GET', path, params={'status': status, 'per_page': '50'})
+                for status in ('queued', 'in_progress')
+            ))
+            runs = []
+            for status, body, _ in responses:
+                if status == 200:
+                    runs += json.loads(body).get('workflow_runs', [])
+            run_ids = [run['id'] for run in runs if run.get('display_title') == f"Upload {session_id}"]
+            results = await asyncio.gather(*(
+                self._request('POST', f"/repos/{self.repo}/actions/runs/{run_id}/cancel")
+                for run_id in run_ids
+            ))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            print(f"❌ Error cancelling run for {session_id}: {e!r}")
+            return False
+
+        cancelled = [run_id for run_id, (status, _, _) in zip(run_ids, results) if status == 202]
+        if cancelled:
+            print(f"🛑 Cancelled workflow run(s) {cancelled} for {session_id}")
+        return bool(cancelled)
+
+    async def finished_sessions(self):
+        """{session_id: conclusion} for the recent upload runs that have completed, or None on error
+
+        A run's name is "Upload <id>" ("Upload <id>,<id>,..." for a batch).
+        """
+        if not self.configured:
+            return None
+        workflow_id = await self.get_workflow_id()
+        path = f"/repos/{self.repo}/actions/workflows/{workflow_id}/runs"
+        try:
+            status, body, _ = await self._request('GET', path, params={'status': 'completed', 'per_page': '100'})
+            if status != 200:
+                return None
+            runs = json.loads(body).get('workflow_runs', [])
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            print(f"⚠️ Could not list workflow runs: {e!r}")
+            return None
+
+        finished = {}
+        for run in runs:
+            title = run.get('display_title') or ''
+            if title.startswith('Upload '):
+                for session_id in title[len('Upload '):].split(','):
+                    finished.setdefault(session_id.strip(), run.get('conclusion'))
+        return finished
+
+
+class DispatchBatcher:
+    """Pack sessions confirmed close together into one workflow run
+
+    Sessions are collected for `window` seconds after the first one arrives,
+    or until `max_sessions` or `max_payload` (serialized workflow_data size,
+    GitHub caps dispatch inputs at 65535 characters) is reached, then sent
+    as a single dispatch whose workflow_data is {"batch": [...]}.
+    """
+
+    def __init__(self, dispatcher: GitHubDispatcher, window: float = 3.0,
+                 max_sessions: int = 10, max_payload: int = 60000):
+        self.dispatcher = dispatcher
+        self.window = window
+        self.max_sessions = max_sessions
+        self.max_payload = max_payload
+        self._batch = []
+        self._size = 0
+        self._timer = None
+        self._sending = set()
+        self.stats = {'batches': 0, 'sessions': 0}
+
+    async def submit(self, session_id: str, service: str, workflow_data: dict):
+        """Queue one session and wait for the dispatch that carries it; returns True on success"""
+        if self.window <= 0 or self.max_sessions <= 1:
+            return await self.dispatcher.dispatch(session_id, service, workflow_data)
+
+        size = len(json.dumps(workflow_data))
+        if self._batch and self._size + size > self.max_payload:
+            self._flush()
+
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((session_id, service, workflow_data, future))
+        self._size += size
+
+        if len(self._batch) >= self.max_sessions:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def discard(self, session_id: str):
+        """Drop a session that has not been dispatched yet; returns True if it was still waiting"""
+        for item in self._batch:
+            if item[0] == session_id:
+                self._batch.remove(item)
+                self._size -= len(json.dumps(item[2]))
+                if not item[3].done():
+                    # Nothing failed: the session simply never needs a runner
+                    item[3].set_result(True)
+                return True
+        return False
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch, self._size = self._batch, [], 0
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch):
+        try:
+            if len(batch) == 1:
+                session_id, service, workflow_data, _ = batch[0]
+                success = await self.dispatcher.dispatch(session_id, service, workflow_data)
+            else:
+                session_ids = ','.join(item[0] for item in batch)
+                services = ','.join(sorted({s for item in batch for s in item[1].split(',')}))
+                print(f"📦 Dispatching {len(batch)} sessions in one run: {session_ids}")
+                success = await self.dispatcher.dispatch(
+                    session_ids, services, {'batch': [item[2] for item in batch]}
+                )
+        except Exception as e:
+            print(f"❌ Error dispatching batch: {e!r}")
+            success = False
+
+        self.stats['batches'] += 1
+        self.stats['sessions'] += len(batch)
+        for *_, future in batch:
+            if not future.done():
+                future.set_result(success)
+
+    async def close(self):
+        """Send whatever is still waiting"""
+        self._flush()
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)
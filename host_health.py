@@ -0,0 +1,185 @@
+import os
+import json
+import time
+import random
+from pathlib import Path
+from collections import deque
+
+# Recent uploads kept per host
+WINDOW = 50
+# Consecutive failures that open a circuit; it stays open for OPEN_SECONDS (doubling up to MAX_OPEN_SECONDS)
+FAILURE_THRESHOLD = 3
+OPEN_SECONDS = 300
+MAX_OPEN_SECONDS = 3600
+# Outcomes older than this no longer count (hosts recover)
+MAX_AGE = 7 * 24 * 3600
+
+
+def backoff(attempt: int, base: float, cap: float):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _percentile(values, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class HostHealth:
+    """Rolling health of one upload host with a circuit breaker
+
+    Keeps the last WINDOW outcomes (success, response latency, MiB/s). After
+    FAILURE_THRESHOLD failures in a row the circuit opens and the host is
+    skipped; once the cooldown passes a single probe upload is let through
+    (half-open): success closes the circuit, failure re-opens it with twice
+    the cooldown.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.outcomes = deque(maxlen=WINDOW)
+        self.failures = 0
+        self.opened_at = None
+        self.cooldown = OPEN_SECONDS
+        self._probing = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.time() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    @property
+    def available(self):
+        """Worth planning an upload to (does not take the half-open probe)"""
+        return self.state == 'closed' or (self.state == 'half_open' and not self._probing)
+
+    def allow(self):
+        """May an upload start now; in half-open state only the first caller gets through"""
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open' and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release_probe(self):
+        """The half-open probe ended without an outcome (cancelled, or the download side failed)"""
+        self._probing = False
+
+    def record(self, ok: bool, latency: float = None, mibps: float = None):
+        state = self.state
+        self.outcomes.append((time.time(), ok, latency, mibps))
+        self._probing = False
+        if ok:
+            self.failures = 0
+            self.opened_at = None
+            self.cooldown = OPEN_SECONDS
+            return
+        self.failures += 1
+        if state == 'half_open':
+            # Failed probe: back off for longer
+            self.cooldown = min(self.cooldown * 2, MAX_OPEN_SECONDS)
+            self.opened_at = time.time()
+        elif state == 'open':
+            # An upload started before the circuit opened: the cooldown already covers it
+            return
+        elif self.failures >= FAILURE_THRESHOLD:
+            self.opened_at = time.time()
+            print(f"🚧 Circuit {self.name} terbuka ({self.failures} gagal berturut-turut, "
+                  f"{self.cooldown:.0f}s)")
+
+    # --- Rolling statistics ---
+
+    def _recent(self):
+        horizon = time.time() - MAX_AGE
+        return [outcome for outcome in self.outcomes if outcome[0] >= horizon]
+
+    @property
+    def success_rate(self):
+        """Share of recent uploads that worked; 1.0 for a host never tried"""
+        recent = self._recent()
+        return sum(1 for _, ok, _, _ in recent if ok) / len(recent) if recent else 1.0
+
+    def latency(self, q: float = 0.5):
+        return _percentile([latency for _, ok, latency, _ in self._recent() if ok and latency is not None], q)
+
+    @property
+    def throughput(self):
+        return _percentile([mibps for _, ok, _, mibps in self._recent() if ok and mibps], 0.5)
+
+    def score(self):
+        """Ranking key, best first: open circuits last, then success rate, throughput and latency"""
+        return (self.state == 'open', -round(self.success_rate, 2), -(self.throughput or 0.0),
+                self.latency() or 0.0)
+
+    def summary(self):
+        p50, p95 = self.latency(0.5), self.latency(0.95)
+        latency = f"latency p50 {p50:.2f}s / p95 {p95:.2f}s" if p50 is not None else "latency -"
+        return (f"{self.name}: {self.state}, sukses {self.success_rate:.0%} "
+                f"({len(self._recent())} upload), {latency}")
+
+    # --- Persistence ---
+
+    def to_dict(self):
+        return {'outcomes': list(self.outcomes), 'failures': self.failures,
+                'opened_at': self.opened_at, 'cooldown': self.cooldown}
+
+    @classmethod
+    def from_dict(cls, name: str, data: dict):
+        health = cls(name)
+        health.outcomes.extend(tuple(outcome) for outcome in data.get('outcomes', []))
+        health.failures = data.get('failures', 0)
+        health.opened_at = data.get('opened_at')
+        health.cooldown = data.get('cooldown', OPEN_SECONDS)
+        return health
+
+
+class HealthBook:
+    """Health of every upload host, persisted as JSON between runs"""
+
+    def __init__(self):
+        self.path = None
+        self.hosts = {}
+
+    def __getitem__(self, name: str):
+        health = self.hosts.get(name)
+        if health is None:
+            health = self.hosts[name] = HostHealth(name)
+        return health
+
+    def load(self, path):
+        """Read saved health from `path` (missing or damaged files start fresh); later saves go there too"""
+        self.path = Path(path)
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return
+        for name, entry in data.items():
+            try:
+                self.hosts[name] = HostHealth.from_dict(name, entry)
+            except (TypeError, ValueError, AttributeError):
+                continue
+
+    def save(self):
+        if self.path is None:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_text(json.dumps({name: health.to_dict() for name, health in self.hosts.items()}))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"⚠️ Host health tidak tersimpan: {e}")
+
+    def rank(self, names):
+        """`names` ordered best host first"""
+        return sorted(names, key=lambda name: self[name].score())
+
+
+HEALTH = HealthBook()
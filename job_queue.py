@@ -0,0 +1,160 @@
+import json
+import time
+import sqlite3
+import asyncio
+
+QUEUED = 'queued'
+RUNNING = 'running'
+
+
+class JobQueue:
+    """Local upload job queue shared by the bot and self-hosted workers
+
+    Jobs live in SQLite so several worker processes can claim them safely;
+    a job whose worker died is handed out again once its lease runs out.
+    Workers in the same process as the bot are woken immediately, other
+    processes poll every `poll_interval` seconds. Finished jobs and
+    cancellations older than `keep_finished` are purged as new jobs arrive.
+    """
+
+    def __init__(self, path: str = 'jobs.db', lease: float = 6 * 3600, poll_interval: float = 0.2,
+                 keep_finished: float = 24 * 3600, purge_interval: float = 3600):
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.keep_finished = keep_finished
+        self.purge_interval = purge_interval
+        self._wakeup = asyncio.Event()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                service TEXT NOT NULL,
+                data TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+            CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs (session_id);
+            CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+            CREATE TABLE IF NOT EXISTS cancels (
+                session_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_cancels_created ON cancels (created_at);
+        ''')
+        self.stats = {'queued': 0, 'claimed': 0, 'done': 0, 'failed': 0, 'cancelled': 0}
+        self.purge_finished(self.keep_finished)
+        self._last_purge = time.monotonic()
+
+    def _maybe_purge(self):
+        if time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            self.purge_finished(self.keep_finished)
+
+    def put(self, session_id: str, service: str, workflow_data: dict):
+        """Queue a job, returning its id"""
+        self._maybe_purge()
+        job_id = self._db.execute(
+            'INSERT INTO jobs (session_id, service, data, status, created_at) VALUES (?, ?, ?, ?, ?)',
+            (session_id, service, json.dumps(workflow_data), QUEUED, time.time())
+        ).lastrowid
+        self.stats['queued'] += 1
+        self._wakeup.set()
+        return job_id
+
+    def claim(self, worker: str):
+        """Atomically take the oldest runnable job: (job_id, workflow_data), or None"""
+        now = time.time()
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._db.execute(
+                'SELECT id, data FROM jobs WHERE status = ? OR (status = ? AND started_at < ?) '
+                'ORDER BY id LIMIT 1',
+                (QUEUED, RUNNING, now - self.lease)
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    'UPDATE jobs SET status = ?, worker = ?, started_at = ?, attempts = attempts + 1 WHERE id = ?',
+                    (RUNNING, worker, now, row[0])
+                )
+            self._db.execute('COMMIT')
+        except Exception:
+            self._db.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        self.stats['claimed'] += 1
+        return row[0], json.loads(row[1])
+
+    async def get(self, worker: str):
+        """Wait for the next job"""
+        while True:
+            self._wakeup.clear()
+            job = self.claim(worker)
+            if job is not None:
+                return job
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def requeue_running(self):
+        """Hand jobs whose in-process workers died with the previous process back to the queue"""
+        return self._db.execute(
+            'UPDATE jobs SET status = ?, worker = NULL, started_at = NULL WHERE status = ?', (QUEUED, RUNNING)
+        ).rowcount
+
+    def finish(self, job_id: int, status: str = 'done'):
+        self._db.execute(
+            'UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?', (status, time.time(), job_id)
+        )
+        self.stats[status] = self.stats.get(status, 0) + 1
+
+    def cancel(self, session_id: str):
+        """Cancel a session: drop its job if still queued, otherwise signal the worker running it
+
+        Returns True if the job never started.
+        """
+        self._db.execute('INSERT OR REPLACE INTO cancels VALUES (?, ?)', (session_id, time.time()))
+        dropped = self._db.execute(
+            'UPDATE jobs SET status = ?, finished_at = ? WHERE session_id = ? AND status = ?',
+            ('cancelled', time.time(), session_id, QUEUED)
+        ).rowcount
+        self.stats['cancelled'] += dropped
+        return bool(dropped)
+
+    def cancels_since(self, since: float):
+        """(session_id, created_at) of cancellations requested after `since`"""
+        return self._db.execute(
+            'SELECT session_id, created_at FROM cancels WHERE created_at > ? ORDER BY created_at', (since,)
+        ).fetchall()
+
+    async def watch_cancels(self, on_cancel):
+        """Call `on_cancel(session_id)` for every new cancellation, polling every `poll_interval`"""
+        since = time.time()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            for session_id, created_at in self.cancels_since(since):
+                on_cancel(session_id)
+                since = max(since, created_at)
+
+    def counts(self):
+        """Number of jobs per status"""
+        return dict(self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    def purge_finished(self, older_than: float = 24 * 3600):
+        """Drop finished jobs and cancellations older than `older_than` seconds"""
+        cutoff = time.time() - older_than
+        self._db.execute('DELETE FROM cancels WHERE created_at < ?', (cutoff,))
+        return self._db.execute(
+            'DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?', (cutoff,)
+        ).rowcount
+
+    def close(self):
+        self._db.close()
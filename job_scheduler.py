@@ -0,0 +1,167 @@
+import time
+import asyncio
+import itertools
+from collections import deque
+from metrics import counter, histogram
+
+MiB = 1024 * 1024
+
+QUEUE_WAIT = histogram('scheduler_queue_wait_seconds', 'Time from confirmation to admission')
+ADMITTED = counter('scheduler_admitted_total', 'Sessions admitted by the scheduler')
+
+
+class _Job:
+    __slots__ = ('session_id', 'user_id', 'size', 'launch', 'start', 'finish', 'seq', 'submitted_at')
+
+    def __init__(self, session_id, user_id, size, launch, start, finish, seq):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.size = size
+        self.launch = launch
+        self.start = start
+        self.finish = finish
+        self.seq = seq
+        self.submitted_at = time.monotonic()
+
+
+class FairScheduler:
+    """Admission control between confirmation and dispatch
+
+    At most `max_in_flight` sessions run at once (and `per_user` per user).
+    Waiting sessions are ordered by weighted fair queueing: a session starts
+    at its user's previous finish tag (or the current virtual time, i.e. the
+    start tag of the last admitted session) and finishes `size / weight`
+    later. Admitting by finish tag puts small jobs first, and a user with a
+    long backlog cannot starve someone who just arrived. A session that
+    never reports back frees its slot after `lease` seconds.
+    """
+
+    def __init__(self, max_in_flight: int = 4, per_user: int = 2, weights: dict = None,
+                 lease: float = 6 * 3600):
+        self.max_in_flight = max(max_in_flight, 1)
+        self.per_user = max(per_user, 1)
+        self.weights = weights or {}
+        self.lease = lease
+        self._queue = []
+        self._in_flight = {}
+        self._virtual = 0.0
+        self._user_finish = {}
+        self._seq = itertools.count()
+        self._launching = set()
+        self._admits = deque()
+        self.stats = {'submitted': 0, 'admitted': 0, 'discarded': 0, 'expired': 0,
+                      'delay_avg': 0.0, 'delay_max': 0.0}
+
+    def _cost(self, user_id, size: int):
+        return (1 + size / MiB) / self.weights.get(str(user_id), 1.0)
+
+    def submit(self, session_id: str, user_id, size: int, launch):
+        """Queue a session; `launch()` is awaited once it is admitted
+
+        Returns 0 if it was admitted right away, otherwise its queue position.
+        """
+        start = max(self._virtual, self._user_finish.get(user_id, 0.0))
+        finish = start + self._cost(user_id, size)
+        self._user_finish[user_id] = finish
+        self._queue.append(_Job(session_id, user_id, size, launch, start, finish, next(self._seq)))
+        self.stats['submitted'] += 1
+        self._pump()
+        return self.position(session_id) or 0
+
+    def release(self, session_id: str):
+        """A session finished (or failed / was cancelled): give its slot to the next one"""
+        if self._in_flight.pop(session_id, None) is not None:
+            self._pump()
+
+    def discard(self, session_id: str):
+        """Drop a session that is still waiting; returns True if it was queued
+
+        Its cost is taken back from the user's tags, so the jobs queued
+        after it (and the next submission) do not wait for work that never runs.
+        """
+        for job in self._queue:
+            if job.session_id == session_id:
+                self._queue.remove(job)
+                cost = job.finish - job.start
+                for later in self._queue:
+                    if later.user_id == job.user_id and later.seq > job.seq:
+                        later.start -= cost
+                        later.finish -= cost
+                self._user_finish[job.user_id] -= cost
+                self.stats['discarded'] += 1
+                return True
+        return False
+
+    def restore(self, session_id: str, user_id):
+        """Count a session dispatched before a restart as running again (it holds a slot until released)"""
+        self._in_flight[session_id] = (user_id, time.monotonic())
+
+    def position(self, session_id: str):
+        """1-based place in admission order, or None if the session is not waiting"""
+        for position, job in enumerate(self._ordered(), 1):
+            if job.session_id == session_id:
+                return position
+        return None
+
+    def _ordered(self):
+        return sorted(self._queue, key=lambda job: (job.finish, job.seq))
+
+    def _user_load(self, user_id):
+        return sum(1 for owner, _ in self._in_flight.values() if owner == user_id)
+
+    def _expire(self):
+        now = time.monotonic()
+        for session_id, (_, admitted_at) in list(self._in_flight.items()):
+            if now - admitted_at > self.lease:
+                del self._in_flight[session_id]
+                self.stats['expired'] += 1
+
+    def _pump(self):
+        self._expire()
+        for job in self._ordered():
+            if len(self._in_flight) >= self.max_in_flight:
+                return
+            if self._user_load(job.user_id) >= self.per_user:
+                continue
+            self._queue.remove(job)
+            self._admit(job)
+
+    def _admit(self, job: _Job):
+        now = time.monotonic()
+        self._in_flight[job.session_id] = (job.user_id, now)
+        self._virtual = max(self._virtual, job.start)
+
+        delay = now - job.submitted_at
+        self.stats['admitted'] += 1
+        self.stats['delay_avg'] += (delay - self.stats['delay_avg']) / self.stats['admitted']
+        self.stats['delay_max'] = max(self.stats['delay_max'], delay)
+        self._admits.append(now)
+        QUEUE_WAIT.observe(delay)
+        ADMITTED.inc()
+
+        task = asyncio.create_task(self._launch(job))
+        self._launching.add(task)
+        task.add_done_callback(self._launching.discard)
+
+    async def _launch(self, job: _Job):
+        try:
+            await job.launch()
+        except Exception as e:
+            print(f"❌ Gagal menjalankan sesi {job.session_id}: {e!r}")
+            self.release(job.session_id)
+
+    @property
+    def admit_rate(self):
+        """Sessions admitted during the last minute"""
+        cutoff = time.monotonic() - 60
+        while self._admits and self._admits[0] < cutoff:
+            self._admits.popleft()
+        return len(self._admits)
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            'queued': len(self._queue),
+            'in_flight': len(self._in_flight),
+            'admit_rate_per_min': self.admit_rate,
+        }
@@ -0,0 +1,172 @@
+import time
+import json
+import base64
+import struct
+import sqlite3
+import asyncio
+from file_ref import FileRef, MEDIA_TYPES
+
+# Links without a file are remembered for less time (the message may become reachable)
+DEAD_TTL = 300
+# Messages per getMessages call
+BATCH = 100
+
+# Telethon message property -> FileRef kind; voice notes, GIFs, stickers, ... are documents too, so they come first
+TELETHON_KINDS = (
+    ('video_note', 'video_note'),
+    ('voice', 'voice'),
+    ('gif', 'animation'),
+    ('sticker', 'sticker'),
+    ('video', 'video'),
+    ('audio', 'audio'),
+    ('photo', 'photo'),
+    ('document', 'document'),
+)
+_DEFAULT_NAMES = dict(MEDIA_TYPES)
+
+
+def document_unique_id(document_id: int):
+    """Bot API file_unique_id of a document: (type 2, id) with zero runs compressed, base64url"""
+    encoded = bytearray()
+    zeros = 0
+    for byte in struct.pack('<iq', 2, document_id):
+        if byte == 0:
+            zeros += 1
+            continue
+        if zeros:
+            encoded += bytes((0, zeros))
+            zeros = 0
+        encoded.append(byte)
+    if zeros:
+        encoded += bytes((0, zeros))
+    return base64.urlsafe_b64encode(bytes(encoded)).decode().rstrip('=')
+
+
+def describe(msg, chat_id):
+    """FileRef for a Telethon message carrying a file, or None
+
+    The unique id matches what the Bot API reports for the same document,
+    so a link and a reply to the same file share mirror cache entries.
+    Photos keep the link identity (their Bot API id depends on the size).
+    """
+    if msg is None or not getattr(msg, 'file', None):
+        return None
+    kind = next((kind for attr, kind in TELETHON_KINDS if getattr(msg, attr, None)), 'document')
+    document = getattr(msg, 'document', None)
+    unique_id = document_unique_id(document.id) if document is not None else None
+    name = msg.file.name or _DEFAULT_NAMES[kind].format(unique_id or msg.id)
+    return FileRef(kind, chat_id, msg.id, unique_id, name, msg.file.size)
+
+
+class LinkResolver:
+    """What the messages behind t.me links contain, looked up once through a userbot and cached
+
+    `resolve` answers from the cache and fetches the rest with one
+    getMessages call per chat. A link without a file (deleted, text only,
+    no access) resolves to None for DEAD_TTL seconds, so it is rejected
+    before a workflow run is spent on it. Without a client, or when a
+    lookup fails for another reason, links stay unresolved and the worker
+    finds out as before.
+    """
+
+    def __init__(self, path: str = 'links.db', ttl: float = 86400, timeout: float = 10.0):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.client = None
+        self.stats = {'hit': 0, 'resolved': 0, 'dead': 0, 'unresolved': 0}
+        self._dialogs = None
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS links (
+                chat_id TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                packed TEXT,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (chat_id, message_id)
+            )
+        ''')
+
+    def get(self, chat_id, message_id: int):
+        """(known, FileRef or None) from the cache"""
+        row = self._db.execute(
+            'SELECT packed FROM links WHERE chat_id = ? AND message_id = ? AND expires_at > ?',
+            (str(chat_id), message_id, time.time())
+        ).fetchone()
+        if row is None:
+            return False, None
+        if row[0] is None:
+            return True, None
+        return True, FileRef.unpack(json.loads(row[0]))
+
+    def remember(self, chat_id, message_id: int, ref: FileRef = None):
+        """Cache a lookup (None = no file behind the link)"""
+        self._db.execute(
+            'INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?)',
+            (str(chat_id), message_id, json.dumps(ref.pack(), separators=(',', ':')) if ref is not None else None,
+             time.time() + (self.ttl if ref is not None else DEAD_TTL))
+        )
+
+    async def resolve(self, links):
+        """{(chat_id, message_id): FileRef or None} for the links that could be resolved"""
+        resolved, missing = {}, {}
+        for chat_id, message_id in links:
+            known, ref = self.get(chat_id, message_id)
+            if known:
+                self.stats['hit'] += 1
+                resolved[(chat_id, message_id)] = ref
+            else:
+                missing.setdefault(chat_id, []).append(message_id)
+        if not missing:
+            return resolved
+        if self.client is None:
+            self.stats['unresolved'] += sum(len(ids) for ids in missing.values())
+            return resolved
+
+        batches = [(chat_id, ids[i:i + BATCH]) for chat_id, ids in missing.items() for i in range(0, len(ids), BATCH)]
+        outcomes = await asyncio.gather(*(self._lookup(chat_id, ids) for chat_id, ids in batches),
+                                        return_exceptions=True)
+        for (chat_id, ids), outcome in zip(batches, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"⚠️ Pre-flight {chat_id} gagal: {outcome}")
+                self.stats['unresolved'] += len(ids)
+                continue
+            for message_id, ref in zip(ids, outcome):
+                self.remember(chat_id, message_id, ref)
+                self.stats['resolved' if ref is not None else 'dead'] += 1
+                resolved[(chat_id, message_id)] = ref
+        return resolved
+
+    async def _lookup(self, chat_id, ids):
+        """FileRef or None per id; raises when the answer is not definitive (timeout, flood wait, ...)"""
+        try:
+            messages = await asyncio.wait_for(self._get_messages(chat_id, ids), self.timeout)
+        except Exception as e:
+            # Bad request (private channel, invalid chat/username): nothing a worker could download either
+            if isinstance(e, ValueError) or getattr(e, 'code', None) == 400:
+                return [None] * len(ids)
+            raise
+        return [describe(msg, chat_id) for msg in messages]
+
+    async def _get_messages(self, chat_id, ids):
+        try:
+            return await self.client.get_messages(chat_id, ids=ids)
+        except ValueError:
+            # Chat not in the userbot's entity cache yet: the dialog list introduces it (loaded once, shared)
+            if self._dialogs is None:
+                self._dialogs = asyncio.ensure_future(self.client.get_dialogs())
+            dialogs = self._dialogs
+            try:
+                await asyncio.shield(dialogs)
+            except Exception:
+                # A failed load (flood wait, dropped connection) is tried again by the next lookup
+                if dialogs.done() and self._dialogs is dialogs:
+                    self._dialogs = None
+                raise
+            return await self.client.get_messages(chat_id, ids=ids)
+
+    def purge_expired(self):
+        return self._db.execute('DELETE FROM links WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    def close(self):
+        self._db.close()
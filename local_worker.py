@@ -0,0 +1,48 @@
+import os
+import socket
+import asyncio
+from dotenv import load_dotenv
+from job_queue import JobQueue
+from workflow_handler import JobEngine, serve_queue
+
+# Self-hosted workers: run instead of GitHub Actions when the bot uses DISPATCH_MODE=local
+load_dotenv()
+
+JOB_DB_PATH = os.environ.get('JOB_DB_PATH', 'jobs.db')
+LOCAL_WORKERS = int(os.environ.get('LOCAL_WORKERS', '2'))
+
+
+async def run_workers(count: int):
+    """One userbot (TELEGRAM_STRING_SESSION) shared by `count` concurrent queue consumers
+
+    A string session must only be connected from one place at a time, so the
+    workers are tasks of this process rather than processes of their own.
+    """
+    prefix = f"{socket.gethostname()}-{os.getpid()}"
+    queue = JobQueue(JOB_DB_PATH)
+    engine = JobEngine.from_env()
+    tasks = []
+    try:
+        await engine.start()
+        tasks.append(asyncio.create_task(queue.watch_cancels(engine.cancel)))
+        tasks.extend(asyncio.create_task(serve_queue(engine, queue, f"{prefix}-{i}")) for i in range(count))
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await engine.stop()
+        queue.close()
+
+
+def main():
+    """Serve the shared job queue with LOCAL_WORKERS concurrent workers"""
+    print(f"🚀 Menjalankan {LOCAL_WORKERS} local worker ({JOB_DB_PATH})")
+    try:
+        asyncio.run(run_workers(max(LOCAL_WORKERS, 1)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import time
+import sqlite3
+import asyncio
+import aiohttp
+
+DAY = 24 * 3600
+
+# How long a host keeps an unvisited upload (0 = never reuse, e.g. single-use links)
+SERVICE_TTL = {
+    'pixeldrain': 30 * DAY,
+    'gofile': 7 * DAY,
+    'catbox': 365 * DAY,
+    'anonfiles': 30 * DAY,
+    'fileio': 0,
+}
+DEFAULT_TTL = 7 * DAY
+
+
+class MirrorCache:
+    """Content-addressed index of files already mirrored: (key, service) -> URL"""
+
+    def __init__(self, path: str = 'mirrors.db', revalidate_after: float = 3600, timeout: float = 5.0,
+                 probe_concurrency: int = 8):
+        self.revalidate_after = revalidate_after
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None
+        # Liveness probes in flight at once (a 100-file session must not wait for them one by one)
+        self._probes = asyncio.Semaphore(max(probe_concurrency, 1))
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS mirrors (
+                key TEXT NOT NULL,
+                service TEXT NOT NULL,
+                url TEXT NOT NULL,
+                file_name TEXT,
+                file_size INTEGER,
+                created_at REAL NOT NULL,
+                checked_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (key, service)
+            );
+            CREATE INDEX IF NOT EXISTS idx_mirrors_expires ON mirrors (expires_at);
+        ''')
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'dead': 0}
+
+    def store(self, key: str, service: str, url: str, file_name: str = None, file_size: int = None):
+        ttl = SERVICE_TTL.get(service, DEFAULT_TTL)
+        if ttl <= 0:
+            return
+        now = time.time()
+        self._db.execute(
+            'INSERT OR REPLACE INTO mirrors VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (key, service, url, file_name, file_size, now, now, now + ttl)
+        )
+
+    def forget(self, key: str, service: str):
+        self._db.execute('DELETE FROM mirrors WHERE key = ? AND service = ?', (key, service))
+
+    async def _alive(self, url: str):
+        """Cheap liveness probe; anything but a definite answer counts as dead"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=self.timeout)
+        try:
+            async with self._probes, self._session.head(url, allow_redirects=True) as r:
+                return r.status < 400
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def lookup(self, key: str, service: str):
+        """Return a live URL for (key, service), or None"""
+        row = self._db.execute(
+            'SELECT url, checked_at FROM mirrors WHERE key = ? AND service = ? AND expires_at > ?',
+            (key, service, time.time())
+        ).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+
+        url, checked_at = row
+        if time.time() - checked_at > self.revalidate_after:
+            self.stats['revalidated'] += 1
+            if not await self._alive(url):
+                self.stats['dead'] += 1
+                self.stats['misses'] += 1
+                self.forget(key, service)
+                return None
+            self._db.execute(
+                'UPDATE mirrors SET checked_at = ? WHERE key = ? AND service = ?', (time.time(), key, service)
+            )
+
+        self.stats['hits'] += 1
+        return url
+
+    async def lookup_all(self, key: str, services):
+        """Return {service: url} only if every service has a live mirror, else None"""
+        urls = await asyncio.gather(*(self.lookup(key, service) for service in services))
+        if not all(urls):
+            return None
+        return dict(zip(services, urls))
+
+    async def lookup_many(self, keys, services):
+        """`lookup_all` for several files at once: [{service: url} or None] in the order of `keys`"""
+        return await asyncio.gather(*(self.lookup_all(key, services) for key in keys))
+
+    def file_name(self, key: str):
+        row = self._db.execute('SELECT file_name FROM mirrors WHERE key = ? LIMIT 1', (key,)).fetchone()
+        return row[0] if row else None
+
+    def purge_expired(self):
+        return self._db.execute('DELETE FROM mirrors WHERE expires_at <= ?', (time.time(),)).rowcount
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._db.close()
@@ -0,0 +1,329 @@
+import os
+import math
+import time
+import asyncio
+from telethon import utils
+from telethon.errors import FloodWaitError, FileMigrateError, UnauthorizedError, AuthKeyError
+from telethon.network import MTProtoSender
+from telethon.tl import functions
+from telethon.tl.alltlobjects import LAYER
+from telethon.tl.types import MessageMediaDocument
+from autotune import INTERVAL
+
+# upload.getFile limits: 4 KiB-aligned offsets, parts of at most 512 KiB that divide 1 MiB
+PART_SIZE = 512 * 1024
+MAX_RETRIES = 5
+
+# Authorization keys exported to other DCs (dc_id -> AuthKey), shared by every downloader of
+# the process and persisted between runs by session_cache.py; `_verified` were used this run
+EXPORTED_AUTH_KEYS = {}
+_verified = set()
+
+
+def supports_parallel(media):
+    """Only documents can be addressed by part ranges without picking a thumbnail size"""
+    return isinstance(media, MessageMediaDocument)
+
+
+class ParallelDownloader:
+    """Download one Telegram document over several MTProto connections at once
+
+    Parts are fetched concurrently by `workers` senders connected to the DC
+    that stores the file, then either written at their offsets into a
+    preallocated file or re-ordered and yielded as a stream. With a `tuner`
+    (autotune.ConnectionTuner) the number of senders is adjusted while the
+    download runs.
+    """
+
+    def __init__(self, client, workers: int = 4, part_size: int = PART_SIZE, max_retries: int = MAX_RETRIES,
+                 auth_keys: dict = None, tuner=None):
+        self.client = client
+        self.workers = max(workers, 1)
+        self.part_size = part_size
+        self.max_retries = max_retries
+        self.tuner = tuner
+        self._dc_id = None
+        self._location = None
+        self._senders = []
+        self._active = 0
+        self._auth_keys = EXPORTED_AUTH_KEYS if auth_keys is None else auth_keys
+        self._migrate_lock = asyncio.Lock()
+        self.stats = {'bytes': 0, 'parts': 0, 'retries': 0, 'flood_waits': 0, 'migrations': 0, 'elapsed': 0.0}
+
+    # --- Connections ---
+
+    async def _create_sender(self, dc_id: int):
+        """Open one sender to `dc_id` (same steps as TelegramClient._create_exported_sender)"""
+        client = self.client
+        dc = await client._get_dc(dc_id)
+        home = dc_id == client.session.dc_id
+        auth_key = client.session.auth_key if home else self._auth_keys.get(dc_id)
+
+        sender = MTProtoSender(auth_key, loggers=client._log)
+        await sender.connect(client._connection(
+            dc.ip_address,
+            dc.port,
+            dc.id,
+            loggers=client._log,
+            proxy=client._proxy,
+            local_addr=client._local_addr
+        ))
+        if auth_key is None:
+            # Foreign DC: import our authorization once, then reuse its key for the other senders
+            auth = await client(functions.auth.ExportAuthorizationRequest(dc_id))
+            client._init_request.query = functions.auth.ImportAuthorizationRequest(id=auth.id, bytes=auth.bytes)
+            await sender.send(functions.InvokeWithLayerRequest(LAYER, client._init_request))
+            self._auth_keys[dc_id] = sender.auth_key
+            _verified.add(dc_id)
+        elif not home and dc_id not in _verified:
+            # Key from an earlier run: one cheap call proves it is still authorized
+            client._init_request.query = functions.help.GetNearestDcRequest()
+            try:
+                await sender.send(functions.InvokeWithLayerRequest(LAYER, client._init_request))
+                _verified.add(dc_id)
+            except (UnauthorizedError, AuthKeyError):
+                print(f"🔑 Auth key DC {dc_id} dari cache kedaluwarsa, export ulang")
+                self._auth_keys.pop(dc_id, None)
+                await sender.disconnect()
+                return await self._create_sender(dc_id)
+        return sender
+
+    async def _open_senders(self, dc_id: int, count: int):
+        # The first one exports the authorization to a foreign DC; the rest reuse its key
+        first = await self._create_sender(dc_id)
+        rest = await asyncio.gather(*(self._create_sender(dc_id) for _ in range(count - 1)))
+        return [first, *rest]
+
+    async def _connect(self, dc_id: int, count: int):
+        self._senders = await self._open_senders(dc_id, count)
+        self._active = len(self._senders)
+        self._dc_id = dc_id
+
+    async def _disconnect(self):
+        senders, self._senders = self._senders, []
+        await asyncio.gather(*(sender.disconnect() for sender in senders), return_exceptions=True)
+
+    async def _migrate(self, dc_id: int):
+        async with self._migrate_lock:
+            if dc_id == self._dc_id:
+                return
+            print(f"🔁 File migrated to DC {dc_id}, reconnecting senders")
+            self.stats['migrations'] += 1
+            # Other workers keep picking senders while the new ones connect: swap the list in one step
+            senders = await self._open_senders(dc_id, self._active or 1)
+            old, self._senders = self._senders, senders
+            self._active = len(senders)
+            self._dc_id = dc_id
+            await asyncio.gather(*(sender.disconnect() for sender in old), return_exceptions=True)
+
+    async def _prepare(self, media, file_size: int):
+        dc_id, self._location = utils.get_input_location(media)
+        parts = math.ceil(file_size / self.part_size)
+        await self._connect(dc_id, min(self.workers, max(parts, 1)))
+        return parts
+
+    async def _autoscale(self, spawn, busy):
+        """Follow the tuner: open a sender + worker per extra connection, retire workers it drops
+
+        `spawn(worker_id)` starts a worker; `busy()` is False once no parts are left to claim.
+        """
+        while busy():
+            await asyncio.sleep(INTERVAL)
+            target = self.tuner.step()
+            while busy() and self._active < target:
+                if self._active == len(self._senders):
+                    try:
+                        self._senders.append(await self._create_sender(self._dc_id))
+                    except Exception as e:
+                        print(f"⚠️ Autotune: koneksi tambahan gagal ({e!r}), tetap {self._active} koneksi")
+                        self.tuner.connections = self._active
+                        self.tuner.settled = True
+                        return
+                self._active += 1
+                spawn(self._active - 1)
+                self.tuner.restart_sample()
+            # Workers with an id >= _active stop before their next part; their senders stay until the end
+            self._active = min(self._active, target)
+            if self.tuner.settled and self._active == target:
+                return
+
+    def _retired(self, worker: int):
+        return worker >= self._active
+
+    @staticmethod
+    async def _join(tasks):
+        """Wait for every worker, including ones spawned while waiting"""
+        joined = 0
+        while joined < len(tasks):
+            current = len(tasks)
+            await asyncio.gather(*tasks[joined:current])
+            joined = current
+
+    # --- Parts ---
+
+    async def _fetch_part(self, worker: int, index: int):
+        """Fetch one part, retrying on FLOOD_WAIT, FILE_MIGRATE and dropped connections"""
+        request = functions.upload.GetFileRequest(
+            self._location, offset=index * self.part_size, limit=self.part_size,
+            precise=False, cdn_supported=False
+        )
+        for attempt in range(self.max_retries + 1):
+            try:
+                sender = self._senders[worker % len(self._senders)]
+                result = await sender.send(request)
+                self.stats['parts'] += 1
+                self.stats['bytes'] += len(result.bytes)
+                if self.tuner is not None:
+                    self.tuner.add(len(result.bytes))
+                return result.bytes
+            except FloodWaitError as e:
+                self.stats['flood_waits'] += 1
+                if self.tuner is not None:
+                    self.tuner.throttle()
+                    self._active = min(self._active, self.tuner.connections)
+                print(f"⏳ FLOOD_WAIT {e.seconds}s on part {index}")
+                await asyncio.sleep(e.seconds)
+            except FileMigrateError as e:
+                await self._migrate(e.new_dc)
+            except (ConnectionError, asyncio.TimeoutError):
+                if attempt == self.max_retries:
+                    raise
+                await asyncio.sleep(min(2 ** attempt, 30))
+            self.stats['retries'] += 1
+        raise ConnectionError(f"Part {index} failed after {self.max_retries} retries")
+
+    async def iter_download(self, media, file_size: int, progress_callback=None):
+        """Yield the document's bytes in order while parts download in parallel
+
+        At most `2 * connections` parts are held in memory, so this can feed
+        a streaming upload directly.
+        """
+        started = time.monotonic()
+        parts = await self._prepare(media, file_size)
+        results = {}
+        state = {'claimed': 0, 'emitted': 0, 'error': None}
+        cond = asyncio.Condition()
+
+        async def worker(worker_id):
+            try:
+                while True:
+                    async with cond:
+                        await cond.wait_for(
+                            lambda: state['claimed'] >= parts or self._retired(worker_id)
+                            or state['claimed'] < state['emitted'] + self._active * 2
+                        )
+                        if state['claimed'] >= parts or self._retired(worker_id):
+                            return
+                        index = state['claimed']
+                        state['claimed'] += 1
+                    data = await self._fetch_part(worker_id, index)
+                    async with cond:
+                        results[index] = data
+                        cond.notify_all()
+            except Exception as e:
+                async with cond:
+                    state['error'] = e
+                    cond.notify_all()
+
+        tasks = [asyncio.create_task(worker(i)) for i in range(len(self._senders))]
+        if self.tuner is not None:
+            tasks.append(asyncio.create_task(self._autoscale(
+                lambda i: tasks.append(asyncio.create_task(worker(i))), lambda: state['claimed'] < parts
+            )))
+        received = 0
+        try:
+            while state['emitted'] < parts:
+                async with cond:
+                    await cond.wait_for(lambda: state['emitted'] in results or state['error'] is not None)
+                    if state['emitted'] not in results:
+                        raise state['error']
+                    chunk = results.pop(state['emitted'])
+                    state['emitted'] += 1
+                    cond.notify_all()
+                received += len(chunk)
+                if progress_callback:
+                    progress_callback(received, file_size)
+                yield chunk
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._disconnect()
+            self.stats['elapsed'] += time.monotonic() - started
+
+    async def download_to_file(self, media, path, file_size: int, progress_callback=None,
+                               done_parts=None, on_part=None):
+        """Download into a preallocated file, writing each part at its offset
+
+        Parts listed in `done_parts` are already in the file and are skipped
+        (resume); `on_part(index)` is called once each new part is written.
+        """
+        started = time.monotonic()
+        done_parts = done_parts or set()
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, file_size)
+            missing = [index for index in range(math.ceil(file_size / self.part_size)) if index not in done_parts]
+            if not missing:
+                return path
+            await self._prepare(media, len(missing) * self.part_size)
+            queue = asyncio.Queue()
+            for index in missing:
+                queue.put_nowait(index)
+            received = min(len(done_parts) * self.part_size, file_size)
+
+            async def worker(worker_id):
+                nonlocal received
+                while not self._retired(worker_id):
+                    try:
+                        index = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    data = await self._fetch_part(worker_id, index)
+                    await asyncio.to_thread(os.pwrite, fd, data, index * self.part_size)
+                    if on_part:
+                        on_part(index)
+                    received += len(data)
+                    if progress_callback:
+                        progress_callback(received, file_size)
+
+            tasks = [asyncio.create_task(worker(i)) for i in range(len(self._senders))]
+            scaler = None
+            if self.tuner is not None:
+                scaler = asyncio.create_task(self._autoscale(
+                    lambda i: tasks.append(asyncio.create_task(worker(i))), lambda: not queue.empty()
+                ))
+            try:
+                await self._join(tasks)
+            finally:
+                if scaler is not None:
+                    scaler.cancel()
+                    await asyncio.gather(scaler, return_exceptions=True)
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            os.close(fd)
+            await self._disconnect()
+            self.stats['elapsed'] += time.monotonic() - started
+        return path
+
+    # --- Metrics ---
+
+    @property
+    def throughput(self):
+        """Achieved MB/s over all transfers made by this downloader"""
+        if not self.stats['elapsed']:
+            return 0.0
+        return self.stats['bytes'] / (1024 * 1024) / self.stats['elapsed']
+
+    @property
+    def connections(self):
+        """Connections in use at the end (the autotuned count when there is a tuner)"""
+        return self.tuner.connections if self.tuner is not None else self.workers
+
+    def summary(self):
+        connections = self.tuner.summary() if self.tuner is not None else f"{self.workers} connections"
+        return (f"{self.stats['bytes'] / (1024 * 1024):.1f} MB in {self.stats['elapsed']:.1f}s "
+                f"({self.throughput:.2f} MB/s, {connections}, "
+                f"{self.stats['retries']} retries, {self.stats['flood_waits']} flood waits)")
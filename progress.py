@@ -0,0 +1,173 @@
+import time
+
+
+def progress_bar(fraction: float, width: int = 10):
+    filled = min(max(int(fraction * width + 1e-9), 0), width)
+    return '█' * filled + '░' * (width - filled)
+
+
+def format_size(size: float):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return '-'
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}j {seconds % 3600 // 60}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60}s"
+    return f"{seconds}s"
+
+
+class Rate:
+    """Exponentially weighted throughput (bytes/s), sampled at most once per `period`"""
+
+    def __init__(self, alpha: float = 0.3, period: float = 1.0):
+        self.alpha = alpha
+        self.period = period
+        self.value = None
+        self._bytes = 0
+        self._mark = time.monotonic()
+
+    def add(self, n: int):
+        self._bytes += n
+        now = time.monotonic()
+        elapsed = now - self._mark
+        if elapsed >= self.period:
+            sample = self._bytes / elapsed
+            self.value = sample if self.value is None else self.alpha * sample + (1 - self.alpha) * self.value
+            self._bytes = 0
+            self._mark = now
+
+
+class ProgressTracker:
+    """Byte-level progress of one session, rendered into its status message
+
+    Download and upload callbacks report bytes as they move; `emit` is called
+    with the rendered text at most once every `interval` seconds (and only
+    when the text changed), so progress costs a bounded number of edits.
+    Upload bytes count once per target service, so a fan-out to three hosts
+    is 100% only when all three have the whole file; a file that fails is
+    settled so the bars still end at 100%.
+    """
+
+    def __init__(self, emit, interval: float = 3.0):
+        self.emit = emit
+        self.interval = interval
+        self.down_total = 0
+        self.down_done = 0
+        self.up_total = 0
+        self.up_done = 0
+        self.down_rate = Rate()
+        self.up_rate = Rate()
+        self.files = (0, 0, 0, 0)
+        self._files = {}
+        self._last_emit = 0.0
+        self._last_text = None
+
+    # --- Inputs ---
+
+    def add_file(self, idx, size: int, targets: int):
+        self._files[idx] = [size, targets, 0, 0]
+        self.down_total += size
+        self.up_total += size * targets
+
+    def downloaded(self, idx, n: int, measured: bool = True):
+        if idx not in self._files:
+            return
+        self._files[idx][2] += n
+        self.down_done += n
+        if measured:
+            self.down_rate.add(n)
+        self._maybe_emit()
+
+    def uploaded(self, idx, n: int):
+        if idx not in self._files:
+            return
+        self._files[idx][3] += n
+        self.up_done += n
+        self.up_rate.add(n)
+        self._maybe_emit()
+
+    def rewind(self, idx, n: int):
+        """A failed upload attempt: its `n` bytes will be sent again"""
+        if idx not in self._files:
+            return
+        self._files[idx][3] -= n
+        self.up_done -= n
+
+    def download_callback(self, idx, start: int = 0):
+        """Adapter for callbacks that report an absolute position (Telethon: received, total)
+
+        `start` bytes were already on disk (resumed download) and count as
+        done without inflating the measured speed.
+        """
+        if start:
+            self.downloaded(idx, start, measured=False)
+        position = [start]
+
+        def callback(received, total=None):
+            delta = received - position[0]
+            position[0] = received
+            if delta > 0:
+                self.downloaded(idx, delta)
+        return callback
+
+    def upload_callback(self, idx):
+        return lambda n: self.uploaded(idx, n)
+
+    def settle(self, idx):
+        """The file is finished (or given up): whatever it did not transfer no longer counts as remaining"""
+        entry = self._files.pop(idx, None)
+        if entry is None:
+            return
+        size, targets, down, up = entry
+        self.down_done += max(size - down, 0)
+        self.up_done += max(size * targets - up, 0)
+        self._maybe_emit()
+
+    def set_files(self, done: int, total: int, downloading: int, uploading: int):
+        self.files = (done, total, downloading, uploading)
+        self._maybe_emit()
+
+    # --- Output ---
+
+    @property
+    def eta(self):
+        """Seconds until every upload finishes, at the smoothed upload rate"""
+        if not self.up_rate.value:
+            return None
+        return max(self.up_total - self.up_done, 0) / self.up_rate.value
+
+    def render(self):
+        done, total, downloading, uploading = self.files
+        down = min(self.down_done / self.down_total, 1.0) if self.down_total else 0.0
+        up = min(self.up_done / self.up_total, 1.0) if self.up_total else 0.0
+        return (
+            f"⏳ <b>Memproses file {done}/{total}...</b>\n\n"
+            f"📥 Download ({downloading}): [{progress_bar(down)}] {down:.0%}\n"
+            f"    {format_size(self.down_done)} / {format_size(self.down_total)}"
+            f" • {format_size(self.down_rate.value or 0)}/s\n"
+            f"📤 Upload ({uploading}): [{progress_bar(up)}] {up:.0%}\n"
+            f"    {format_size(self.up_done)} / {format_size(self.up_total)}"
+            f" • {format_size(self.up_rate.value or 0)}/s\n\n"
+            f"⏱ ETA: {format_eta(self.eta)}"
+        )
+
+    def _maybe_emit(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last_emit < self.interval:
+            return
+        text = self.render()
+        if text != self._last_text:
+            self._last_emit = now
+            self._last_text = text
+            self.emit(text)
+
+    def flush(self):
+        self._maybe_emit(force=True)
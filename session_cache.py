@@ -0,0 +1,149 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+from pathlib import Path
+from telethon.crypto import AES, AuthKey
+from telethon.extensions import BinaryReader
+
+VERSION = b'SC1'
+# help.getConfig results (DC addresses) are reused for a day
+CONFIG_TTL = 24 * 3600
+MAX_ENTITIES = 500
+
+
+class _EntityLog(set):
+    """MemorySession._entities that also remembers when each row was last stored
+
+    Telethon adds rows with `|=`; the log keeps them in that order (a row
+    seen again moves to the end), so the cache keeps the newest entities.
+    """
+
+    def __init__(self, rows=()):
+        super().__init__()
+        self.order = {}
+        self.update(rows)
+
+    def __ior__(self, rows):
+        for row in rows:
+            self.order.pop(row, None)
+            self.order[row] = None
+            self.add(row)
+        return self
+
+    def update(self, *groups):
+        for rows in groups:
+            self |= rows
+
+    def newest(self, count: int):
+        live = [row for row in self.order if row in self]
+        return live[-count:]
+
+
+def _derive(secret: str, label: bytes):
+    return hashlib.sha256(label + b'\0' + secret.encode()).digest()
+
+
+class SessionCache:
+    """Warm-start state of the userbot, kept between workflow runs
+
+    Holds what a fresh StringSession has to fetch again on every run: the DC
+    list (help.getConfig), authorization keys exported to other DCs, and
+    the access hashes of chats seen before. The file is encrypted with
+    AES-IGE and authenticated with HMAC-SHA256, both keyed from the string
+    session, so a cache restored on a public runner is useless without it
+    and a different account simply starts cold.
+    """
+
+    def __init__(self, path, secret: str):
+        self.path = Path(path)
+        self._key = _derive(secret, b'session-cache-key')
+        self._mac_key = _derive(secret, b'session-cache-mac')
+        self.stats = {'loaded': False, 'auth_keys': 0, 'entities': 0, 'config': False}
+        self._config = None
+
+    # --- File format ---
+
+    def _encrypt(self, plain: bytes):
+        iv = os.urandom(32)
+        padded = len(plain).to_bytes(4, 'big') + plain
+        padded += os.urandom(-len(padded) % 16)
+        body = iv + AES.encrypt_ige(padded, self._key, iv)
+        return VERSION + body + hmac.new(self._mac_key, body, hashlib.sha256).digest()
+
+    def _decrypt(self, blob: bytes):
+        if not blob.startswith(VERSION) or len(blob) < len(VERSION) + 32 + 16 + 32:
+            return None
+        body, mac = blob[len(VERSION):-32], blob[-32:]
+        if not hmac.compare_digest(mac, hmac.new(self._mac_key, body, hashlib.sha256).digest()):
+            return None
+        padded = AES.decrypt_ige(body[32:], self._key, body[:32])
+        return padded[4:4 + int.from_bytes(padded[:4], 'big')]
+
+    def read(self):
+        """Decrypted cache contents, or {} when missing, from another account or damaged"""
+        try:
+            plain = self._decrypt(self.path.read_bytes())
+            return json.loads(plain) if plain else {}
+        except (OSError, ValueError):
+            return {}
+
+    def write(self, data: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Per-process temp name: the bot and a local worker may save the same file at once
+        tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_bytes(self._encrypt(json.dumps(data).encode()))
+        os.replace(tmp, self.path)
+
+    # --- Client state ---
+
+    def load(self, client, auth_keys: dict):
+        """Seed `client` (config, entities) and `auth_keys` (dc_id -> AuthKey) from the cache"""
+        data = self.read()
+        entities = getattr(client.session, '_entities', None)
+        if entities is not None and not isinstance(entities, _EntityLog):
+            entities = client.session._entities = _EntityLog(entities)
+        if not data:
+            return False
+
+        config = data.get('config')
+        if config and time.time() - config['saved_at'] < CONFIG_TTL and not getattr(type(client), '_config', None):
+            try:
+                type(client)._config = BinaryReader(base64.b64decode(config['data'])).tgread_object()
+                self._config = (type(client)._config, config['saved_at'])
+                self.stats['config'] = True
+            except Exception as e:
+                print(f"⚠️ Session cache: config tidak terbaca ({e!r})")
+
+        for dc_id, key in data.get('auth_keys', {}).items():
+            auth_keys.setdefault(int(dc_id), AuthKey(base64.b64decode(key)))
+        self.stats['auth_keys'] = len(data.get('auth_keys', {}))
+
+        if entities is not None:
+            # Cached rows come oldest first; the ones the client already had count as newer
+            known = list(entities.order)
+            entities.update(tuple(row) for row in data.get('entities', []))
+            entities.update(known)
+            self.stats['entities'] = len(data.get('entities', []))
+        self.stats['loaded'] = True
+        return True
+
+    def save(self, client, auth_keys: dict):
+        data = {'saved_at': time.time()}
+        config = getattr(type(client), '_config', None)
+        if config is not None:
+            # A config restored from the cache keeps its age, so it is refreshed once a day
+            saved_at = self._config[1] if self._config and self._config[0] is config else time.time()
+            data['config'] = {'saved_at': saved_at, 'data': base64.b64encode(bytes(config)).decode()}
+        data['auth_keys'] = {str(dc_id): base64.b64encode(key.key).decode()
+                             for dc_id, key in auth_keys.items() if key and key.key}
+        entities = getattr(client.session, '_entities', None)
+        if entities:
+            rows = entities.newest(MAX_ENTITIES) if isinstance(entities, _EntityLog) else list(entities)[:MAX_ENTITIES]
+            data['entities'] = [list(row) for row in rows]
+        try:
+            self.write(data)
+        except OSError as e:
+            print(f"⚠️ Session cache tidak tersimpan: {e}")
@@ -0,0 +1,264 @@
+import json
+import time
+import sqlite3
+from collections import OrderedDict
+from metrics import counter
+
+# Session lifecycle
+ACTIVE_STATUSES = ('pending', 'queued', 'processing')
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+TRANSITIONS = counter('session_transitions_total', 'Session status changes', ('from', 'to'))
+
+
+class SessionStore:
+    """Base class for upload session storage backends"""
+
+    def __init__(self, pending_ttl: float = 3600, active_ttl: float = 6 * 3600,
+                 terminal_ttl: float = 3600, purge_interval: float = 300):
+        self.pending_ttl = pending_ttl
+        self.active_ttl = active_ttl
+        self.terminal_ttl = terminal_ttl
+        self.purge_interval = purge_interval
+        self._last_purge = time.monotonic()
+
+    def _expires_at(self, status: str):
+        """Absolute expiry for a session in the given status"""
+        if status == 'pending':
+            ttl = self.pending_ttl
+        elif status in TERMINAL_STATUSES:
+            ttl = self.terminal_ttl
+        else:
+            ttl = self.active_ttl
+        return time.time() + ttl
+
+    def _maybe_purge(self):
+        if time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            self.purge_expired()
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def get(self, session_id: str):
+        raise NotImplementedError
+
+    def put(self, session_id: str, session: dict):
+        raise NotImplementedError
+
+    def update(self, session_id: str, **fields):
+        """Merge fields into a stored session, returning the updated session (or None)"""
+        session = self.get(session_id)
+        if session is None:
+            return None
+        if fields.get('status', session['status']) != session['status']:
+            TRANSITIONS.labels(session['status'], fields['status']).inc()
+        session = {**session, **fields}
+        self.put(session_id, session)
+        return session
+
+    def transition(self, session_id: str, expected: str, **fields):
+        """`update` only if the session is still in status `expected` (compare-and-set); None otherwise"""
+        session = self.get(session_id)
+        if session is None or session['status'] != expected:
+            return None
+        return self.update(session_id, **fields)
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def for_user(self, user_id: str, statuses=None):
+        """List (session_id, session) pairs for one user, oldest first"""
+        raise NotImplementedError
+
+    def by_status(self, statuses):
+        """List (session_id, session) pairs of every user in one of `statuses`, oldest first"""
+        raise NotImplementedError
+
+    def purge_expired(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store, indexed by user (nothing survives a restart)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._sessions = {}
+        self._expiry = {}
+        self._by_user = {}
+
+    def get(self, session_id: str):
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if self._expiry[session_id] <= time.time():
+            self.delete(session_id)
+            return None
+        return dict(session)
+
+    def put(self, session_id: str, session: dict):
+        self._maybe_purge()
+        self._sessions[session_id] = dict(session)
+        self._expiry[session_id] = self._expires_at(session['status'])
+        self._by_user.setdefault(session['user_id'], set()).add(session_id)
+
+    def delete(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        self._expiry.pop(session_id, None)
+        if session is not None:
+            user_sessions = self._by_user.get(session['user_id'])
+            if user_sessions is not None:
+                user_sessions.discard(session_id)
+                if not user_sessions:
+                    del self._by_user[session['user_id']]
+
+    def for_user(self, user_id: str, statuses=None):
+        result = []
+        for session_id in list(self._by_user.get(user_id, ())):
+            session = self.get(session_id)
+            if session is not None and (statuses is None or session['status'] in statuses):
+                result.append((session_id, session))
+        result.sort(key=lambda item: item[1]['created_at'])
+        return result
+
+    def by_status(self, statuses):
+        result = []
+        for session_id in list(self._sessions):
+            session = self.get(session_id)
+            if session is not None and session['status'] in statuses:
+                result.append((session_id, session))
+        result.sort(key=lambda item: item[1]['created_at'])
+        return result
+
+    def purge_expired(self):
+        now = time.time()
+        expired = [session_id for session_id, expires_at in self._expiry.items() if expires_at <= now]
+        for session_id in expired:
+            self.delete(session_id)
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """SQLite-backed store (WAL, indexed by user/status) with an in-memory LRU front cache"""
+
+    def __init__(self, path: str = 'sessions.db', cache_size: int = 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_user_status ON sessions (user_id, status);
+            CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at);
+        ''')
+        self.purge_expired()
+
+    def _cache_set(self, session_id: str, session: dict, expires_at: float):
+        self._cache[session_id] = (session, expires_at)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, session_id: str):
+        cached = self._cache.get(session_id)
+        if cached is None:
+            row = self._db.execute(
+                'SELECT data, expires_at FROM sessions WHERE session_id = ?', (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            cached = (json.loads(row[0]), row[1])
+            self._cache_set(session_id, *cached)
+        else:
+            self._cache.move_to_end(session_id)
+
+        session, expires_at = cached
+        if expires_at <= time.time():
+            self.delete(session_id)
+            return None
+        return dict(session)
+
+    def put(self, session_id: str, session: dict):
+        self._maybe_purge()
+        session = dict(session)
+        expires_at = self._expires_at(session['status'])
+        self._db.execute(
+            'INSERT OR REPLACE INTO sessions (session_id, user_id, status, created_at, expires_at, data) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (session_id, session['user_id'], session['status'], session['created_at'],
+             expires_at, json.dumps(session))
+        )
+        self._cache_set(session_id, session, expires_at)
+
+    def transition(self, session_id: str, expected: str, **fields):
+        session = self.get(session_id)
+        if session is None or session['status'] != expected:
+            return None
+        session = {**session, **fields}
+        expires_at = self._expires_at(session['status'])
+        # The status guard lives in the UPDATE, so a second process sharing the file cannot win too
+        changed = self._db.execute(
+            'UPDATE sessions SET status = ?, expires_at = ?, data = ? WHERE session_id = ? AND status = ?',
+            (session['status'], expires_at, json.dumps(session), session_id, expected)
+        ).rowcount
+        if not changed:
+            self._cache.pop(session_id, None)
+            return None
+        if session['status'] != expected:
+            TRANSITIONS.labels(expected, session['status']).inc()
+        self._cache_set(session_id, session, expires_at)
+        return session
+
+    def delete(self, session_id: str):
+        self._cache.pop(session_id, None)
+        self._db.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+
+    def for_user(self, user_id: str, statuses=None):
+        query = 'SELECT session_id, data FROM sessions WHERE user_id = ? AND expires_at > ?'
+        params = [user_id, time.time()]
+        if statuses:
+            query += f" AND status IN ({','.join('?' * len(statuses))})"
+            params.extend(statuses)
+        query += ' ORDER BY created_at'
+        return [(session_id, json.loads(data)) for session_id, data in self._db.execute(query, params)]
+
+    def by_status(self, statuses):
+        rows = self._db.execute(
+            f"SELECT session_id, data FROM sessions WHERE status IN ({','.join('?' * len(statuses))}) "
+            f"AND expires_at > ? ORDER BY created_at",
+            (*statuses, time.time())
+        )
+        return [(session_id, json.loads(data)) for session_id, data in rows]
+
+    def purge_expired(self):
+        now = time.time()
+        for session_id in [k for k, (_, expires_at) in self._cache.items() if expires_at <= now]:
+            del self._cache[session_id]
+        return self._db.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,)).rowcount
+
+    def close(self):
+        self._db.close()
+
+
+def create_session_store(backend: str = 'sqlite', **kwargs):
+    """Build a session store for the configured backend ('sqlite' or 'memory')"""
+    if backend == 'memory':
+        kwargs.pop('path', None)
+        kwargs.pop('cache_size', None)
+        return MemorySessionStore(**kwargs)
+    if backend == 'sqlite':
+        return SQLiteSessionStore(**kwargs)
+    raise ValueError(f"Unknown session store backend: {backend}")
@@ -0,0 +1,103 @@
+import asyncio
+
+# Telegram serves files in parts of at most 512 KiB
+STREAM_CHUNK_SIZE = 512 * 1024
+STREAM_BUFFER_CHUNKS = 8
+
+
+class ChunkBuffer:
+    """Bounded in-memory pipe between a download producer and an upload body
+
+    The producer blocks once `max_chunks` chunks are buffered, so peak memory
+    is max_chunks * chunk size no matter how large the file is.
+    """
+
+    _EOF = object()
+
+    def __init__(self, max_chunks: int = STREAM_BUFFER_CHUNKS):
+        self._queue = asyncio.Queue(maxsize=max_chunks)
+        self._error = None
+        self.detached = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def put(self, chunk: bytes):
+        if self.detached:
+            return
+        self.bytes_in += len(chunk)
+        await self._queue.put(chunk)
+
+    def detach(self):
+        """Consumer is gone: drop buffered chunks and make further puts no-ops"""
+        self.detached = True
+        while not self._queue.empty():
+            self._queue.get_nowait()
+
+    async def close(self, error: BaseException = None):
+        """Mark the end of the stream; a producer error is re-raised to the consumer"""
+        if self.detached:
+            return
+        self._error = error
+        await self._queue.put(self._EOF)
+
+    async def __aiter__(self):
+        while True:
+            chunk = await self._queue.get()
+            if chunk is self._EOF:
+                if self._error is not None:
+                    raise self._error
+                return
+            self.bytes_out += len(chunk)
+            yield chunk
+
+
+async def tee_mirror(source, uploads, max_chunks: int = STREAM_BUFFER_CHUNKS):
+    """Feed one download to several uploads at once
+
+    Every chunk is copied into one bounded buffer per upload, so the download
+    runs once and is paced by the slowest host. An upload that fails is
+    detached and the others carry on. Returns one result (or exception) per
+    upload, in order.
+    """
+    buffers = [ChunkBuffer(max_chunks) for _ in uploads]
+
+    async def produce():
+        try:
+            async for chunk in source:
+                chunk = bytes(chunk)
+                live = [buffer for buffer in buffers if not buffer.detached]
+                if not live:
+                    return
+                for buffer in live:
+                    await buffer.put(chunk)
+        except Exception as e:
+            for buffer in buffers:
+                await buffer.close(e)
+            raise
+        for buffer in buffers:
+            await buffer.close()
+
+    async def consume(upload, buffer):
+        try:
+            return await upload(buffer)
+        finally:
+            buffer.detach()
+
+    producer = asyncio.create_task(produce())
+    try:
+        results = await asyncio.gather(
+            *(consume(upload, buffer) for upload, buffer in zip(uploads, buffers)),
+            return_exceptions=True
+        )
+    finally:
+        if not producer.done():
+            producer.cancel()
+        try:
+            await producer
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    if not producer.cancelled() and producer.exception() is not None:
+        # Surface the download error rather than the broken uploads it caused
+        return [producer.exception() if isinstance(result, Exception) else result for result in results]
+    return results
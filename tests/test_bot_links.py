@@ -0,0 +1,42 @@
+import importlib
+import pytest
+
+
+@pytest.fixture(scope='module')
+def bot(tmp_path_factory):
+    # bot opens its SQLite stores in the working directory on import
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path_factory.mktemp('bot'))
+        yield importlib.import_module('bot')
+
+
+def test_single_links(bot):
+    assert bot.parse_message_links(['https://t.me/c/1234/56', 'https://t.me/channel/7?single'], 10) == [
+        (-1001234, 56), ('@channel', 7)
+    ]
+
+
+def test_range_expands(bot):
+    assert bot.parse_message_links(['https://t.me/c/1234/500-503'], 10) == [
+        (-1001234, 500), (-1001234, 501), (-1001234, 502), (-1001234, 503)
+    ]
+
+
+def test_duplicates_collapse(bot):
+    assert bot.parse_message_links(['https://t.me/chan/5-6', 'https://t.me/chan/6'], 10) == [
+        ('@chan', 5), ('@chan', 6)
+    ]
+
+
+def test_range_capped_past_limit(bot):
+    # Past the limit, so the caller can tell the request was too large, without expanding it all
+    assert len(bot.parse_message_links(['https://t.me/c/1234/1-1000000000'], 100)) == 101
+    too_many = bot.parse_message_links(['https://t.me/chan/1-60', 'https://t.me/chan/100-160', 'https://t.me/chan/200'], 100)
+    assert 100 < len(too_many) <= 200 and ('@chan', 200) not in too_many
+
+
+@pytest.mark.parametrize('link', [
+    'https://t.me/c/1234/abc', 'https://t.me/chan/10-5', 'https://t.me/chan/5-x', 'https://t.me/chan', 'hello'
+])
+def test_invalid_links(bot, link):
+    assert bot.parse_message_links([link], 10) is None
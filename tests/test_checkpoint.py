@@ -0,0 +1,92 @@
+import json
+from checkpoint import Checkpoint, prune
+
+PART = 4096
+
+
+def test_bitmap_roundtrip(tmp_path):
+    checkpoint = Checkpoint.open(tmp_path, 'AgAD:x/y', 10 * PART + 100, PART)
+    assert checkpoint.part_count == 11
+    for index in (0, 3, 10):
+        checkpoint.mark_part(index)
+    checkpoint.mark_uploaded('pixeldrain', 'https://pixeldrain.com/u/abc')
+    checkpoint.release()
+
+    reopened = Checkpoint.open(tmp_path, 'AgAD:x/y', 10 * PART + 100, PART)
+    assert reopened.done_parts() == {0, 3, 10}
+    assert reopened.bytes_done == 2 * PART + 100
+    assert reopened.uploads == {'pixeldrain': 'https://pixeldrain.com/u/abc'}
+    assert reopened.slug == 'AgAD_x_y'
+    reopened.reset_parts()
+    assert reopened.done_parts() == set()
+
+
+def test_manifest_for_other_file_is_ignored(tmp_path):
+    checkpoint = Checkpoint.open(tmp_path, 'key', 8 * PART, PART)
+    checkpoint.mark_part(1)
+    checkpoint.save()
+    checkpoint.release()
+
+    resized = Checkpoint.open(tmp_path, 'key', 9 * PART, PART)
+    assert resized.done_parts() == set()
+    resized.release()
+    other_parts = Checkpoint.open(tmp_path, 'key', 8 * PART, 2 * PART)
+    assert other_parts.done_parts() == set()
+
+
+def test_corrupt_manifest_starts_fresh(tmp_path):
+    (tmp_path / 'key.json').write_text('{not json')
+    checkpoint = Checkpoint.open(tmp_path, 'key', PART, PART)
+    assert checkpoint.done_parts() == set()
+
+
+def test_lock_is_exclusive_until_release(tmp_path):
+    first = Checkpoint.open(tmp_path, 'key', PART, PART)
+    assert Checkpoint.open(tmp_path, 'key', PART, PART) is None
+    assert Checkpoint.open(tmp_path, 'other', PART, PART) is not None
+    first.release()
+    assert Checkpoint.open(tmp_path, 'key', PART, PART) is not None
+
+
+def test_discard_removes_manifest(tmp_path):
+    checkpoint = Checkpoint.open(tmp_path, 'key', PART, PART)
+    checkpoint.save()
+    checkpoint.discard()
+    checkpoint.discard()
+    assert not (tmp_path / 'key.json').exists()
+
+
+def test_prune_age_orphans_and_size(tmp_path):
+    directory, parts = tmp_path / 'checkpoints', tmp_path / 'downloads'
+    parts.mkdir()
+
+    def make(key, age, size):
+        checkpoint = Checkpoint.open(directory, key, size, PART)
+        checkpoint.save()
+        data = json.loads(checkpoint.path.read_text())
+        data['updated_at'] -= age
+        checkpoint.path.write_text(json.dumps(data))
+        (parts / f"{checkpoint.slug}.part").write_bytes(b'\1' * size)
+        return checkpoint
+
+    make('stale', 10 * 3600, PART).release()
+    make('old', 60, 4 * PART).release()
+    make('new', 0, 4 * PART).release()
+    busy = make('busy', 10 * 3600, PART)
+    (parts / 'orphan.part').write_bytes(b'\1' * PART)
+    (directory / 'gone.lock').touch()
+
+    # Stale, orphan part and orphan lock go; then the oldest until 5 parts' worth remain
+    assert prune(directory, parts, 3600, 5 * PART) == 4
+    assert sorted(path.name for path in parts.iterdir()) == ['busy.part', 'new.part']
+    assert sorted(path.name for path in directory.iterdir()) == ['busy.json', 'busy.lock', 'new.json', 'new.lock']
+    busy.release()
+    assert prune(directory, parts, 3600, 5 * PART) == 1
+
+
+def test_discard_removes_lock(tmp_path):
+    checkpoint = Checkpoint.open(tmp_path, 'key', PART, PART)
+    checkpoint.save()
+    checkpoint.discard()
+    checkpoint.release()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,29 @@
+from file_ref import FileRef
+
+
+def test_pack_roundtrip():
+    ref = FileRef('video', -1001234, 42, 'AgADxyz', 'clip.mp4', 12345)
+    packed = ref.pack()
+    assert packed == [2, -1001234, 42, 'AgADxyz', 'clip.mp4', 12345]
+    restored = FileRef.unpack(packed)
+    assert (restored.kind, restored.chat_id, restored.message_id, restored.unique_id,
+            restored.name, restored.size) == ('video', -1001234, 42, 'AgADxyz', 'clip.mp4', 12345)
+
+
+def test_link_drops_trailing_fields():
+    ref = FileRef.link('@channel', 7)
+    assert ref.pack() == [8, '@channel', 7]
+    restored = FileRef.unpack(ref.pack())
+    assert restored.kind == 'link' and restored.name is None and restored.size is None
+    assert restored.key == 'link:@channel:7'
+
+
+def test_key_prefers_unique_id():
+    assert FileRef('document', 1, 2, 'AgADabc').key == 'AgADabc'
+
+
+def test_unpack_legacy_dict():
+    restored = FileRef.unpack({'type': 'document', 'chat_id': 1, 'message_id': 2,
+                               'file_unique_id': 'u', 'file_name': 'a.bin', 'file_size': 3})
+    assert restored.pack() == [0, 1, 2, 'u', 'a.bin', 3]
+    assert FileRef.unpack({'chat_id': 1, 'message_id': 2}).kind == 'link'
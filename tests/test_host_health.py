@@ -0,0 +1,96 @@
+import asyncio
+import pytest
+from host_health import HostHealth, HEALTH, FAILURE_THRESHOLD, OPEN_SECONDS
+from uploaders import Uploader
+
+
+def opened(name='host'):
+    health = HostHealth(name)
+    for _ in range(FAILURE_THRESHOLD):
+        health.record(False)
+    assert health.state == 'open'
+    return health
+
+
+def expire(health):
+    health.opened_at -= health.cooldown + 1
+    assert health.state == 'half_open'
+
+
+def test_single_probe_when_half_open():
+    health = opened()
+    assert not health.allow()
+    expire(health)
+    assert health.allow()
+    assert not health.allow()
+    health.record(True)
+    assert health.state == 'closed' and health.cooldown == OPEN_SECONDS
+
+
+def test_only_failed_probe_doubles_cooldown():
+    health = opened()
+    # Late failures of uploads that started before the circuit opened
+    health.record(False)
+    health.record(False)
+    assert health.cooldown == OPEN_SECONDS
+    expire(health)
+    assert health.allow()
+    health.record(False)
+    assert health.state == 'open' and health.cooldown == 2 * OPEN_SECONDS
+
+
+def test_released_probe_lets_next_caller_through():
+    health = opened()
+    expire(health)
+    assert health.allow()
+    health.release_probe()
+    assert health.available and health.allow()
+
+
+class _Host(Uploader):
+    name = 'test-host'
+
+    async def _upload(self, filename, size, body):
+        async for _ in body:
+            pass
+        return 'https://example.invalid/f'
+
+
+def test_source_errors_are_not_host_failures():
+    async def broken():
+        yield b'x'
+        raise ConnectionError('telegram download failed')
+
+    async def scenario():
+        uploader = _Host()
+        with pytest.raises(ConnectionError):
+            await uploader.upload('f.bin', 2, broken())
+        assert not HEALTH['test-host'].outcomes
+
+        async def ok():
+            yield b'xy'
+        assert await uploader.upload('f.bin', 2, ok()) == 'https://example.invalid/f'
+        assert HEALTH['test-host'].outcomes[-1][1] is True
+    asyncio.run(scenario())
+
+
+def test_cancelled_probe_is_released():
+    workflow_handler = pytest.importorskip('workflow_handler')
+
+    async def scenario():
+        uploader = _Host()
+        uploader.name = 'cancelled-host'
+        health = HEALTH['cancelled-host']
+        for _ in range(FAILURE_THRESHOLD):
+            health.record(False)
+        expire(health)
+
+        async def hang(uploader, callback):
+            await asyncio.sleep(3600)
+        task = asyncio.create_task(workflow_handler.upload_with_retries(uploader, hang))
+        await asyncio.sleep(0)
+        assert not health.available
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert health.available
+    asyncio.run(scenario())
@@ -0,0 +1,24 @@
+import time
+from job_queue import JobQueue
+
+
+def test_finished_jobs_are_purged_as_jobs_arrive(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'), keep_finished=0, purge_interval=0)
+    job_id = queue.put('s1', 'gofile', {})
+    queue.claim('w')
+    queue.finish(job_id)
+    queue.cancel('s0')
+    time.sleep(0.01)
+    queue.put('s2', 'gofile', {})
+    assert queue.counts() == {'queued': 1}
+    assert queue.cancels_since(0) == []
+    queue.close()
+
+
+def test_cancel_polling_uses_an_index(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    plan = queue._db.execute(
+        'EXPLAIN QUERY PLAN SELECT session_id, created_at FROM cancels WHERE created_at > ? ORDER BY created_at', (0,)
+    ).fetchall()
+    assert 'idx_cancels_created' in str(plan)
+    queue.close()
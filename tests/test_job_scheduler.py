@@ -0,0 +1,103 @@
+import asyncio
+from job_scheduler import FairScheduler, MiB
+
+
+def run(scheduler_test):
+    asyncio.run(scheduler_test())
+
+
+def launcher(started, session_id):
+    async def launch():
+        started.append(session_id)
+    return launch
+
+
+def test_small_jobs_admitted_first():
+    async def scenario():
+        started = []
+        scheduler = FairScheduler(max_in_flight=1, per_user=5)
+        assert scheduler.submit('busy', 'a', 0, launcher(started, 'busy')) == 0
+        assert scheduler.submit('big', 'b', 1000 * MiB, launcher(started, 'big')) == 1
+        assert scheduler.submit('small', 'c', 1 * MiB, launcher(started, 'small')) == 1
+        assert scheduler.position('big') == 2
+
+        scheduler.release('busy')
+        await asyncio.sleep(0)
+        assert started == ['busy', 'small']
+        scheduler.release('small')
+        await asyncio.sleep(0)
+        assert started == ['busy', 'small', 'big']
+    run(scenario)
+
+
+def test_backlog_does_not_starve_newcomer():
+    async def scenario():
+        started = []
+        scheduler = FairScheduler(max_in_flight=1, per_user=5)
+        for i in range(5):
+            scheduler.submit(f"a{i}", 'a', 10 * MiB, launcher(started, f"a{i}"))
+        scheduler.submit('b0', 'b', 10 * MiB, launcher(started, 'b0'))
+        # a0 runs; the newcomer's first job finishes before the rest of a's backlog
+        assert scheduler.position('b0') == 1
+        scheduler.release('a0')
+        await asyncio.sleep(0)
+        assert started == ['a0', 'b0']
+    run(scenario)
+
+
+def test_discard_gives_back_its_cost():
+    async def scenario():
+        started = []
+        scheduler = FairScheduler(max_in_flight=1, per_user=5)
+        scheduler.submit('busy', 'x', 0, launcher(started, 'busy'))
+        scheduler.submit('a0', 'a', 100 * MiB, launcher(started, 'a0'))
+        scheduler.submit('a1', 'a', 1 * MiB, launcher(started, 'a1'))
+        scheduler.submit('b0', 'b', 10 * MiB, launcher(started, 'b0'))
+        assert scheduler.position('a1') == 3
+        assert scheduler.discard('a0')
+        # a1 no longer waits behind the 100 MiB job that will never run
+        assert scheduler.position('a1') == 1
+        scheduler.submit('a2', 'a', 1 * MiB, launcher(started, 'a2'))
+        assert scheduler.position('a2') == 2
+    run(scenario)
+
+
+def test_restored_session_holds_a_slot():
+    async def scenario():
+        started = []
+        scheduler = FairScheduler(max_in_flight=1)
+        scheduler.restore('old', 'a')
+        assert scheduler.submit('new', 'b', 0, launcher(started, 'new')) == 1
+        scheduler.release('old')
+        await asyncio.sleep(0)
+        assert started == ['new']
+    run(scenario)
+
+
+def test_per_user_limit_and_discard():
+    async def scenario():
+        started = []
+        scheduler = FairScheduler(max_in_flight=4, per_user=1)
+        scheduler.submit('a0', 'a', 0, launcher(started, 'a0'))
+        assert scheduler.submit('a1', 'a', 0, launcher(started, 'a1')) == 1
+        assert scheduler.submit('b0', 'b', 0, launcher(started, 'b0')) == 0
+        assert scheduler.discard('a1')
+        assert not scheduler.discard('a1')
+        scheduler.release('a0')
+        await asyncio.sleep(0)
+        assert started == ['a0', 'b0']
+        assert scheduler.snapshot()['queued'] == 0
+    run(scenario)
+
+
+def test_lease_expiry_frees_slot():
+    async def scenario():
+        started = []
+        scheduler = FairScheduler(max_in_flight=1, lease=0)
+        scheduler.submit('lost', 'a', 0, launcher(started, 'lost'))
+        await asyncio.sleep(0.01)
+        scheduler.submit('next', 'b', 0, launcher(started, 'next'))
+        await asyncio.sleep(0)
+        assert started == ['lost', 'next']
+        assert scheduler.stats['expired'] == 1
+    run(scenario)
@@ -0,0 +1,33 @@
+import asyncio
+from link_resolver import LinkResolver
+
+
+class _Client:
+    """get_messages fails until the dialogs are loaded; the first get_dialogs fails"""
+
+    def __init__(self):
+        self.dialog_calls = 0
+        self.loaded = False
+
+    async def get_dialogs(self):
+        self.dialog_calls += 1
+        if self.dialog_calls == 1:
+            raise ConnectionError('dropped')
+        self.loaded = True
+        return []
+
+    async def get_messages(self, chat_id, ids=None):
+        if not self.loaded:
+            raise ValueError('Could not find the input entity')
+        return [None] * len(ids)
+
+
+def test_failed_dialog_load_is_retried(tmp_path):
+    async def scenario():
+        resolver = LinkResolver(str(tmp_path / 'links.db'))
+        resolver.client = _Client()
+        assert await resolver.resolve([('@chan', 1)]) == {}
+        assert resolver.stats['unresolved'] == 1
+        assert await resolver.resolve([('@chan', 1)]) == {('@chan', 1): None}
+        assert resolver.client.dialog_calls == 2
+    asyncio.run(scenario())
@@ -0,0 +1,49 @@
+import asyncio
+from telethon.errors import FileMigrateError, FloodWaitError
+from parallel_download import ParallelDownloader
+
+PART = 4096
+
+
+class _Sender:
+    def __init__(self, dc_id):
+        self.dc_id = dc_id
+        self.flooded = False
+
+    async def send(self, request):
+        await asyncio.sleep(0)
+        if self.dc_id != 2:
+            if request.offset and not self.flooded:
+                self.flooded = True
+                # Comes back for a retry while the migration is still connecting the new senders
+                await asyncio.sleep(0.002)
+                raise FloodWaitError(request=None, capture=0)
+            raise FileMigrateError(request=None, capture=2)
+        return type('Part', (), {'bytes': bytes([request.offset // PART % 256]) * request.limit})
+
+    async def disconnect(self):
+        pass
+
+
+class _Downloader(ParallelDownloader):
+    """Senders that answer FILE_MIGRATE to DC 2 until they are on DC 2, which is slow to connect"""
+
+    async def _create_sender(self, dc_id):
+        await asyncio.sleep(0.01 if dc_id == 2 else 0)
+        return _Sender(dc_id)
+
+    async def _prepare(self, media, file_size):
+        self._location = media
+        await self._connect(1, self.workers)
+        return -(-file_size // self.part_size)
+
+
+def test_migration_swaps_senders_without_gap(tmp_path):
+    async def scenario():
+        downloader = _Downloader(None, workers=4, part_size=PART)
+        path = tmp_path / 'file.bin'
+        await downloader.download_to_file(None, path, 16 * PART)
+        data = path.read_bytes()
+        assert [data[i * PART] for i in range(16)] == list(range(16))
+        assert downloader.stats['migrations'] == 1
+    asyncio.run(scenario())
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+from telethon.sessions import MemorySession
+from session_cache import SessionCache, MAX_ENTITIES
+
+
+def client():
+    return SimpleNamespace(session=MemorySession())
+
+
+def row(entity_id):
+    return entity_id, entity_id * 7, None, None, None
+
+
+def test_keeps_newest_entities(tmp_path):
+    path = tmp_path / 'userbot.bin'
+    first = client()
+    SessionCache(path, 'secret').load(first, {})
+    for entity_id in range(2 * MAX_ENTITIES):
+        first.session._entities |= {row(entity_id)}
+    first.session._entities |= {row(3)}
+    SessionCache(path, 'secret').save(first, {})
+
+    second = client()
+    second.session._entities |= {row(-1)}
+    assert SessionCache(path, 'secret').load(second, {})
+    ids = [entity[0] for entity in second.session._entities.order]
+    assert len(ids) == MAX_ENTITIES + 1
+    assert ids[-3:] == [2 * MAX_ENTITIES - 1, 3, -1]
+    assert min(i for i in ids if i > 3) == MAX_ENTITIES + 1
+    assert second.session.get_entity_rows_by_id(2 * MAX_ENTITIES - 1) == (2 * MAX_ENTITIES - 1, (2 * MAX_ENTITIES - 1) * 7)
+
+
+def test_other_secret_starts_cold(tmp_path):
+    path = tmp_path / 'userbot.bin'
+    SessionCache(path, 'secret').save(client(), {})
+    assert not SessionCache(path, 'other').load(client(), {})
@@ -0,0 +1,33 @@
+import pytest
+from session_store import create_session_store
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    store = create_session_store(request.param, path=str(tmp_path / 'sessions.db'))
+    yield store
+    store.close()
+
+
+def session(status='pending'):
+    return {'user_id': 'u', 'status': status, 'created_at': '2026-01-01T00:00:00', 'files': []}
+
+
+def test_transition_only_from_expected_status(store):
+    store.put('s1', session())
+    assert store.transition('s1', 'pending', status='queued', note=1)['status'] == 'queued'
+    assert store.transition('s1', 'pending', status='queued') is None
+    assert store.get('s1')['note'] == 1
+    assert store.transition('missing', 'pending', status='queued') is None
+
+
+def test_transition_sees_other_writers(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    first = create_session_store('sqlite', path=path)
+    second = create_session_store('sqlite', path=path)
+    first.put('s1', session())
+    assert second.get('s1')['status'] == 'pending'
+    assert first.transition('s1', 'pending', status='queued') is not None
+    # `second` still has the pending copy cached; the guarded UPDATE refuses it
+    assert second.transition('s1', 'pending', status='queued') is None
+    assert second.get('s1')['status'] == 'queued'
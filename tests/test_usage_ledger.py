@@ -0,0 +1,58 @@
+import threading
+import pytest
+from usage_ledger import UsageLedger
+
+MB = 1024 * 1024
+
+
+def test_reserve_respects_quota(tmp_path):
+    ledger = UsageLedger(str(tmp_path / 'usage.db'))
+    quotas = {'bytes_out': 100 * MB}
+    assert ledger.reserve('s1', 'u', 60 * MB, 1, quotas) is None
+    assert ledger.reserve('s2', 'u', 60 * MB, 1, quotas) == ('bytes_out', 60 * MB, 100 * MB)
+    assert ledger.reserved('u') == {'bytes_out': 60 * MB, 'files': 1}
+
+
+def test_concurrent_reservations_do_not_overshoot(tmp_path):
+    path = str(tmp_path / 'usage.db')
+    UsageLedger(path).close()
+    quotas = {'files': 10}
+    results = []
+
+    def confirm(worker):
+        ledger = UsageLedger(path)
+        ledger._db.execute('PRAGMA busy_timeout = 5000')
+        for i in range(10):
+            results.append(ledger.reserve(f"{worker}-{i}", 'u', 0, 1, quotas))
+        ledger.close()
+
+    threads = [threading.Thread(target=confirm, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(None) == 10
+    assert UsageLedger(path).reserved('u')['files'] == 10
+
+
+def test_record_replaces_reservation(tmp_path):
+    ledger = UsageLedger(str(tmp_path / 'usage.db'))
+    ledger.reserve('s1', 'u', 10 * MB, 2)
+    ledger.record('u', ['pixeldrain', 'gofile'], bytes_in=4 * MB, runner_seconds=30,
+                  delivered={'pixeldrain': {'bytes': 4 * MB, 'files': 1}}, session_id='s1')
+    assert ledger.reserved('u') == {'bytes_out': 0, 'files': 0}
+    totals = ledger.totals('u')
+    assert (totals['bytes_in'], totals['bytes_out'], totals['files'], totals['sessions']) == (4 * MB, 4 * MB, 1, 1)
+    assert ledger.totals('u', by_service=True)['gofile']['runner_seconds'] == 15
+
+
+def test_failed_write_rolls_back(tmp_path):
+    ledger = UsageLedger(str(tmp_path / 'usage.db'))
+    ledger.reserve('s1', 'u', MB, 1)
+    # Too large for SQLite: fails after the reservation was deleted, inside the transaction
+    with pytest.raises(OverflowError):
+        ledger.record('u', ['a'], delivered={'a': {'bytes': 2 ** 70, 'files': 1}}, session_id='s1')
+    assert ledger.reserved('u')['files'] == 1
+    assert ledger.totals('u')['sessions'] == 0
+    ledger.release('s1')
+    assert ledger.reserved('u')['files'] == 0
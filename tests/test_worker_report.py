@@ -0,0 +1,59 @@
+from worker_report import (MAX_MESSAGE_LENGTH, encode_report, decode_report, encode_cancel, decode_cancel,
+                           format_results)
+
+SECRET = '123456:token'
+
+
+def report(files: int):
+    return {'session_id': 'abc123', 'files': [
+        {'name': f"file_{i:04d}_{'x' * 40}.bin", 'urls': {'pixeldrain': f"https://pixeldrain.com/u/{i:08x}{i * 7919:08x}"}}
+        for i in range(files)
+    ]}
+
+
+def test_roundtrip():
+    messages = encode_report(report(3), SECRET)
+    assert len(messages) == 1
+    assert decode_report(messages[0], SECRET) == report(3)
+
+
+def test_rejects_tampered_or_foreign():
+    message = encode_report(report(1), SECRET)[0]
+    signature, payload = message.split('.', 1)
+    assert decode_report(message, 'other:secret') is None
+    assert decode_report(f"{signature[:-1]}0.{payload}", SECRET) is None
+    assert decode_report(f"{signature}.{payload[:-4]}AAAA", SECRET) is None
+    assert decode_report('#report garbage', SECRET) is None
+    assert decode_report('hello', SECRET) is None
+
+
+def test_long_report_is_split():
+    full = report(400)
+    messages = encode_report(full, SECRET)
+    assert len(messages) > 1
+    assert all(len(message) <= MAX_MESSAGE_LENGTH for message in messages)
+    parts = [decode_report(message, SECRET) for message in messages]
+    assert all(part['session_id'] == 'abc123' for part in parts)
+    assert [f for part in parts for f in part['files']] == full['files']
+
+
+def test_cancel_roundtrip():
+    message = encode_cancel(['a', 'b'], SECRET)
+    assert decode_cancel(message, SECRET) == ['a', 'b']
+    assert decode_cancel(message, 'other:secret') is None
+    assert decode_report(message, SECRET) is None
+
+
+def test_results_split_by_length():
+    files = [{'name': f"file_{i:03d}_{'y' * 60}.mkv",
+              'urls': {'pixeldrain': f"https://pixeldrain.com/u/{i:08d}", 'gofile': f"https://gofile.io/d/{i:08d}"}}
+             for i in range(100)]
+    pages = format_results(files)
+    assert len(pages) > 1
+    assert all(len(page) <= MAX_MESSAGE_LENGTH for page in pages)
+    assert pages[0].startswith("✅")
+    text = ''.join(pages)
+    assert all(f['name'] in text for f in files)
+    assert sum(page.count('📄') for page in pages) == 100
+    assert len(format_results(files[:2])) == 1
+    assert len(format_results([])) == 1
@@ -0,0 +1,56 @@
+import asyncio
+import gc
+import pytest
+from file_ref import FileRef
+
+workflow_handler = pytest.importorskip('workflow_handler')
+
+
+class _Client:
+    """get_messages fails until the dialogs are loaded; the first get_dialogs fails"""
+
+    def __init__(self):
+        self.dialog_calls = 0
+        self.loaded = False
+
+    async def get_dialogs(self):
+        self.dialog_calls += 1
+        if self.dialog_calls == 1:
+            raise ConnectionError('dropped')
+        self.loaded = True
+        return []
+
+    async def get_messages(self, chat_id, ids=None):
+        if not self.loaded:
+            raise ValueError('Could not find the input entity')
+        return f"{chat_id}/{ids}"
+
+
+def test_failed_dialog_load_is_retried():
+    async def scenario():
+        client = _Client()
+        ref = FileRef.link('@chan', 5)
+        with pytest.raises(ConnectionError):
+            await workflow_handler.get_message(client, ref)
+        assert await workflow_handler.get_message(client, ref) == '@chan/5'
+        assert client.dialog_calls == 2
+    asyncio.run(scenario())
+
+
+def test_dialog_loads_do_not_outlive_the_client():
+    async def scenario():
+        client = _Client()
+        client.dialog_calls = 1
+        await workflow_handler.get_message(client, FileRef.link('@chan', 1))
+        assert client in workflow_handler._dialog_loads
+        del client
+        gc.collect()
+        assert not len(workflow_handler._dialog_loads)
+    asyncio.run(scenario())
+
+
+def test_cancel_marks_of_other_sessions_expire():
+    engine = workflow_handler.JobEngine(None, None, None, cancel_ttl=0)
+    engine.cancel('a')
+    engine.cancel('b')
+    assert list(engine._cancelled) == ['b']
@@ -0,0 +1,328 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+from pathlib import Path
+from urllib.parse import quote
+import aiohttp
+from metrics import counter, histogram
+from host_health import HEALTH
+
+DISK_CHUNK_SIZE = 512 * 1024
+GiB = 1024 * 1024 * 1024
+MiB = 1024 * 1024
+
+
+UPLOADS = counter('uploads_total', 'Uploads by service and outcome', ('service', 'result'))
+UPLOAD_BYTES = counter('upload_bytes_total', 'Bytes uploaded per service', ('service',))
+UPLOAD_SECONDS = histogram('upload_seconds', 'Upload duration per service', ('service',))
+UPLOAD_MIBPS = histogram('upload_throughput_mib_per_second', 'Upload throughput per service', ('service',),
+                         buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200))
+
+
+class UploadError(Exception):
+    """The host rejected the upload or returned something we could not parse
+
+    `status` is the HTTP status when there was one. Server errors, 408 and
+    429 are transient and worth retrying; other rejections are not.
+    """
+
+    def __init__(self, message: str, status: int = None, retryable: bool = None):
+        super().__init__(message)
+        self.status = status
+        if retryable is None:
+            retryable = status is not None and (status >= 500 or status in (408, 429))
+        self.retryable = retryable
+
+
+def is_retryable(error: BaseException):
+    """Transient failure (dropped connection, timeout, 5xx/429) that a new attempt may get past"""
+    if isinstance(error, UploadError):
+        return error.retryable
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError))
+
+
+async def read_file_chunks(path: Path, chunk_size: int = DISK_CHUNK_SIZE):
+    """Read a file as an async stream of chunks without blocking the event loop"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def multipart_body(fields: dict, file_field: str, filename: str, size: int, body):
+    """Wrap a byte stream in a multipart/form-data body of known length
+
+    Returns (stream, content_type, content_length) so hosts that only take
+    form uploads still get a streamed body with a Content-Length header.
+    """
+    boundary = uuid.uuid4().hex
+    head = b''
+    for name, value in fields.items():
+        head += (f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                 f'{value}\r\n').encode()
+    safe_name = filename.replace('"', '%22').replace('\r', '').replace('\n', '')
+    head += (f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{safe_name}"\r\n'
+             f'Content-Type: application/octet-stream\r\n\r\n').encode()
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+
+    async def stream():
+        yield head
+        async for chunk in body:
+            yield chunk
+        yield tail
+
+    return stream(), f'multipart/form-data; boundary={boundary}', len(head) + size + len(tail)
+
+
+class Uploader:
+    """Base class for file host backends
+
+    Subclasses set their capabilities as class attributes and implement
+    `_upload`, which sends `body` (an async iterable of `size` bytes) and
+    returns the public URL.
+    """
+
+    name = ''
+    upload_url = ''        # host API endpoint, overridable with <NAME>_UPLOAD_URL (e.g. a local stand-in)
+    max_size = None        # bytes, None = no documented limit
+    streaming = True       # accepts a streamed body when the size is known up front
+    chunked = False        # accepts Transfer-Encoding: chunked (size unknown)
+    resumable = False      # supports resuming an interrupted upload
+    auth_env = None        # environment variable holding the optional API key / user hash
+    tier = 'standard'      # class of service; failover only moves a file to a host of the same tier
+    max_connections = 4
+
+    def __init__(self):
+        self._session = None
+        self.stats = {'uploads': 0, 'failures': 0, 'bytes': 0, 'seconds': 0.0,
+                      'last_latency': None, 'ewma_mbps': None, 'chunk_size': None}
+
+    @property
+    def auth(self):
+        return os.environ.get(self.auth_env) if self.auth_env else None
+
+    @property
+    def health(self):
+        return HEALTH[self.name]
+
+    @property
+    def endpoint(self):
+        return os.environ.get(f"{self.name.upper()}_UPLOAD_URL") or self.upload_url
+
+    def accepts(self, size: int):
+        return self.max_size is None or size <= self.max_size
+
+    def session(self):
+        """Pooled keep-alive session owned by this backend"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=None, connect=30, sock_read=300)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def upload(self, filename: str, size: int, body, progress=None):
+        """Upload a byte stream of known size, returning the file URL
+
+        `progress(n)` is called with the size of every chunk handed to the host.
+        """
+        if not self.accepts(size):
+            raise UploadError(f"{self.name}: file exceeds {self.max_size // MiB} MB limit", retryable=False)
+
+        started = time.monotonic()
+        sent_at = {}
+
+        async def timed_body():
+            try:
+                async for chunk in body:
+                    if progress:
+                        progress(len(chunk))
+                    yield chunk
+            except Exception:
+                sent_at['source_failed'] = True
+                raise
+            sent_at['t'] = time.monotonic()
+
+        try:
+            url = await self._upload(filename, size, timed_body())
+        except Exception:
+            self.stats['failures'] += 1
+            UPLOADS.labels(self.name, 'error').inc()
+            # A body that broke (Telegram download, spool read) says nothing about the host
+            if not sent_at.get('source_failed'):
+                self.health.record(False)
+            raise
+
+        elapsed = time.monotonic() - started
+        mbps = size / MiB / elapsed if elapsed > 0 else 0.0
+        self.stats['uploads'] += 1
+        self.stats['bytes'] += size
+        self.stats['seconds'] += elapsed
+        # Latency = time the host took to answer once the last byte was sent
+        self.stats['last_latency'] = time.monotonic() - sent_at.get('t', started)
+        previous = self.stats['ewma_mbps']
+        self.stats['ewma_mbps'] = mbps if previous is None else 0.3 * mbps + 0.7 * previous
+        self.health.record(True, self.stats['last_latency'], mbps)
+        UPLOADS.labels(self.name, 'ok').inc()
+        UPLOAD_BYTES.labels(self.name).inc(size)
+        UPLOAD_SECONDS.labels(self.name).observe(elapsed)
+        UPLOAD_MIBPS.labels(self.name).observe(mbps)
+        return url
+
+    async def upload_file(self, path: Path, filename: str = None, progress=None, chunk_size: int = DISK_CHUNK_SIZE):
+        """Upload a file from disk, read in `chunk_size` pieces"""
+        path = Path(path)
+        self.stats['chunk_size'] = chunk_size
+        return await self.upload(filename or path.name, path.stat().st_size, read_file_chunks(path, chunk_size),
+                                 progress)
+
+    async def _upload(self, filename: str, size: int, body):
+        raise NotImplementedError
+
+    async def _post_form(self, url: str, fields: dict, file_field: str, filename: str, size: int, body,
+                         headers=None):
+        stream, content_type, length = multipart_body(fields, file_field, filename, size, body)
+        request_headers = {'Content-Type': content_type, 'Content-Length': str(length), **(headers or {})}
+        async with self.session().post(url, data=stream, headers=request_headers) as r:
+            return r.status, await r.text()
+
+
+UPLOADERS = {}
+_instances = {}
+
+
+def register(cls):
+    UPLOADERS[cls.name] = cls
+    return cls
+
+
+def get_uploader(name: str):
+    """Shared backend instance for a service name"""
+    if name not in UPLOADERS:
+        raise KeyError(f"Unknown upload service: {name}")
+    if name not in _instances:
+        _instances[name] = UPLOADERS[name]()
+    return _instances[name]
+
+
+def failover_candidates(uploader, size: int, names, exclude=()):
+    """Hosts among `names` that can take a file `uploader` failed on: same tier, size fits, circuit not open"""
+    candidates = [name for name in names
+                  if name in UPLOADERS and name != uploader.name and name not in exclude]
+    candidates = [name for name in candidates
+                  if get_uploader(name).tier == uploader.tier and get_uploader(name).accepts(size)
+                  and get_uploader(name).health.available]
+    return [get_uploader(name) for name in HEALTH.rank(candidates)]
+
+
+def used():
+    """Backends instantiated in this process"""
+    return list(_instances.values())
+
+
+async def close_all():
+    await asyncio.gather(*(uploader.close() for uploader in _instances.values()))
+
+
+def _json(text: str, service: str, status: int = None):
+    try:
+        return json.loads(text)
+    except ValueError:
+        raise UploadError(f"{service}: unexpected response {text[:200]!r}", status)
+
+
+@register
+class PixelDrainUploader(Uploader):
+    name = 'pixeldrain'
+    upload_url = 'https://pixeldrain.com/api/file'
+    max_size = 20 * GiB
+    auth_env = 'PIXELDRAIN_API_KEY'
+
+    async def _upload(self, filename, size, body):
+        auth = aiohttp.BasicAuth('', self.auth) if self.auth else None
+        async with self.session().put(
+            f"{self.endpoint}/{quote(filename)}",
+            data=body,
+            auth=auth,
+            headers={'Content-Length': str(size), 'Content-Type': 'application/octet-stream'}
+        ) as r:
+            text = await r.text()
+            if r.status != 201:
+                raise UploadError(f"pixeldrain: HTTP {r.status} {text[:200]}", r.status)
+        return f"https://pixeldrain.com/u/{_json(text, self.name, r.status)['id']}"
+
+
+@register
+class GoFileUploader(Uploader):
+    name = 'gofile'
+    upload_url = 'https://upload.gofile.io/uploadfile'
+    auth_env = 'GOFILE_API_KEY'
+
+    async def _upload(self, filename, size, body):
+        headers = {'Authorization': f'Bearer {self.auth}'} if self.auth else None
+        status, text = await self._post_form(
+            self.endpoint, {}, 'file', filename, size, body, headers
+        )
+        data = _json(text, self.name, status)
+        if status != 200 or data.get('status') != 'ok':
+            raise UploadError(f"gofile: HTTP {status} {text[:200]}", status)
+        return data['data']['downloadPage']
+
+
+@register
+class CatboxUploader(Uploader):
+    name = 'catbox'
+    upload_url = 'https://catbox.moe/user/api.php'
+    max_size = 200 * MiB
+    auth_env = 'CATBOX_USER_HASH'
+
+    async def _upload(self, filename, size, body):
+        fields = {'reqtype': 'fileupload'}
+        if self.auth:
+            fields['userhash'] = self.auth
+        status, text = await self._post_form(
+            self.endpoint, fields, 'fileToUpload', filename, size, body
+        )
+        text = text.strip()
+        if status != 200 or not text.startswith('http'):
+            raise UploadError(f"catbox: HTTP {status} {text[:200]}", status)
+        return text
+
+
+@register
+class AnonFilesUploader(Uploader):
+    name = 'anonfiles'
+    max_size = 20 * GiB
+    # anonfiles.com itself is gone; compatible mirrors expose the same API
+    upload_url = os.environ.get('ANONFILES_API_URL') or 'https://api.anonfiles.com/upload'
+
+    async def _upload(self, filename, size, body):
+        status, text = await self._post_form(self.endpoint, {}, 'file', filename, size, body)
+        data = _json(text, self.name, status)
+        if status != 200 or not data.get('status'):
+            raise UploadError(f"anonfiles: HTTP {status} {text[:200]}", status)
+        return data['data']['file']['url']['full']
+
+
+@register
+class FileIOUploader(Uploader):
+    name = 'fileio'
+    upload_url = 'https://file.io/'
+    max_size = 2 * GiB
+    tier = 'single_use'    # link dies after the first download
+
+    async def _upload(self, filename, size, body):
+        status, text = await self._post_form(self.endpoint, {}, 'file', filename, size, body)
+        data = _json(text, self.name, status)
+        if status != 200 or not data.get('success'):
+            raise UploadError(f"fileio: HTTP {status} {text[:200]}", status)
+        return data['link']
@@ -0,0 +1,187 @@
+import time
+import sqlite3
+from contextlib import contextmanager
+
+HOUR = 3600
+DAY = 24 * HOUR
+# Hourly buckets back the rolling 24h quota window, daily buckets the longer /usage totals
+HOURLY_RETENTION = 2 * DAY
+DAILY_RETENTION = 90 * DAY
+# A reservation whose session never reports back stops counting after this long
+RESERVATION_TTL = 6 * HOUR
+
+# Quota names: uploaded bytes, files delivered (per service) and worker time
+LIMITS = ('bytes_out', 'files', 'runner_seconds')
+
+
+class UsageLedger:
+    """Bytes, files and runner time per user and service, pre-aggregated in time buckets
+
+    Each finished session adds its worker-reported usage to one hourly and
+    one daily bucket per service, so any window is read from a bounded
+    number of rows instead of the session history. Costs shared by the
+    services of a mirror (download bytes, runner time) are split evenly
+    between them. Confirmed sessions hold a reservation (the estimate at
+    confirmation) that counts against the quota until the report replaces
+    it with actual numbers.
+    """
+
+    def __init__(self, path: str = 'usage.db', purge_interval: float = 3600):
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS usage (
+                user_id TEXT NOT NULL,
+                span INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                service TEXT NOT NULL,
+                bytes_in INTEGER NOT NULL DEFAULT 0,
+                bytes_out INTEGER NOT NULL DEFAULT 0,
+                files INTEGER NOT NULL DEFAULT 0,
+                runner_seconds REAL NOT NULL DEFAULT 0,
+                sessions REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, span, bucket, service)
+            );
+            CREATE TABLE IF NOT EXISTS reservations (
+                session_id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                bytes_out INTEGER NOT NULL,
+                files INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_reservations_user ON reservations (user_id);
+        ''')
+
+    # --- Writes ---
+
+    @contextmanager
+    def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error); the connection is in autocommit mode otherwise"""
+        self._db.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        self._db.execute('COMMIT')
+
+    def record(self, user_id: str, services, bytes_in: int = 0, runner_seconds: float = 0,
+               delivered: dict = None, at: float = None, session_id: str = None):
+        """Add one session: `delivered` is {service: {'bytes': n, 'files': k}} as reported by the worker
+
+        `services` are the requested ones, which share the download and the runner time.
+        The reservation of `session_id` is dropped in the same transaction.
+        """
+        at = at or time.time()
+        delivered = delivered or {}
+        services = list(services) or list(delivered) or ['']
+        share = 1 / len(services)
+        rows = {}
+        for service in services:
+            rows[service] = [bytes_in * share, 0, 0, runner_seconds * share, share]
+        for service, entry in delivered.items():
+            row = rows.setdefault(service, [0, 0, 0, 0.0, 0.0])
+            row[1] += entry.get('bytes', 0)
+            row[2] += entry.get('files', 0)
+
+        with self._transaction():
+            if session_id is not None:
+                self._db.execute('DELETE FROM reservations WHERE session_id = ?', (session_id,))
+            for span in (HOUR, DAY):
+                bucket = int(at // span * span)
+                self._db.executemany('''
+                    INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (user_id, span, bucket, service) DO UPDATE SET
+                        bytes_in = bytes_in + excluded.bytes_in,
+                        bytes_out = bytes_out + excluded.bytes_out,
+                        files = files + excluded.files,
+                        runner_seconds = runner_seconds + excluded.runner_seconds,
+                        sessions = sessions + excluded.sessions
+                ''', [(str(user_id), span, bucket, service, round(row[0]), row[1], row[2], row[3], row[4])
+                      for service, row in rows.items()])
+        self._maybe_purge()
+
+    def reserve(self, session_id: str, user_id: str, bytes_out: int, files: int, quotas: dict = None):
+        """Hold a session's estimate unless it would exceed `quotas`
+
+        Check and insert run in one transaction, so concurrent confirmations
+        cannot both fit into the same remaining quota. Returns what `check`
+        reports (None = reserved).
+        """
+        with self._transaction():
+            exceeded = self.check(user_id, quotas or {}, bytes_out, files)
+            if exceeded is None:
+                self._db.execute('INSERT OR REPLACE INTO reservations VALUES (?, ?, ?, ?, ?)',
+                                 (session_id, str(user_id), bytes_out, files, time.time()))
+        return exceeded
+
+    def release(self, session_id: str):
+        """Drop a reservation (session finished, failed or cancelled); True if there was one"""
+        return self._db.execute('DELETE FROM reservations WHERE session_id = ?', (session_id,)).rowcount > 0
+
+    # --- Reads ---
+
+    def totals(self, user_id: str, window: float = DAY, by_service: bool = False):
+        """Usage in the last `window` seconds: hourly buckets up to two days, daily buckets beyond"""
+        span = HOUR if window <= HOURLY_RETENTION else DAY
+        now = time.time()
+        since = int(now // span * span) - (int(window // span) - 1) * span
+        group = 'service' if by_service else "''"
+        rows = self._db.execute(f'''
+            SELECT {group}, SUM(bytes_in), SUM(bytes_out), SUM(files), SUM(runner_seconds), SUM(sessions)
+            FROM usage WHERE user_id = ? AND span = ? AND bucket >= ? GROUP BY {group}
+        ''', (str(user_id), span, since)).fetchall()
+        totals = {service: {'bytes_in': b_in or 0, 'bytes_out': b_out or 0, 'files': files or 0,
+                            'runner_seconds': seconds or 0.0, 'sessions': round(sessions or 0)}
+                  for service, b_in, b_out, files, seconds, sessions in rows}
+        if by_service:
+            return totals
+        return totals.get('', {'bytes_in': 0, 'bytes_out': 0, 'files': 0, 'runner_seconds': 0.0, 'sessions': 0})
+
+    def reserved(self, user_id: str):
+        """Bytes and files of this user's sessions still on their way to a worker"""
+        row = self._db.execute(
+            'SELECT SUM(bytes_out), SUM(files) FROM reservations WHERE user_id = ? AND created_at > ?',
+            (str(user_id), time.time() - RESERVATION_TTL)
+        ).fetchone()
+        return {'bytes_out': row[0] or 0, 'files': row[1] or 0}
+
+    def check(self, user_id: str, quotas: dict, bytes_out: int = 0, files: int = 0):
+        """First quota in `quotas` ({limit: value, 0 = none}) that a new session would exceed
+
+        Returns (limit, used, quota) or None. Runner time cannot be estimated
+        up front, so it only blocks once the quota is already used up.
+        """
+        used = self.totals(user_id)
+        pending = self.reserved(user_id)
+        wanted = {'bytes_out': bytes_out, 'files': files, 'runner_seconds': 0}
+        for limit in LIMITS:
+            quota = quotas.get(limit) or 0
+            if not quota:
+                continue
+            current = used[limit] + pending.get(limit, 0)
+            if current + wanted[limit] > quota or (limit == 'runner_seconds' and current >= quota):
+                return limit, current, quota
+        return None
+
+    # --- Housekeeping ---
+
+    def _maybe_purge(self):
+        if time.monotonic() - self._last_purge >= self.purge_interval:
+            self._last_purge = time.monotonic()
+            self.purge_expired()
+
+    def purge_expired(self):
+        now = time.time()
+        with self._transaction():
+            removed = self._db.execute('DELETE FROM usage WHERE span = ? AND bucket < ?',
+                                       (HOUR, now - HOURLY_RETENTION)).rowcount
+            removed += self._db.execute('DELETE FROM usage WHERE span = ? AND bucket < ?',
+                                        (DAY, now - DAILY_RETENTION)).rowcount
+            self._db.execute('DELETE FROM reservations WHERE created_at <= ?', (now - RESERVATION_TTL,))
+        return removed
+
+    def close(self):
+        self._db.close()
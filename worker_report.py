@@ -0,0 +1,95 @@
+import hmac
+import json
+import zlib
+import base64
+import hashlib
+
+# Results travel from the worker back to the bot as a private message sent by
+# the userbot: "#report <signature>.<payload>". The payload is signed with the
+# bot token, which both sides already have, so the bot can trust it.
+# Cancellations travel the other way ("#cancel ...", bot -> userbot).
+REPORT_PREFIX = '#report '
+CANCEL_PREFIX = '#cancel '
+MAX_MESSAGE_LENGTH = 4000
+
+
+def _sign(payload: str, secret: str):
+    return hmac.new(secret.encode(), payload.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def _encode(prefix: str, obj, secret: str):
+    raw = json.dumps(obj, separators=(',', ':')).encode()
+    payload = base64.urlsafe_b64encode(zlib.compress(raw, 9)).decode()
+    return f"{prefix}{_sign(payload, secret)}.{payload}"
+
+
+def _decode(prefix: str, text: str, secret: str):
+    if not text or not text.startswith(prefix):
+        return None
+    try:
+        signature, payload = text[len(prefix):].strip().split('.', 1)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _sign(payload, secret)):
+        return None
+    try:
+        return json.loads(zlib.decompress(base64.urlsafe_b64decode(payload)))
+    except (ValueError, zlib.error):
+        return None
+
+
+def encode_report(report: dict, secret: str):
+    """Encode a report as one or more messages, splitting the file list if it is too long"""
+    message = _encode(REPORT_PREFIX, report, secret)
+    files = report.get('files', [])
+    if len(message) <= MAX_MESSAGE_LENGTH or len(files) <= 1:
+        return [message]
+    half = len(files) // 2
+    return (encode_report({**report, 'files': files[:half]}, secret)
+            + encode_report({**report, 'files': files[half:]}, secret))
+
+
+def decode_report(text: str, secret: str):
+    """Return the report dict, or None if the message is not a valid signed report"""
+    return _decode(REPORT_PREFIX, text, secret)
+
+
+def encode_cancel(session_ids, secret: str):
+    """Signed request asking the worker to abort these sessions"""
+    return _encode(CANCEL_PREFIX, {'cancel': list(session_ids)}, secret)
+
+
+def decode_cancel(text: str, secret: str):
+    """Return the session ids to cancel, or None if the message is not a valid signed request"""
+    data = _decode(CANCEL_PREFIX, text, secret)
+    return data.get('cancel') if isinstance(data, dict) else None
+
+
+def format_links(urls: dict):
+    """One link line per service (service label only when mirrored to several)"""
+    if len(urls) == 1:
+        return f"🔗 {next(iter(urls.values()))}\n"
+    return "".join(f"🔗 {service.upper()}: {url}\n" for service, url in urls.items())
+
+
+def format_cancelled(session_id: str):
+    """Final status message for a cancelled session"""
+    return (f"❌ <b>Upload Dibatalkan</b>\n\n"
+            f"🆔 Session: <code>{session_id}</code>")
+
+
+def format_results(files: list):
+    """Final status of a finished session, as one or more messages of at most MAX_MESSAGE_LENGTH
+
+    The first one replaces the status message; a long file list continues
+    in follow-up messages, never splitting one file's links.
+    """
+    if not files:
+        return ["❌ <b>Gagal!</b>\nTidak ada file yang berhasil diupload."]
+    pages = ["✅ <b>Mirror Selesai!</b>\n\n"]
+    for f in files:
+        entry = f"📄 <code>{f['name']}</code>\n{format_links(f['urls'])}\n"
+        if len(pages[-1]) + len(entry) > MAX_MESSAGE_LENGTH:
+            pages.append("")
+        pages[-1] += entry
+    return pages
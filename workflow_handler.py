@@ -1,133 +1,982 @@
 import os
 import json
+import time
+import shutil
+import tempfile
 import asyncio
+import weakref
 import traceback
 from pathlib import Path
-from telethon import TelegramClient
+
+# Origin of the startup timeline, taken before the heavy imports
+STARTED = time.monotonic()
+
+from telethon import TelegramClient, events
 from telethon.sessions import StringSession
-from telegram import Bot
-from telegram.constants import ParseMode
+from edit_scheduler import EditScheduler, HTML
+from streaming import tee_mirror, STREAM_CHUNK_SIZE
+from parallel_download import ParallelDownloader, supports_parallel, PART_SIZE, EXPORTED_AUTH_KEYS
+from session_cache import SessionCache
+from host_health import HEALTH, backoff
+from autotune import TUNING, ConnectionTuner, upload_chunk_size
+from checkpoint import Checkpoint, prune as prune_checkpoints
+from progress import ProgressTracker
+from metrics import REGISTRY, counter, gauge, histogram
+import uploaders
+from uploaders import UploadError
+from file_ref import FileRef
+from worker_report import CANCEL_PREFIX, encode_report, decode_cancel, format_cancelled, format_results
 
 # --- Load Environment ---
 SESSION_ID = os.environ.get('SESSION_ID', 'N/A')
-SERVICE = os.environ.get('SERVICE', 'pixeldrain')
+SERVICE = os.environ.get('SERVICE', 'pixeldrain')  # one service, or a comma separated fan-out list
 WORKFLOW_DATA_RAW = os.environ.get('WORKFLOW_DATA', '{}')
 
 # --- Konfigurasi Directory ---
 DOWNLOAD_DIR = Path('downloads')
 DOWNLOAD_DIR.mkdir(exist_ok=True)
 
-async def main():
-    print(f"--- Memulai Workflow: {SESSION_ID} ---")
-    
-    # 1. Parsing Data Input
-    try:
-        data = json.loads(WORKFLOW_DATA_RAW)
-        chat_id = data.get('chat_id')
-        message_id = data.get('message_id')
-        files = data.get('files', [])
-    except Exception as e:
-        print(f"❌ Error JSON: {e}")
+# --- Konfigurasi Pipeline ---
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', '2'))
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', '2'))
+DISK_RESERVE_MB = int(os.environ.get('DISK_RESERVE_MB', '512'))
+# Stream Telegram -> host without writing to disk (auto | off)
+STREAM_MODE = os.environ.get('STREAM_MODE', 'auto')
+STREAM_BUFFER_MB = int(os.environ.get('STREAM_BUFFER_MB', '4'))
+# Multi-connection downloads for large documents
+PARALLEL_CONNECTIONS = int(os.environ.get('PARALLEL_CONNECTIONS', '4'))
+PARALLEL_MIN_MB = int(os.environ.get('PARALLEL_MIN_MB', '10'))
+# Resume interrupted files from per-file checkpoints (on | off)
+CHECKPOINTS = os.environ.get('CHECKPOINTS', 'on') == 'on'
+CHECKPOINT_DIR = Path(os.environ.get('CHECKPOINT_DIR', 'checkpoints'))
+# With checkpoints on, documents from this size take the resumable disk path instead of streaming
+RESUME_MIN_MB = int(os.environ.get('RESUME_MIN_MB', '1024'))
+# Checkpoints untouched this long are dropped, and partial files kept between runs are capped at this size
+CHECKPOINT_MAX_AGE_HOURS = float(os.environ.get('CHECKPOINT_MAX_AGE_HOURS', '72'))
+CHECKPOINT_MAX_MB = int(os.environ.get('CHECKPOINT_MAX_MB', '6144'))
+# Seconds between progress edits of one status message
+PROGRESS_INTERVAL = float(os.environ.get('PROGRESS_INTERVAL', '3'))
+# Optional JSON file for the per-run metrics summary
+METRICS_SUMMARY_PATH = os.environ.get('METRICS_SUMMARY_PATH')
+# Sessions of a batched run processed at the same time
+SESSION_CONCURRENCY = int(os.environ.get('SESSION_CONCURRENCY', '2'))
+# Bot API server used for status edits (the same one as the bot)
+BOT_API_URL = os.environ.get('BOT_API_URL', 'https://api.telegram.org/bot')
+# Encrypted warm-start state of the userbot (DC config, foreign DC auth keys, chat access hashes)
+SESSION_CACHE = os.environ.get('SESSION_CACHE', 'on') == 'on'
+SESSION_CACHE_PATH = os.environ.get('SESSION_CACHE_PATH', 'session_cache/userbot.bin')
+# Upload retries on transient host errors, with full-jitter exponential backoff (seconds)
+UPLOAD_RETRIES = int(os.environ.get('UPLOAD_RETRIES', '3'))
+UPLOAD_BACKOFF = float(os.environ.get('UPLOAD_BACKOFF', '2'))
+UPLOAD_BACKOFF_MAX = float(os.environ.get('UPLOAD_BACKOFF_MAX', '60'))
+# Move a file to the next-best host of the same tier when its host keeps failing (on | off)
+FAILOVER = os.environ.get('FAILOVER', 'on') == 'on'
+FAILOVER_SERVICES = os.environ.get('FAILOVER_SERVICES', 'pixeldrain,gofile,catbox').split(',')
+# Streamed files up to this size are also spooled to disk, so a failed host is retried without re-downloading
+STREAM_SPOOL_MB = int(os.environ.get('STREAM_SPOOL_MB', '512'))
+# Per-host success rate, latency and circuit state, kept between runs
+HOST_HEALTH_PATH = os.environ.get('HOST_HEALTH_PATH', 'host_health/hosts.json')
+# Adjust download connections and upload chunk size to the measured bandwidth (on | off)
+AUTOTUNE = os.environ.get('AUTOTUNE', 'on') == 'on'
+# Memory the in-flight parts of one download may use (caps its connections), and the most connections per download
+TUNE_MEMORY_MB = int(os.environ.get('TUNE_MEMORY_MB', '64'))
+TUNE_MAX_CONNECTIONS = int(os.environ.get('TUNE_MAX_CONNECTIONS', '8'))
+# Chosen parameters and achieved MB/s per runner class, kept between runs
+TUNING_PATH = os.environ.get('TUNING_PATH', 'tuning/history.json')
+
+DOWNLOAD_BYTES = counter('download_bytes_total', 'Bytes downloaded from Telegram', ('mode',))
+DOWNLOAD_SECONDS = histogram('download_seconds', 'Telegram download duration per file', ('mode',))
+DOWNLOAD_MIBPS = histogram('download_throughput_mib_per_second', 'Telegram download throughput per file', ('mode',),
+                           buckets=(0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500))
+DOWNLOAD_CONNECTIONS = gauge('download_connections', 'Connections of the last parallel download', ('mode',))
+FILES = counter('worker_files_total', 'Files processed by outcome', ('result',))
+SESSION_SECONDS = histogram('worker_session_seconds', 'Worker time per session', ('status',))
+UPLOAD_RETRY_COUNT = counter('upload_retries_total', 'Upload attempts repeated after a transient error', ('service',))
+FAILOVERS = counter('upload_failovers_total', 'Files moved to another host', ('from_service', 'to_service'))
+STARTUP_SECONDS = gauge('worker_startup_seconds', 'Seconds from process start to each startup phase', ('phase',))
+
+
+class StartupTimeline:
+    """When each startup phase was first reached: imports → connected → first message → first byte"""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.marks = {}
+
+    def mark(self, phase: str):
+        if phase not in self.marks:
+            self.marks[phase] = time.monotonic()
+            STARTUP_SECONDS.labels(phase).set(self.marks[phase] - self.started)
+
+    def summary(self):
+        parts, previous = [], self.started
+        for phase, at in sorted(self.marks.items(), key=lambda item: item[1]):
+            parts.append(f"{phase} +{at - previous:.2f}s")
+            previous = at
+        return f"{' → '.join(parts)} (total {previous - self.started:.2f}s)"
+
+
+STARTUP = StartupTimeline(STARTED)
+
+
+class DiskBudget:
+    """Admission limit for bytes downloaded to disk but not yet uploaded"""
+
+    def __init__(self, capacity: int):
+        self.capacity = max(capacity, 0)
+        self.used = 0
+        self._cond = asyncio.Condition()
+
+    @classmethod
+    def from_free_space(cls, path: Path, reserve: int):
+        return cls(shutil.disk_usage(path).free - reserve)
+
+    async def acquire(self, size: int):
+        """Wait until `size` bytes fit; a file larger than the whole budget runs alone"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.used == 0 or self.used + size <= self.capacity)
+            self.used += size
+        return size
+
+    def try_acquire(self, size: int):
+        """Reserve `size` bytes only if they fit right now; returns the reservation (0 = none)"""
+        if self.used + size > self.capacity:
+            return 0
+        self.used += size
+        return size
+
+    async def release(self, size: int):
+        async with self._cond:
+            self.used -= size
+            self._cond.notify_all()
+
+
+def can_stream(uploader, size: int):
+    """Stream when the host takes a body of known length (Telegram always reports the size)"""
+    if STREAM_MODE == 'off' or not uploader.streaming:
+        return False
+    return size > 0 or uploader.chunked
+
+
+def can_retry(uploader):
+    """A host whose circuit is not closed gets the disk path, where retries and failover are possible"""
+    return uploader.health.state == 'closed'
+
+
+def use_parallel(msg):
+    return (PARALLEL_CONNECTIONS > 1 and supports_parallel(msg.media)
+            and (msg.file.size or 0) >= PARALLEL_MIN_MB * 1024 * 1024)
+
+
+def new_downloader(client):
+    """ParallelDownloader for one file, autotuned within TUNE_MEMORY_MB unless AUTOTUNE is off
+
+    Starts from the connection count that did best on this runner class
+    before. Parts stay at PART_SIZE (the largest Telegram serves, and what
+    checkpoint bitmaps are based on); only the connection count is tuned.
+    """
+    if not AUTOTUNE:
+        return ParallelDownloader(client, PARALLEL_CONNECTIONS)
+    # iter_download keeps 2 parts per connection in flight
+    maximum = max(min(TUNE_MAX_CONNECTIONS, TUNE_MEMORY_MB * 1024 * 1024 // (2 * PART_SIZE)), 1)
+    start = TUNING.best_connections(PARALLEL_CONNECTIONS)
+    return ParallelDownloader(client, start, tuner=ConnectionTuner(start, maximum))
+
+
+def prune_stale_checkpoints():
+    if not CHECKPOINTS:
         return
+    removed = prune_checkpoints(CHECKPOINT_DIR, DOWNLOAD_DIR, CHECKPOINT_MAX_AGE_HOURS * 3600,
+                                CHECKPOINT_MAX_MB * 1024 * 1024)
+    if removed:
+        print(f"🧹 {removed} checkpoint lama / yatim dihapus")
 
-    # 2. Setup Telegram Bot (python-telegram-bot v20+)
-    # Kita gunakan 'async with' agar bot otomatis initialize & shutdown
-    bot = Bot(token=os.environ.get('TELEGRAM_BOT_TOKEN'))
-    
-    async with bot:
-        print("✅ Bot Telegram terinisialisasi")
 
-        # 3. Setup Telethon (Userbot)
-        api_id = os.environ.get('TELEGRAM_API_ID')
-        api_hash = os.environ.get('TELEGRAM_API_HASH')
-        string_session = os.environ.get('TELEGRAM_STRING_SESSION')
+def downloaded_with(idx, downloader, mode: str, size: int):
+    """Log and record what a parallel download ran with"""
+    print(f"⚡ Download {idx}: {downloader.summary()}")
+    DOWNLOAD_CONNECTIONS.labels(mode).set(downloader.connections)
+    DOWNLOAD_MIBPS.labels(mode).observe(downloader.throughput)
+    if downloader.tuner is not None:
+        TUNING.record('download', mode=mode, size=size,
+                      start=downloader.tuner.start, connections=downloader.connections,
+                      mibps=round(downloader.throughput, 2))
 
-        if not all([api_id, api_hash, string_session]):
-            print("❌ Error: API_ID, API_HASH, atau SESSION kosong di Secrets!")
-            return
 
-        client = TelegramClient(StringSession(string_session), int(api_id), api_hash)
-        
+def record_uploads():
+    """Record per host what uploads ran with this run (uploader stats are per process)"""
+    for uploader in uploaders.used():
+        stats = uploader.stats
+        if stats['seconds']:
+            TUNING.record('upload', service=uploader.name, chunk_size=stats['chunk_size'] or STREAM_CHUNK_SIZE,
+                          mibps=round(stats['bytes'] / (1024 * 1024) / stats['seconds'], 2))
+
+
+def chunk_size_for(uploader):
+    """Disk read size for an upload, from this host's throughput in this run or an earlier one"""
+    if not AUTOTUNE:
+        return uploaders.DISK_CHUNK_SIZE
+    return upload_chunk_size(uploader.stats['ewma_mbps'] or TUNING.upload_mibps(uploader.name))
+
+
+async def upload_all(targets, filename: str, upload):
+    """Run `upload(uploader)` for every target, returning {service: url} for the ones that worked"""
+    outcomes = await asyncio.gather(*(upload(uploader) for uploader in targets), return_exceptions=True)
+    return collect_urls(targets, outcomes, filename)
+
+
+async def upload_with_retries(uploader, send, callback=None, rewind=None, attempt: int = 0):
+    """`send(uploader, callback)` until it works, backing off between attempts on transient errors
+
+    `attempt` attempts were already made elsewhere (a streamed upload now
+    retried from its spool). The bytes of a failed attempt go to `rewind`,
+    so progress does not count them twice.
+    """
+    while True:
+        if attempt:
+            delay = backoff(attempt - 1, UPLOAD_BACKOFF, UPLOAD_BACKOFF_MAX)
+            UPLOAD_RETRY_COUNT.labels(uploader.name).inc()
+            print(f"🔁 Retry {uploader.name} ({attempt}/{UPLOAD_RETRIES}) dalam {delay:.1f}s")
+            await asyncio.sleep(delay)
+        probe = uploader.health.state == 'half_open'
+        if not uploader.health.allow():
+            raise UploadError(f"{uploader.name}: circuit breaker terbuka", retryable=False)
+        sent = 0
+
+        def counting(n):
+            nonlocal sent
+            sent += n
+            if callback:
+                callback(n)
         try:
-            await client.connect()
-            if not await client.is_user_authorized():
-                print("❌ Error: String Session tidak valid!")
-                return
-            
-            print("✅ Telethon Client terhubung")
+            return await send(uploader, counting)
+        except Exception as e:
+            if rewind and sent:
+                rewind(sent)
+            attempt += 1
+            if attempt > UPLOAD_RETRIES or not uploaders.is_retryable(e):
+                raise
+        finally:
+            if probe:
+                # No-op once the upload recorded an outcome; frees the probe if it was cancelled
+                uploader.health.release_probe()
 
-            uploaded_files = []
-            
-            # 4. Loop Proses File
-            for idx, file_info in enumerate(files, 1):
-                print(f"🔄 Memproses file {idx}/{len(files)}...")
-                
-                # Update status di Bot
-                try:
-                    await bot.edit_message_text(
-                        chat_id=chat_id,
-                        message_id=message_id,
-                        text=f"⏳ <b>Downloading file {idx}/{len(files)}...</b>",
-                        parse_mode=ParseMode.HTML
-                    )
-                except: pass
 
+async def deliver(uploader, send, size: int, exclude: set, callback=None, rewind=None, error=None):
+    """Upload to `uploader` with retries, then to the next-best hosts of its tier; returns (service, url)
+
+    `exclude` holds the hosts this file already goes to, so a failover never
+    duplicates a requested mirror. `error` is the failure of an attempt made
+    elsewhere (a streamed upload): the host is retried only if it was transient.
+    """
+    if error is None or (UPLOAD_RETRIES and uploaders.is_retryable(error)):
+        try:
+            return uploader.name, await upload_with_retries(uploader, send, callback, rewind,
+                                                            0 if error is None else 1)
+        except Exception as e:
+            error = e
+    if FAILOVER:
+        for alternative in uploaders.failover_candidates(uploader, size, FAILOVER_SERVICES, exclude):
+            exclude.add(alternative.name)
+            FAILOVERS.labels(uploader.name, alternative.name).inc()
+            print(f"🔀 {uploader.name} gagal ({error}), dialihkan ke {alternative.name}")
+            try:
+                return alternative.name, await upload_with_retries(alternative, send, callback, rewind)
+            except Exception as e:
+                error = e
+    raise error
+
+
+def checkpointed(upload, checkpoint):
+    """Wrap `upload(uploader, ...)` so every finished service is recorded in the checkpoint"""
+    if checkpoint is None:
+        return upload
+
+    async def run(uploader, *args):
+        url = await upload(uploader, *args)
+        checkpoint.mark_uploaded(uploader.name, url)
+        return url
+    return run
+
+
+def collect_urls(targets, outcomes, filename: str):
+    """{service: url} from (service, url) outcomes; a failover lands under the host that took the file"""
+    urls = {}
+    for uploader, outcome in zip(targets, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"❌ Gagal upload {filename} ke {uploader.name}: {outcome}")
+            continue
+        service, url = outcome
+        urls[service] = url
+        via = f", pengganti {uploader.name}" if service != uploader.name else ''
+        print(f"✅ Berhasil ({service}{via}): {url}")
+    return urls
+
+
+async def write_spool(body, path: Path):
+    """Copy a streamed file to disk as well, returning the bytes written"""
+    written = 0
+    with open(path, 'wb') as f:
+        async for chunk in body:
+            await asyncio.to_thread(f.write, chunk)
+            written += len(chunk)
+    return written
+
+
+async def run_pipeline(client, files, progress: ProgressTracker = None, services=None, usage: dict = None):
+    """Download and upload files concurrently, returning results in input order
+
+    Download workers fetch file N+1 while upload workers are still sending
+    file N; a disk budget keeps the bytes waiting on disk within free space.
+    When the hosts accept streamed bodies, files skip the disk entirely and
+    go straight from Telegram to the hosts through small memory buffers.
+    Each file is downloaded once and sent to every service in `services`
+    at the same time. Bytes moved in both directions are fed to `progress`.
+    Failed uploads are retried from the bytes already fetched (the file on
+    disk, or the spool of a streamed file) and may fail over to another host.
+    `usage` ({'bytes_in': 0, 'services': {}}) receives the bytes downloaded
+    and, per host, the bytes and files newly delivered there.
+    """
+    services = services or SERVICE.split(',')
+    total = len(files)
+    pending = asyncio.Queue()
+    for idx, file_info in enumerate(files, 1):
+        pending.put_nowait((idx, file_info))
+    ready = asyncio.Queue(maxsize=max(UPLOAD_WORKERS, 1))
+    budget = DiskBudget.from_free_space(DOWNLOAD_DIR, DISK_RESERVE_MB * 1024 * 1024)
+    # Files of this pipeline only (sessions of a batch may share file indexes and names)
+    work_dir = Path(tempfile.mkdtemp(prefix='run_', dir=DOWNLOAD_DIR))
+    results = {}
+    meta = {}
+    state = {'downloading': 0, 'uploading': 0, 'done': 0}
+    buffer_chunks = max(STREAM_BUFFER_MB * 1024 * 1024 // STREAM_CHUNK_SIZE, 2)
+    service_uploaders = [uploaders.get_uploader(service) for service in services]
+
+    def report():
+        if progress:
+            progress.set_files(state['done'], total, state['downloading'], state['uploading'])
+
+    def track(idx, size: int, targets):
+        if progress:
+            progress.add_file(idx, size, len(targets))
+
+    def download_callback(idx, start: int = 0):
+        callback = progress.download_callback(idx, start) if progress else None
+
+        def on_progress(received, total=None):
+            STARTUP.mark('first_byte')
+            if callback is not None:
+                callback(received, total)
+        return on_progress
+
+    def upload_callback(idx):
+        return progress.upload_callback(idx) if progress else None
+
+    def rewind_callback(idx):
+        return (lambda n: progress.rewind(idx, n)) if progress else None
+
+    def settle(idx):
+        if progress:
+            progress.settle(idx)
+
+    def fetched(n: int):
+        if usage is not None:
+            usage['bytes_in'] += n
+
+    def delivered(urls, size: int):
+        if usage is not None:
+            for service in urls:
+                entry = usage['services'].setdefault(service, {'bytes': 0, 'files': 0})
+                entry['bytes'] += size
+                entry['files'] += 1
+
+    async def counted(idx, source, mode: str):
+        started = time.monotonic()
+        async for chunk in source:
+            STARTUP.mark('first_byte')
+            DOWNLOAD_BYTES.labels(mode).inc(len(chunk))
+            fetched(len(chunk))
+            if progress:
+                progress.downloaded(idx, len(chunk))
+            yield chunk
+        DOWNLOAD_SECONDS.labels(mode).observe(time.monotonic() - started)
+
+    def finish(idx, filename, urls, checkpoint, complete):
+        FILES.labels('ok' if complete else 'partial' if urls else 'failed').inc()
+        if urls:
+            results[idx] = {"name": filename, "urls": urls}
+        if checkpoint is not None and complete:
+            checkpoint.discard()
+
+    def unlock(checkpoint):
+        if checkpoint is not None:
+            checkpoint.release()
+
+    async def stream_file(idx, msg, filename, targets, finished, checkpoint):
+        size = msg.file.size
+        state['downloading'] += 1
+        state['uploading'] += 1
+        report()
+        print(f"🔀 Streaming {idx}/{total}: {filename} → {', '.join(u.name for u in targets)}")
+        downloader = new_downloader(client) if use_parallel(msg) else None
+        if downloader:
+            source = downloader.iter_download(msg.media, size)
+        else:
+            source = client.iter_download(msg.media, request_size=STREAM_CHUNK_SIZE, file_size=size)
+        # A copy on disk (when it fits) lets a host that fails mid-stream be retried without re-downloading
+        spool, reserved = None, 0
+        if (UPLOAD_RETRIES or FAILOVER) and size <= STREAM_SPOOL_MB * 1024 * 1024:
+            reserved = budget.try_acquire(size)
+            if reserved:
+                spool = work_dir / f"{idx}_{filename}"
+        sent = {uploader.name: 0 for uploader in targets}
+
+        def stream_callback(uploader):
+            callback = upload_callback(idx)
+
+            def on_chunk(n):
+                sent[uploader.name] += n
+                if callback:
+                    callback(n)
+            return on_chunk
+
+        upload = checkpointed(lambda u, body: u.upload(filename, size, body, stream_callback(u)), checkpoint)
+        consumers = [lambda body, u=uploader: upload(u, body) for uploader in targets]
+        if spool is not None:
+            consumers.append(lambda body: write_spool(body, spool))
+        try:
+            outcomes = await tee_mirror(
+                counted(idx, source, 'stream_parallel' if downloader else 'stream'),
+                consumers, max_chunks=buffer_chunks
+            )
+            if downloader:
+                downloaded_with(idx, downloader, 'stream_parallel', size)
+            spooled = spool is not None and outcomes.pop() == size
+            outcomes = [outcome if isinstance(outcome, Exception) else (uploader.name, outcome)
+                        for uploader, outcome in zip(targets, outcomes)]
+            failed = [i for i, outcome in enumerate(outcomes) if isinstance(outcome, Exception)]
+            if failed and spooled:
+                send = checkpointed(
+                    lambda u, callback: u.upload_file(spool, filename, callback, chunk_size_for(u)), checkpoint
+                )
+                exclude = set(services)
+                for i in failed:
+                    if progress:
+                        progress.rewind(idx, sent[targets[i].name])
+                retried = await asyncio.gather(
+                    *(deliver(targets[i], send, size, exclude, upload_callback(idx), rewind_callback(idx),
+                              error=outcomes[i]) for i in failed),
+                    return_exceptions=True
+                )
+                for i, outcome in zip(failed, retried):
+                    outcomes[i] = outcome
+            elif failed and spool is None and (UPLOAD_RETRIES or FAILOVER):
+                print(f"⚠️ {filename} tidak di-spool (> STREAM_SPOOL_MB / disk penuh): tidak ada retry")
+            urls = collect_urls(targets, outcomes, filename)
+            delivered(urls, size)
+            finish(idx, filename, {**finished, **urls}, checkpoint, len(urls) == len(targets))
+        finally:
+            if spool is not None and spool.exists():
+                spool.unlink()
+            unlock(checkpoint)
+            await budget.release(reserved)
+            state['downloading'] -= 1
+            state['uploading'] -= 1
+            state['done'] += 1
+            settle(idx)
+            report()
+
+    async def download_worker():
+        while True:
+            try:
+                idx, file_info = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            reserved = 0
+            file_path = None
+            streamed = False
+            checkpoint = None
+            try:
                 # Download dari Telegram
-                msg = await client.get_messages(file_info['chat_id'], ids=file_info['message_id'])
+                ref = FileRef.unpack(file_info)
+                msg = await get_message(client, ref)
                 if not msg or not msg.media:
+                    state['done'] += 1
+                    report()
+                    continue
+
+                filename = msg.file.name or ref.name or f"file_{idx}"
+                size = msg.file.size or 0
+                key = ref.key
+                meta[idx] = {"key": key, "size": size}
+                if ref.kind == 'link':
+                    # Lets the bot cache what the link holds (name and size come back with the results)
+                    meta[idx]["source"] = [ref.chat_id, ref.message_id]
+                if CHECKPOINTS and size:
+                    checkpoint = Checkpoint.open(CHECKPOINT_DIR, key, size, PART_SIZE)
+                    if checkpoint is None:
+                        print(f"⏳ {filename}: checkpoint dipakai sesi lain, diproses tanpa resume")
+
+                # Services that already got this file in an interrupted earlier run
+                finished = {service: url for service, url in (checkpoint.uploads if checkpoint else {}).items()
+                            if service in services}
+                if finished:
+                    print(f"♻️ {filename} sudah terupload ke {', '.join(finished)} (checkpoint)")
+                targets = [uploader for uploader in service_uploaders
+                           if uploader.accepts(size) and uploader.name not in finished]
+                for uploader in service_uploaders:
+                    if not uploader.accepts(size):
+                        print(f"❌ {filename} terlalu besar untuk {uploader.name}")
+                if not targets:
+                    finish(idx, filename, finished, checkpoint, True)
+                    unlock(checkpoint)
+                    state['done'] += 1
+                    report()
+                    continue
+                track(idx, size, targets)
+                # Large documents need resume most: with a checkpoint they go through the disk
+                resume_first = (checkpoint is not None and use_parallel(msg)
+                                and size >= RESUME_MIN_MB * 1024 * 1024)
+                if not resume_first and all(can_stream(uploader, size) and can_retry(uploader)
+                                            for uploader in targets):
+                    streamed = True
+                    await stream_file(idx, msg, filename, targets, finished, checkpoint)
                     continue
 
-                filename = msg.file.name or f"file_{idx}"
-                file_path = DOWNLOAD_DIR / filename
-                
-                print(f"📥 Download: {filename}")
-                await client.download_media(msg, file=str(file_path))
-
-                # Upload (Contoh ke Pixeldrain)
-                print(f"📤 Uploading ke {SERVICE}...")
-                # Catatan: Bagian upload bisa kamu masukkan logika FileUploader kamu yang lama
-                # Di sini saya persingkat untuk testing
-                
-                import requests
-                url = "https://pixeldrain.com/api/file"
-                with open(file_path, 'rb') as f:
-                    # Jika ada API Key
-                    api_key = os.environ.get('PIXELDRAIN_API_KEY')
-                    auth = ('', api_key) if api_key else None
-                    r = requests.post(url, files={'file': f}, auth=auth)
-                    
-                    if r.status_code == 201:
-                        res_data = r.json()
-                        file_url = f"https://pixeldrain.com/u/{res_data['id']}"
-                        uploaded_files.append({"name": filename, "url": file_url})
-                        print(f"✅ Berhasil: {file_url}")
+                # Parallel downloads of documents can resume from their part bitmap
+                resumable = checkpoint is not None and use_parallel(msg)
+                if resumable:
+                    file_path = DOWNLOAD_DIR / f"{checkpoint.slug}.part"
+                    if not file_path.exists():
+                        checkpoint.reset_parts()
+                    elif checkpoint.bytes_done:
+                        print(f"♻️ Resume {filename}: {checkpoint.bytes_done / (1024 * 1024):.1f} MB sudah ada")
+                else:
+                    file_path = work_dir / f"{idx}_{filename}"
+                reserved = await budget.acquire(size)
+
+                state['downloading'] += 1
+                report()
+                print(f"📥 Download {idx}/{total}: {filename}")
+                mode = 'parallel' if use_parallel(msg) else 'disk'
+                already = checkpoint.bytes_done if resumable else 0
+                started = time.monotonic()
+                try:
+                    if resumable:
+                        downloader = new_downloader(client)
+                        await downloader.download_to_file(
+                            msg.media, file_path, msg.file.size,
+                            download_callback(idx, checkpoint.bytes_done),
+                            done_parts=checkpoint.done_parts(), on_part=checkpoint.mark_part
+                        )
+                        checkpoint.save()
+                        downloaded_with(idx, downloader, mode, size - already)
+                    elif use_parallel(msg):
+                        downloader = new_downloader(client)
+                        await downloader.download_to_file(
+                            msg.media, file_path, msg.file.size, download_callback(idx)
+                        )
+                        downloaded_with(idx, downloader, mode, size)
                     else:
-                        print(f"❌ Gagal upload: {r.text}")
+                        await client.download_media(
+                            msg, file=str(file_path), progress_callback=download_callback(idx)
+                        )
+                finally:
+                    state['downloading'] -= 1
+                DOWNLOAD_BYTES.labels(mode).inc(size - already)
+                fetched(size - already)
+                DOWNLOAD_SECONDS.labels(mode).observe(time.monotonic() - started)
 
-                # Hapus file setelah upload
-                if file_path.exists():
+                await ready.put((idx, filename, file_path, reserved, targets, finished, checkpoint))
+            except (Exception, asyncio.CancelledError) as e:
+                if not isinstance(e, asyncio.CancelledError):
+                    print(f"❌ Gagal {'mirror' if streamed else 'download'} file {idx}: {e}")
+                if checkpoint is not None and file_path is not None and file_path.suffix == '.part':
+                    # Keep the partial file: a re-run resumes from the saved part bitmap
+                    checkpoint.save()
+                elif file_path is not None and file_path.exists():
                     file_path.unlink()
+                if not streamed:
+                    unlock(checkpoint)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                await budget.release(reserved)
+                if not streamed:
+                    FILES.labels('failed').inc()
+                    state['done'] += 1
+                    settle(idx)
+                    report()
 
-            # 5. Kirim Hasil Akhir
-            if uploaded_files:
-                msg_final = f"✅ <b>Mirror Selesai!</b>\n\n"
-                for f in uploaded_files:
-                    msg_final += f"📄 <code>{f['name']}</code>\n🔗 {f['url']}\n\n"
-            else:
-                msg_final = "❌ <b>Gagal!</b>\nTidak ada file yang berhasil diupload."
-
-            await bot.edit_message_text(
-                chat_id=chat_id, 
-                message_id=message_id, 
-                text=msg_final, 
-                parse_mode=ParseMode.HTML
-            )
+    async def upload_worker():
+        while True:
+            item = await ready.get()
+            if item is None:
+                return
+
+            idx, filename, file_path, reserved, targets, finished, checkpoint = item
+            state['uploading'] += 1
+            report()
+            complete = False
+            try:
+                print(f"📤 Uploading {idx}/{total} ke {', '.join(u.name for u in targets)}...")
+                send = checkpointed(
+                    lambda u, callback: u.upload_file(file_path, filename, callback, chunk_size_for(u)), checkpoint
+                )
+                exclude = set(services)
+                urls = await upload_all(targets, filename, lambda u: deliver(
+                    u, send, meta[idx]['size'], exclude, upload_callback(idx), rewind_callback(idx)
+                ))
+                delivered(urls, meta[idx]['size'])
+                complete = len(urls) == len(targets)
+                finish(idx, filename, {**finished, **urls}, checkpoint, complete)
+            finally:
+                # Hapus file setelah upload; a partial file stays with its checkpoint until every host has it
+                if checkpoint is not None and file_path.suffix == '.part' and not complete:
+                    checkpoint.save()
+                elif file_path.exists():
+                    file_path.unlink()
+                unlock(checkpoint)
+                await budget.release(reserved)
+                state['uploading'] -= 1
+                state['done'] += 1
+                settle(idx)
+                report()
+
+    upload_tasks = [asyncio.create_task(upload_worker()) for _ in range(max(UPLOAD_WORKERS, 1))]
+    try:
+        await asyncio.gather(*(download_worker() for _ in range(max(DOWNLOAD_WORKERS, 1))))
+        for _ in upload_tasks:
+            await ready.put(None)
+        await asyncio.gather(*upload_tasks)
+    finally:
+        for task in upload_tasks:
+            task.cancel()
+        # Cancelled: downloaded files that never reached an upload worker
+        while not ready.empty():
+            item = ready.get_nowait()
+            if item is not None and item[2].exists() and item[2].suffix != '.part':
+                item[2].unlink()
+            if item is not None:
+                unlock(item[6])
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for uploader in service_uploaders:
+        stats = uploader.stats
+        if stats['seconds']:
+            print(f"📈 {uploader.name}: {stats['uploads']} ok / {stats['failures']} gagal, "
+                  f"{stats['bytes'] / (1024 * 1024) / stats['seconds']:.2f} MB/s, "
+                  f"latency {stats['last_latency'] or 0:.2f}s")
+        if uploader.health.outcomes:
+            print(f"🩺 {uploader.health.summary()}")
+
+    return [{**results[idx], **meta[idx]} for idx in sorted(results)]
+
+
+# Dialog list loads per client, shared by the download workers that hit an unknown chat
+_dialog_loads = weakref.WeakKeyDictionary()
+
+
+async def get_message(client, ref: FileRef):
+    """Fetch a file's source message; a chat missing from the entity cache is found via the dialog list once"""
+    try:
+        msg = await client.get_messages(ref.chat_id, ids=ref.message_id)
+    except ValueError:
+        load = _dialog_loads.get(client)
+        if load is None:
+            print(f"🔎 Chat {ref.chat_id} belum dikenal, memuat daftar dialog...")
+            load = _dialog_loads[client] = asyncio.ensure_future(client.get_dialogs())
+        try:
+            await asyncio.shield(load)
+        except Exception:
+            # A failed load (flood wait, dropped connection) is tried again by the next lookup
+            if load.done() and _dialog_loads.get(client) is load:
+                del _dialog_loads[client]
+            raise
+        msg = await client.get_messages(ref.chat_id, ids=ref.message_id)
+    STARTUP.mark('first_message')
+    return msg
+
+
+async def send_report(client, bot, report: dict):
+    """Send the signed result report to the bot through the userbot (fills the bot's mirror cache)"""
+    try:
+        for text in encode_report(report, bot.token):
+            await client.send_message(bot.username, text)
+    except Exception as e:
+        print(f"⚠️ Gagal mengirim report ke bot: {e}")
+
+
+def build_bot(token: str):
+    """Bot API client; python-telegram-bot is imported here, off the worker's startup path"""
+    from telegram import Bot
+    return Bot(token=token, base_url=BOT_API_URL)
+
+
+class JobEngine:
+    """Reusable upload worker: one userbot and one bot connection serving many sessions
+
+    Used once per run by GitHub Actions (`main`), by self-hosted worker
+    processes (`local_worker.py`) and in-process by the bot itself.
+    """
+
+    def __init__(self, client, bot, edits, on_report=None, session_concurrency: int = SESSION_CONCURRENCY,
+                 cancel_ttl: float = 3600):
+        self.client = client
+        self.bot = bot
+        self.edits = edits
+        self.on_report = on_report
+        self._slots = asyncio.Semaphore(max(session_concurrency, 1))
+        self._running = {}
+        # session_id -> when its cancel arrived; kept for `cancel_ttl` in case the job starts after it
+        self._cancelled = {}
+        self.cancel_ttl = cancel_ttl
+        self._owns_bot = False
+        self._owns_edits = False
+        self.session_cache = None
+
+    @classmethod
+    def from_env(cls, bot=None, edits=None, on_report=None):
+        """Build an engine from the TELEGRAM_* environment; bot/edits are shared when given"""
+        api_id = os.environ.get('TELEGRAM_API_ID')
+        api_hash = os.environ.get('TELEGRAM_API_HASH')
+        string_session = os.environ.get('TELEGRAM_STRING_SESSION')
+        if not all([api_id, api_hash, string_session]):
+            raise RuntimeError("API_ID, API_HASH, atau SESSION kosong di Secrets!")
+
+        client = TelegramClient(StringSession(string_session), int(api_id), api_hash)
+        engine = cls(client, bot, edits or EditScheduler(), on_report)
+        engine._owns_bot = bot is None
+        engine._bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
+        engine._owns_edits = edits is None
+        if SESSION_CACHE:
+            engine.session_cache = SessionCache(SESSION_CACHE_PATH, string_session)
+        return engine
+
+    async def _start_client(self):
+        await self.client.connect()
+        if not await self.client.is_user_authorized():
+            raise RuntimeError("String Session tidak valid!")
+        print("✅ Telethon Client terhubung")
+
+    async def _start_bot(self):
+        if self._owns_bot:
+            # Importing the library and setting up its HTTP clients is ~0.3s of CPU: do it in a
+            # thread while the userbot's connection round trips are in flight
+            self.bot = await asyncio.to_thread(build_bot, self._bot_token)
+            await self.bot.initialize()
+            print("✅ Bot Telegram terinisialisasi")
+
+    async def start(self):
+        HEALTH.load(HOST_HEALTH_PATH)
+        prune_stale_checkpoints()
+        if AUTOTUNE:
+            TUNING.load(TUNING_PATH)
+        if self.session_cache is not None and self.session_cache.load(self.client, EXPORTED_AUTH_KEYS):
+            stats = self.session_cache.stats
+            print(f"♻️ Session cache: {stats['auth_keys']} auth key DC, {stats['entities']} entity, "
+                  f"config {'ada' if stats['config'] else 'kedaluwarsa'}")
+        STARTUP.mark('session_cache')
+        # The userbot and the bot connect at the same time
+        await asyncio.gather(self._start_client(), self._start_bot())
+        if self._owns_edits:
+            self.edits.start(self.bot)
+        STARTUP.mark('connected')
+        # The bot pushes "#cancel" messages to the userbot: aborts arrive without polling
+        self.client.add_event_handler(
+            self._on_cancel_message, events.NewMessage(incoming=True, pattern=f'^{CANCEL_PREFIX}')
+        )
+
+    async def _on_cancel_message(self, event):
+        session_ids = decode_cancel(event.raw_text, self.bot.token)
+        if session_ids is None:
+            return
+        for session_id in session_ids:
+            self.cancel(session_id)
+        try:
+            await event.delete()
+        except Exception:
+            pass
 
+    def cancel(self, session_id: str):
+        """Abort a session: in-flight transfers stop at once, its slot goes to the next session"""
+        # Every worker sees every cancel: forget the marks of sessions that never showed up here
+        cutoff = time.monotonic() - self.cancel_ttl
+        for stale in [key for key, cancelled_at in self._cancelled.items() if cancelled_at < cutoff]:
+            del self._cancelled[stale]
+        self._cancelled[session_id] = time.monotonic()
+        task = self._running.get(session_id)
+        if task is None:
+            return False
+        print(f"🛑 [{session_id}] Dibatalkan")
+        task.cancel()
+        return True
+
+    async def stop(self):
+        if self._owns_edits:
+            await self.edits.stop()
+        await uploaders.close_all()
+        HEALTH.save()
+        if AUTOTUNE:
+            record_uploads()
+            TUNING.save()
+        if self.session_cache is not None:
+            self.session_cache.save(self.client, EXPORTED_AUTH_KEYS)
+        # What is left here is what the Actions cache carries to the next run
+        prune_stale_checkpoints()
+        await self.client.disconnect()
+        if self._owns_bot and self.bot is not None:
+            await self.bot.shutdown()
+
+    async def report(self, report: dict):
+        if self.on_report is not None:
+            await self.on_report(report)
+        else:
+            await send_report(self.client, self.bot, report)
+
+    async def run(self, data: dict):
+        """Run one job: a single session, or every session of a batch (`{'batch': [...]}`)"""
+        sessions = data['batch'] if 'batch' in data else [data]
+        if len(sessions) > 1:
+            print(f"📦 Batch: {len(sessions)} sesi")
+
+        tasks = [asyncio.create_task(self._run_cancellable(session_data)) for session_data in sessions]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _run_cancellable(self, data: dict):
+        session_id = data.get('session_id', SESSION_ID)
+        self._running[session_id] = asyncio.current_task()
+        cancelled = session_id in self._cancelled
+        try:
+            if not cancelled:
+                async with self._slots:
+                    await self.run_session(data)
+        except asyncio.CancelledError:
+            if session_id not in self._cancelled:
+                raise
+            cancelled = True
+        finally:
+            del self._running[session_id]
+            self._cancelled.pop(session_id, None)
+
+        if cancelled:
+            self.edits.forget(data.get('chat_id'), data.get('message_id'))
+            await self.edits.edit(data.get('chat_id'), data.get('message_id'), format_cancelled(session_id))
+            await self.report({'session_id': session_id, 'status': 'cancelled', 'files': []})
+
+    async def run_session(self, data: dict):
+        """Process one upload session and report its results back to its own status message"""
+        session_id = data.get('session_id', SESSION_ID)
+        chat_id = data.get('chat_id')
+        message_id = data.get('message_id')
+        files = data.get('files', [])
+        services = data.get('services') or SERVICE.split(',')
+        cached = data.get('cached', [])
+        started = time.monotonic()
+        usage = {'bytes_in': 0, 'services': {}}
+        # Tells the bot the worker has started (and where to send "#cancel")
+        await self.report({'session_id': session_id, 'status': 'processing'})
+
+        # Update status di Bot: progress byte-level, maksimal 1 edit per PROGRESS_INTERVAL
+        progress = ProgressTracker(
+            lambda text: self.edits.submit(chat_id, message_id, text), interval=PROGRESS_INTERVAL
+        )
+
+        # Proses File (download & upload berjalan paralel)
+        print(f"🔄 [{session_id}] Memproses {len(files)} file ke {', '.join(services)} "
+              f"({DOWNLOAD_WORKERS} download / {UPLOAD_WORKERS} upload workers)...")
+        try:
+            uploaded_files = await run_pipeline(self.client, files, progress, services, usage)
         except Exception as e:
-            print(f"❌ Error di dalam loop: {e}")
+            print(f"❌ [{session_id}] Error: {e}")
             traceback.print_exc()
-        finally:
-            await client.disconnect()
+            uploaded_files = []
+
+        # Kirim Hasil Akhir (termasuk file yang sudah ada di cache bot)
+        status = 'completed' if uploaded_files else 'failed'
+        SESSION_SECONDS.labels(status).observe(time.monotonic() - started)
+        first, *rest = format_results(cached + uploaded_files)
+        await self.edits.edit(chat_id, message_id, first)
+        for text in rest:
+            try:
+                await self.bot.send_message(chat_id, text, parse_mode=HTML)
+            except Exception as e:
+                print(f"⚠️ [{session_id}] Gagal mengirim lanjutan hasil: {e}")
+        await self.report({
+            'session_id': session_id,
+            'status': status,
+            'files': uploaded_files,
+            'seconds': round(time.monotonic() - started, 1),
+            # Actual transfer for the bot's usage ledger (checkpointed and cached files are not counted again)
+            'usage': usage
+        })
+
+
+async def serve_queue(engine: JobEngine, queue, worker: str):
+    """Run jobs from a local JobQueue forever"""
+    print(f"👷 Worker {worker} siap menerima job")
+    while True:
+        job_id, data = await queue.get(worker)
+        print(f"📥 [{worker}] Job #{job_id}")
+        status = 'done'
+        try:
+            await engine.run(data)
+        except Exception as e:
+            print(f"❌ [{worker}] Job #{job_id} gagal: {e}")
+            traceback.print_exc()
+            status = 'failed'
+        queue.finish(job_id, status)
+
+
+def write_metrics_summary():
+    """Per-run metrics: printed to the log, added to the Actions job summary, optionally saved as JSON"""
+    summary = REGISTRY.summary()
+    print("📈 Metrics run ini:")
+    for label, value in summary.items():
+        print(f"   {label}: {value}")
+
+    step_summary = os.environ.get('GITHUB_STEP_SUMMARY')
+    if step_summary:
+        with open(step_summary, 'a') as f:
+            f.write(REGISTRY.summary_markdown(f"Metrics {SESSION_ID}"))
+    if METRICS_SUMMARY_PATH:
+        Path(METRICS_SUMMARY_PATH).write_text(json.dumps(summary, indent=2))
+
+
+async def main():
+    STARTUP.mark('imports')
+    print(f"--- Memulai Workflow: {SESSION_ID} ---")
+
+    # 1. Parsing Data Input (satu sesi, atau beberapa sesi dalam satu batch)
+    try:
+        data = json.loads(WORKFLOW_DATA_RAW)
+    except Exception as e:
+        print(f"❌ Error JSON: {e}")
+        return
+
+    # 2. Setup Bot + Telethon (Userbot), dipakai bersama oleh semua sesi
+    try:
+        engine = JobEngine.from_env()
+    except RuntimeError as e:
+        print(f"❌ Error: {e}")
+        return
+
+    try:
+        await engine.start()
+        await engine.run(data)
+    except Exception as e:
+        print(f"❌ Error di dalam loop: {e}")
+        traceback.print_exc()
+    finally:
+        await engine.stop()
+        print(f"⏱ Startup: {STARTUP.summary()}")
+        for line in TUNING.summary():
+            print(f"🎛 Autotune ({TUNING.runner}): {line}")
+        write_metrics_summary()
 
 if __name__ == '__main__':
     asyncio.run(main())